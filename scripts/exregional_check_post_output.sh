@@ -46,9 +46,7 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco workflow global verification constants task_run_post ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco workflow global verification constants task_run_post
 #
 #-----------------------------------------------------------------------
 #
@@ -31,6 +31,7 @@
 #    USHdir
 #
 #  platform:
+#    EXTRN_MDL_CACHE_DIR
 #    EXTRN_MDL_DATA_STORES
 #
 #  workflow:
@@ -69,10 +70,8 @@
 #
 . $USHdir/source_util_funcs.sh
 
-for sect in user nco platform workflow global task_get_extrn_lbcs \
-  task_get_extrn_ics ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow global task_get_extrn_lbcs \
+  task_get_extrn_ics
 #
 #-----------------------------------------------------------------------
 #
@@ -211,6 +210,12 @@ if [ -n "${input_file_path:-}" ] ; then
   --input_file_path ${input_file_path}"
 fi
 
+if [ -n "${EXTRN_MDL_CACHE_DIR:-}" ] ; then
+  mkdir -p ${EXTRN_MDL_CACHE_DIR}
+  additional_flags="$additional_flags \
+  --cache_dir ${EXTRN_MDL_CACHE_DIR}"
+fi
+
 if [ $(boolify $SYMLINK_FIX_FILES) = "TRUE" ]; then
   additional_flags="$additional_flags \
   --symlink"
@@ -249,6 +254,7 @@ python3 -u ${USHdir}/retrieve_data.py \
   --ics_or_lbcs ${ICS_OR_LBCS} \
   --output_path ${EXTRN_MDL_STAGING_DIR}${mem_dir} \
   --summary_file ${EXTRN_DEFNS} \
+  --report_file ${EXTRN_DEFNS%.sh}_transfers.json \
   $additional_flags"
 
 $cmd
@@ -31,9 +31,7 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco
 #
 #-----------------------------------------------------------------------
 #
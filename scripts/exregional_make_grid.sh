@@ -102,9 +102,7 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco platform workflow constants grid_params task_make_grid ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow constants grid_params task_make_grid
 #
 #-----------------------------------------------------------------------
 #
@@ -86,9 +86,7 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco platform workflow global cpl_aqm_parm constants task_get_extrn_ics task_make_ics ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow global cpl_aqm_parm constants task_get_extrn_ics task_make_ics
 #
 #-----------------------------------------------------------------------
 #
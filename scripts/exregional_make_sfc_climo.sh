@@ -55,9 +55,7 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco platform workflow constants task_make_sfc_climo ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow constants task_make_sfc_climo
 #
 #-----------------------------------------------------------------------
 #
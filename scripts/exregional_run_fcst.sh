@@ -116,10 +116,8 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco platform workflow global cpl_aqm_parm constants fixed_files \
-  task_get_extrn_lbcs task_run_fcst task_run_post ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow global cpl_aqm_parm constants fixed_files \
+  task_get_extrn_lbcs task_run_fcst task_run_post
 
 #
 #-----------------------------------------------------------------------
@@ -583,35 +581,19 @@ fi
 #
 #-----------------------------------------------------------------------
 #
-# Set stochastic physics seeds
+# Set stochastic physics seeds for the ensemble member, and replace
+# parameter values for air quality modeling using AQM_NA_13km in FV3
+# input.nml.  These updates are applied below, in the same step that
+# creates the model configuration files.
 #
 #-----------------------------------------------------------------------
 #
+prepare_fcst_rundir_flags=""
 if ([ "$STOCH" == "TRUE" ] && [ $(boolify "${DO_ENSEMBLE}") = "TRUE" ]); then
-  python3 $USHdir/set_fv3nml_ens_stoch_seeds.py \
-      --path-to-defns ${GLOBAL_VAR_DEFNS_FP} \
-      --cdate "$CDATE" || print_err_msg_exit "\
-Call to function to create the ensemble-based namelist for the current
-cycle's (cdate) run directory (DATA) failed:
-  cdate = \"${CDATE}\"
-  DATA = \"${DATA}\""
+  prepare_fcst_rundir_flags+=" --ens-stoch-seeds"
 fi
-#
-#-----------------------------------------------------------------------
-#
-# Replace parameter values for air quality modeling using AQM_NA_13km 
-# in FV3 input.nml and model_configure.
-#
-#-----------------------------------------------------------------------
-#
 if [ $(boolify "${CPL_AQM}") = "TRUE" ] && [ "${PREDEF_GRID_NAME}" = "AQM_NA_13km" ]; then
-  python3 $USHdir/update_input_nml.py \
-    --namelist "${DATA}/${FV3_NML_FN}" \
-    --aqm_na_13km || print_err_msg_exit "\
-Call to function to update the FV3 input.nml file for air quality modeling
-using AQM_NA_13km for the current cycle's (cdate) run directory (DATA) failed:
-  cdate = \"${CDATE}\"
-  DATA = \"${DATA}\""
+  prepare_fcst_rundir_flags+=" --aqm_na_13km"
 fi
 #
 #-----------------------------------------------------------------------
@@ -623,7 +605,6 @@ fi
 #
 flag_fcst_restart="FALSE"
 if [ $(boolify "${DO_FCST_RESTART}") = "TRUE" ] && [ "$(ls -A ${DATA}/RESTART )" ]; then
-  cp input.nml input.nml_orig
   cp model_configure model_configure_orig
   if [ $(boolify "${CPL_AQM}") = "TRUE" ]; then
     cp aqm.rc aqm.rc_orig
@@ -631,22 +612,8 @@ if [ $(boolify "${DO_FCST_RESTART}") = "TRUE" ] && [ "$(ls -A ${DATA}/RESTART )"
   relative_link_flag="FALSE"
   flag_fcst_restart="TRUE"
 
-  # Update FV3 input.nml for restart
-  python3 $USHdir/update_input_nml.py \
-    --namelist "${DATA}/${FV3_NML_FN}" \
-    --restart
-  export err=$?
-  if [ $err -ne 0 ]; then
-    message_txt="Call to function to update the FV3 input.nml file for restart 
-for the current cycle's (cdate) run directory (DATA) failed:
-  cdate = \"${CDATE}\"
-  DATA = \"${DATA}\""
-    if [ "${RUN_ENVIR}" = "nco" ] && [ "${MACHINE}" = "WCOSS2" ]; then
-      err_exit "${message_txt}"
-    else
-      print_err_msg_exit "${message_txt}"
-    fi
-  fi
+  # Update FV3 input.nml for restart, after saving it as input.nml_orig
+  prepare_fcst_rundir_flags+=" --restart"
 
   # Check that restart files exist at restart_interval
   file_ids=( "coupler.res" "fv_core.res.nc" "fv_core.res.tile1.nc" "fv_srf_wnd.res.tile1.nc" "fv_tracer.res.tile1.nc" "phy_data.nc" "sfc_data.nc" )
@@ -689,50 +656,24 @@ fi
 #
 #-----------------------------------------------------------------------
 #
+init_concentrations="false"
 if [ $(boolify "${CPL_AQM}") = "TRUE" ]; then
     if [ $(boolify "${COLDSTART}") = "TRUE" ] && \
        [ "${PDY}${cyc}" = "${DATE_FIRST_CYCL:0:10}" ] && \
        [ $(boolify "${flag_fcst_restart}") = "FALSE" ]; then
     init_concentrations="true"
-  else
-    init_concentrations="false"
-  fi
-#
-#-----------------------------------------------------------------------
-#
-# Call the function that creates the aqm.rc file within each
-# cycle directory.
-#
-#-----------------------------------------------------------------------
-#
-  python3 $USHdir/create_aqm_rc_file.py \
-    --path-to-defns ${GLOBAL_VAR_DEFNS_FP} \
-    --cdate "$CDATE" \
-    --run-dir "${DATA}" \
-    --init_concentrations "${init_concentrations}"
-  export err=$?
-  if [ $err -ne 0 ]; then
-    message_txt="Call to function to create an aqm.rc file for the current
-cycle's (cdate) run directory (DATA) failed:
-  cdate = \"${CDATE}\"
-  DATA = \"${DATA}\""
-    if [ "${RUN_ENVIR}" = "nco" ] && [ "${MACHINE}" = "WCOSS2" ]; then
-      err_exit "${message_txt}"
-    else
-      print_err_msg_exit "${message_txt}"
-    fi
   fi
 fi
-
 #
 #-----------------------------------------------------------------------
 #
-# Call the function that creates the model configuration file within each
-# cycle directory.
+# Update the FV3 input.nml file, and create the aqm.rc (for air quality
+# modeling), model configuration, diag_table, and NEMS configuration
+# files within each cycle directory, all in one call.
 #
 #-----------------------------------------------------------------------
 #
-python3 $USHdir/create_model_configure_file.py \
+python3 $USHdir/prepare_fcst_rundir.py \
   --path-to-defns ${GLOBAL_VAR_DEFNS_FP} \
   --cdate "$CDATE" \
   --fcst_len_hrs "${FCST_LEN_HRS}" \
@@ -740,34 +681,15 @@ python3 $USHdir/create_model_configure_file.py \
   --run-dir "${DATA}" \
   --sub-hourly-post "${SUB_HOURLY_POST}" \
   --dt-subhourly-post-mnts "${DT_SUBHOURLY_POST_MNTS}" \
-  --dt-atmos "${DT_ATMOS}"
-export err=$?
-if [ $err -ne 0 ]; then
-  message_txt="Call to function to create a model configuration file 
-for the current cycle's (cdate) run directory (DATA) failed:
-  cdate = \"${CDATE}\"
-  DATA = \"${DATA}\""
-  if [ "${RUN_ENVIR}" = "nco" ] && [ "${MACHINE}" = "WCOSS2" ]; then
-    err_exit "${message_txt}"
-  else
-    print_err_msg_exit "${message_txt}"
-  fi
-fi
-#
-#-----------------------------------------------------------------------
-#
-# Call the function that creates the diag_table file within each cycle 
-# directory.
-#
-#-----------------------------------------------------------------------
-#
-python3 $USHdir/create_diag_table_file.py \
-  --path-to-defns ${GLOBAL_VAR_DEFNS_FP} \
-  --run-dir "${DATA}"
+  --dt-atmos "${DT_ATMOS}" \
+  --init_concentrations "${init_concentrations}" \
+  ${prepare_fcst_rundir_flags}
 export err=$?
 if [ $err -ne 0 ]; then
-  message_txt="Call to function to create a diag table file for the current 
+  message_txt="Call to function to prepare the run directory (update the FV3
+input.nml file and create the model configuration files) for the current
 cycle's (cdate) run directory (DATA) failed:
+  cdate = \"${CDATE}\"
   DATA = \"${DATA}\""
   if [ "${RUN_ENVIR}" = "nco" ] && [ "${MACHINE}" = "WCOSS2" ]; then
     err_exit "${message_txt}"
@@ -790,28 +712,6 @@ fi
 #
 #-----------------------------------------------------------------------
 #
-# Call the function that creates the NEMS configuration file within each
-# cycle directory.
-#
-#-----------------------------------------------------------------------
-#
-python3 $USHdir/create_ufs_configure_file.py \
-  --path-to-defns ${GLOBAL_VAR_DEFNS_FP} \
-  --run-dir "${DATA}"
-export err=$?
-if [ $err -ne 0 ]; then
-  message_txt="Call to function to create a NEMS configuration file for 
-the current cycle's (cdate) run directory (DATA) failed:
-  DATA = \"${DATA}\""
-  if [ "${RUN_ENVIR}" = "nco" ] && [ "${MACHINE}" = "WCOSS2" ]; then
-    err_exit "${message_txt}"
-  else
-    print_err_msg_exit "${message_txt}"
-  fi
-fi
-#
-#-----------------------------------------------------------------------
-#
 # Run the FV3-LAM model.  Note that we have to launch the forecast from
 # the current cycle's directory because the FV3 executable will look for
 # input files in the current directory.  Since those files have been
@@ -65,10 +65,8 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco platform workflow global cpl_aqm_parm \
-  task_run_fcst task_run_post ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow global cpl_aqm_parm \
+  task_run_fcst task_run_post
 #
 #-----------------------------------------------------------------------
 #
@@ -8,11 +8,9 @@
 #-----------------------------------------------------------------------
 #
 . $USHdir/source_util_funcs.sh
-for sect in user nco platform workflow nco global verification cpl_aqm_parm \
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow nco global verification cpl_aqm_parm \
   constants fixed_files grid_params \
-  task_run_post task_run_prdgen ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+  task_run_post task_run_prdgen
 #
 #-----------------------------------------------------------------------
 #
@@ -8,11 +8,9 @@
 #-----------------------------------------------------------------------
 #
 . ${USHsrw}/source_util_funcs.sh
-for sect in user nco platform workflow nco global verification cpl_aqm_parm \
+source_yaml ${GLOBAL_VAR_DEFNS_FP} user nco platform workflow nco global verification cpl_aqm_parm \
   constants fixed_files grid_params \
-  task_bias_correction_o3 ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+  task_bias_correction_o3
 #
 #-----------------------------------------------------------------------
 #
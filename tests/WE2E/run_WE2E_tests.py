@@ -5,6 +5,7 @@ import sys
 import glob
 import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from textwrap import dedent
 from datetime import datetime
 
@@ -14,6 +15,7 @@ from generate_FV3LAM_wflow import generate_FV3LAM_wflow
 from python_utils import (
     cfg_to_yaml_str,
     load_config_file,
+    GeneratorContext,
 )
 
 from check_python_version import check_python_version
@@ -21,6 +23,10 @@ from check_python_version import check_python_version
 from monitor_jobs import monitor_jobs, write_monitor_file
 from utils import print_test_info
 
+# The GeneratorContext of a worker process generating experiments, set once
+# when the process starts by init_generate_worker
+_CONTEXT = None
+
 def run_we2e_tests(homedir, args) -> None:
     """Function to run the WE2E tests selected by the user
 
@@ -142,23 +148,28 @@ def run_we2e_tests(homedir, args) -> None:
     logging.info(f'Will run {len(tests_to_run)} tests:\n{pretty_list}')
 
 
+    # Load the config files every experiment reads once, to share them
+    # between experiments
+    context = GeneratorContext()
+    context.preload(ushdir, machine)
+
     config_default_file = os.path.join(ushdir,'config_defaults.yaml')
-    logging.debug(f"Loading config defaults file {config_default_file}")
-    config_defaults = load_config_file(config_default_file)
+    logging.debug(f"Loaded config defaults file {config_default_file}")
+    config_defaults = context.load_config(config_default_file)
 
     machine_file = os.path.join(ushdir, 'machine', f'{machine}.yaml')
-    logging.debug(f"Loading machine defaults file {machine_file}")
-    machine_defaults = load_config_file(machine_file)
+    logging.debug(f"Loaded machine defaults file {machine_file}")
+    machine_defaults = context.load_config(machine_file)
 
-    # Set up dictionary for job monitoring yaml
-    if args.launch != "cron":
-        monitor_yaml = dict()
+    # Each test's config.yaml and generation log are written to a directory
+    # of its own here, and removed once they have been copied to the
+    # experiment directory
+    generate_dir = os.path.abspath(f"WE2E_generate_{datetime.now().strftime('%Y%m%d%H%M%S')}")
 
+    test_cfgs = {}
     for test in tests_to_run:
         #Starting with test yaml template, fill in user-specified and machine- and
         # test-specific options, then write resulting complete config.yaml
-        starttime = datetime.now()
-        starttime_string = starttime.strftime("%Y%m%d%H%M%S")
         test_name = os.path.basename(test).split('.')[1]
         logging.debug(f"For test {test_name}, constructing config.yaml")
         test_cfg = load_config_file(test)
@@ -222,21 +233,66 @@ def run_we2e_tests(homedir, args) -> None:
         logging.debug(f"Writing updated config.yaml for test {test_name}\n"\
                        "based on specified command-line arguments:\n")
         logging.debug(cfg_to_yaml_str(test_cfg))
-        with open(os.path.join(ushdir,"config.yaml"),"w", encoding="utf-8") as f:
-            f.writelines(cfg_to_yaml_str(test_cfg))
-
-        logging.info(f"Calling workflow generation function for test {test_name}\n")
-        if args.quiet:
-            console_handler = logging.getLogger().handlers[1]
-            console_handler.setLevel(logging.WARNING)
-        expt_dir = generate_FV3LAM_wflow(ushdir,logfile=f"{ushdir}/log.generate_FV3LAM_wflow",
-                                         debug=args.debug)
-        if args.quiet:
-            if args.debug:
-                console_handler.setLevel(logging.DEBUG)
-            else:
-                console_handler.setLevel(logging.INFO)
-        logging.info(f"Workflow for test {test_name} successfully generated in\n{expt_dir}\n")
+        test_cfgs[test_name] = test_cfg
+
+    gen_procs = args.gen_procs
+    if gen_procs > 1 and args.launch == "cron":
+        # Each generation edits the user's crontab, which can't be done safely
+        # from several processes at once
+        logging.warning("Experiments launched with cron are generated one at a time")
+        gen_procs = 1
+
+    results = {}
+    if gen_procs > 1:
+        logging.info(f"Generating {len(test_cfgs)} experiments with {gen_procs} processes\n")
+        # The context is sent to each worker once, rather than with every test
+        with ProcessPoolExecutor(max_workers=gen_procs, initializer=init_generate_worker,
+                                 initargs=(context,)) as executor:
+            futures = {
+                executor.submit(generate_test_in_worker, ushdir, test_name, test_cfg,
+                                generate_dir, args.debug): test_name
+                for test_name, test_cfg in test_cfgs.items()
+            }
+            for future in as_completed(futures):
+                test_name = futures[future]
+                results[test_name] = future.result()
+                if results[test_name]["expt_dir"]:
+                    logging.info(f"Workflow for test {test_name} successfully generated in\n"\
+                                 f"{results[test_name]['expt_dir']}\n")
+    else:
+        for test_name, test_cfg in test_cfgs.items():
+            logging.info(f"Calling workflow generation function for test {test_name}\n")
+            if args.quiet:
+                console_handler = logging.getLogger().handlers[1]
+                console_handler.setLevel(logging.WARNING)
+            results[test_name] = generate_test(ushdir, test_name, test_cfg, generate_dir,
+                                               args.debug, context)
+            if args.quiet:
+                if args.debug:
+                    console_handler.setLevel(logging.DEBUG)
+                else:
+                    console_handler.setLevel(logging.INFO)
+            if results[test_name]["expt_dir"]:
+                logging.info(f"Workflow for test {test_name} successfully generated in\n"\
+                             f"{results[test_name]['expt_dir']}\n")
+
+    failed = [test_name for test_name in test_cfgs if not results[test_name]["expt_dir"]]
+    if failed:
+        report = f"Workflow generation failed for {len(failed)} of {len(test_cfgs)} tests:\n"
+        for test_name in failed:
+            report += f"  {test_name}: {results[test_name]['error']}\n"\
+                      f"    log file: {results[test_name]['logfile']}\n"
+        raise Exception(report)
+    if os.path.isdir(generate_dir) and not os.listdir(generate_dir):
+        os.rmdir(generate_dir)
+
+    # Set up dictionary for job monitoring yaml
+    if args.launch != "cron":
+        monitor_yaml = dict()
+
+    for test_name, test_cfg in test_cfgs.items():
+        expt_dir = results[test_name]["expt_dir"]
+        starttime_string = results[test_name]["starttime"]
         # If this job is not using crontab, we need to add an entry to monitor.yaml
         if 'USE_CRON_TO_RELAUNCH' not in test_cfg['workflow']:
             test_cfg['workflow'].update({"USE_CRON_TO_RELAUNCH": False})
@@ -272,6 +328,86 @@ def run_we2e_tests(homedir, args) -> None:
         logging.info("To view running experiments in cron try `crontab -l`")
 
 
+def generate_test(ushdir: str, test_name: str, test_cfg: dict, generate_dir: str,
+                  debug: bool = False, context: GeneratorContext = None) -> dict:
+    """Generate the experiment for one test, from a config.yaml and log file of
+    its own, so that several tests can be generated at once
+
+    Args:
+        ushdir         (str): The full path of the ush/ directory
+        test_name      (str): The name of the test
+        test_cfg      (dict): The complete user config for the test
+        generate_dir   (str): Directory for the test's config.yaml and log file, in a
+                              subdirectory named after the test
+        debug         (bool): Enable extra output for debugging
+        context (GeneratorContext): Context the shared config files are loaded through
+
+    Returns:
+        dict: The experiment directory ("expt_dir", None if generation failed), the time
+              generation started ("starttime"), the log file ("logfile"), and the error
+              if generation failed ("error")
+    """
+
+    starttime_string = datetime.now().strftime("%Y%m%d%H%M%S")
+    test_dir = os.path.join(generate_dir, test_name)
+    os.makedirs(test_dir, exist_ok=True)
+    config_fp = os.path.join(test_dir, "config.yaml")
+    logfile = os.path.join(test_dir, "log.generate_FV3LAM_wflow")
+    with open(config_fp, "w", encoding="utf-8") as f:
+        f.writelines(cfg_to_yaml_str(test_cfg))
+
+    result = {"expt_dir": None, "starttime": starttime_string, "logfile": logfile,
+              "error": None}
+    # Drop the handlers generation adds, so that the next test's log goes to
+    # its own file
+    handlers = list(logging.getLogger().handlers)
+    try:
+        result["expt_dir"] = generate_FV3LAM_wflow(ushdir, logfile=logfile, debug=debug,
+                                                   user_config_fn=config_fp,
+                                                   context=context)
+    except Exception as e: # pylint: disable=broad-except
+        # Recorded in the test's log file as well as on screen
+        logging.exception(f"Workflow generation failed for test {test_name}")
+        result["error"] = f"{type(e).__name__}: {str(e).strip()}"
+    finally:
+        for handler in logging.getLogger().handlers:
+            if handler not in handlers:
+                logging.getLogger().removeHandler(handler)
+                handler.close()
+
+    if result["expt_dir"]:
+        # The config and log file have been copied and moved to the experiment
+        # directory
+        result["logfile"] = os.path.join(result["expt_dir"], os.path.basename(logfile))
+        os.remove(config_fp)
+        os.rmdir(test_dir)
+    return result
+
+
+def init_generate_worker(context: GeneratorContext) -> None:
+    """Keep the context of a worker process started to generate experiments, so that
+    every test generated in it shares the config files loaded in the main process"""
+
+    global _CONTEXT # pylint: disable=global-statement
+    _CONTEXT = context
+
+
+def generate_test_in_worker(ushdir: str, test_name: str, test_cfg: dict, generate_dir: str,
+                            debug: bool = False) -> dict:
+    """Generate the experiment for one test in a worker process, through the context
+    init_generate_worker kept; see generate_test. Only warnings and errors are printed
+    to screen, the rest goes to the test's log file."""
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter(f"{test_name}: %(levelname)s %(message)s"))
+    root.addHandler(console)
+    return generate_test(ushdir, test_name, test_cfg, generate_dir, debug, _CONTEXT)
+
+
 def check_tests(tests: list) -> list:
     """
     Function for checking that all tests in a provided list of tests are valid
@@ -495,6 +631,10 @@ if __name__ == "__main__":
     ap.add_argument('-p', '--procs', type=int,
                     help='Run resource-heavy tasks (such as calls to rocotorun) in parallel, '\
                          'with provided number of parallel tasks', default=1)
+    ap.add_argument('-g', '--gen_procs', type=int,
+                    help='Generate experiments in parallel, with provided number of processes. '\
+                         'Each test\'s generation log is kept in its experiment directory, or '\
+                         'in a WE2E_generate_* directory if generation fails', default=1)
     ap.add_argument('-l', '--launch', type=str, choices=['python', 'cron', 'none'],
                     help='Method for launching jobs. Valid values are:\n'\
                          ' python: [default] Monitor and launch experiments using monitor_jobs.py\n'
@@ -538,6 +678,9 @@ if __name__ == "__main__":
     if args.procs < 1:
         raise argparse.ArgumentTypeError('You can not have less than one parallel process; select a valid value '\
                          'for --procs')
+    if args.gen_procs < 1:
+        raise argparse.ArgumentTypeError('You can not have less than one parallel process; select a valid value '\
+                         'for --gen_procs')
     if not args.tests:
         raise argparse.ArgumentTypeError('The --tests argument can not be empty')
 
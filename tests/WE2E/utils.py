@@ -160,7 +160,7 @@ def calculate_core_hours(expts_dict: dict) -> dict:
             logging.warning(f"{vardefs_file}\ndoes not exist!\n\nDropping experiment from summary")
             continue
         logging.debug(f'Reading variable definitions file {vardefs_file}')
-        vardefs = load_yaml_config(vardefs_file)
+        vardefs = load_yaml_config(vardefs_file, snapshot=True)
         vdf = flatten_dict(vardefs)
         cores_per_node = vdf["NCORES_PER_NODE"]
         for task in expts_dict[expt]:
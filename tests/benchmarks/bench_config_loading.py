@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Measures the start-to-first-key latency of the CLIs in ush/ that read
+the experiment's var_defns.yaml: the time from starting a Python process
+to reading the first setting the CLI needs. Each CLI is timed loading the
+file
+
+  safe_load   whole, with yaml.safe_load, as the CLIs used to
+  CLoader     whole, with load_yaml_config and the libyaml loader
+  keys        with load_yaml_config, parsing only the sections it reads
+  lazy        with load_yaml_config, parsing sections on first access
+
+The snapshot setup writes next to var_defns.yaml is not used, so that
+only the YAML loading is measured.
+
+Usage, from the top level of the repository:
+
+  PYTHONPATH=ush python tests/benchmarks/bench_config_loading.py \\
+      /path/to/expt_dir/var_defns.yaml [--repeat 5]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HOME_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+USH_DIR = os.path.join(HOME_DIR, "ush")
+
+# The sections each CLI passes to load_yaml_config
+CLI_SECTIONS = {
+    "create_aqm_rc_file.py": ["platform", "workflow", "cpl_aqm_parm"],
+    "create_diag_table_file.py": ["workflow"],
+    "create_model_configure_file.py": ["workflow", "task_run_fcst"],
+    "create_ufs_configure_file.py": ["workflow", "task_run_fcst", "cpl_aqm_parm"],
+    "link_fix.py": [
+        "workflow",
+        "task_make_grid",
+        "constants",
+        "grid_params",
+        "fixed_files",
+    ],
+    "prepare_fcst_rundir.py": [
+        "platform",
+        "workflow",
+        "global",
+        "task_run_fcst",
+        "cpl_aqm_parm",
+    ],
+    "set_fv3nml_ens_stoch_seeds.py": ["workflow", "global"],
+    "set_fv3nml_sfc_climo_filenames.py": ["user", "workflow", "global"],
+}
+
+LOADS = {
+    "safe_load": "import yaml\n"
+    "from python_utils import flatten_dict\n"
+    "with open(path) as f:\n"
+    "    cfg = flatten_dict(yaml.safe_load(f))\n"
+    "cfg['VERBOSE']\n",
+    "CLoader": "from python_utils import flatten_dict, load_yaml_config\n"
+    "cfg = flatten_dict(load_yaml_config(path))\n"
+    "cfg['VERBOSE']\n",
+    "keys": "from python_utils import flatten_dict, load_yaml_config\n"
+    "cfg = flatten_dict(load_yaml_config(path, keys=sections))\n"
+    "cfg['VERBOSE']\n",
+    "lazy": "from python_utils import load_yaml_config\n"
+    "cfg = load_yaml_config(path, lazy=True)\n"
+    "cfg['workflow']['VERBOSE']\n",
+}
+
+
+def first_key_latency(mode, path, sections):
+    """Return the seconds from starting Python to reading the first key."""
+    code = f"path = {path!r}\nsections = {sections!r}\n" + LOADS[mode]
+    env = dict(os.environ, PYTHONPATH=USH_DIR)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    """Time each way of loading var_defns.yaml for each CLI."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("var_defns", help="var_defns.yaml of a generated experiment")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A copy without the snapshot setup writes next to the original
+        path = os.path.join(tmp_dir, "var_defns.yaml")
+        shutil.copyfile(args.var_defns, path)
+
+        print(f"{'CLI':<36s}" + "".join(f"{mode:>12s}" for mode in LOADS))
+        for cli, sections in CLI_SECTIONS.items():
+            times = [
+                min(
+                    first_key_latency(mode, path, sections)
+                    for _ in range(args.repeat)
+                )
+                for mode in LOADS
+            ]
+            print(f"{cli:<36s}" + "".join(f"{t * 1000:9.1f} ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
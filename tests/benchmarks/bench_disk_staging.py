@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark for staging files from the disk data store in
+retrieve_data.py. Compares running cp or ln -sf in a subprocess for each
+file, as retrieve_data.py used to, with the in-process stage_file on a
+thread pool.
+
+Usage, from the top level of the repository:
+
+  PYTHONPATH=ush python tests/benchmarks/bench_disk_staging.py [--files 2000]
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import retrieve_data
+
+
+def subprocess_stage(source, destination, symlink):
+    """Stage one file the way retrieve_data.py did before stage_file."""
+    copy_cmd = "ln -sf" if symlink else "cp"
+    subprocess.run(f"{copy_cmd} {source} {destination}", check=True, shell=True)
+
+
+def run(label, stage, sources, destination, symlink, workers):
+    """Stage all the sources, and print the elapsed time."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(lambda source: stage(source, destination, symlink), sources)
+        )
+    elapsed = time.perf_counter() - start
+    assert all(result is not False for result in results)
+    print(
+        f"{label:<28s} {elapsed:8.3f} s {len(sources) / elapsed:10.0f} files/s"
+    )
+
+
+def main():
+    """Build a directory of source files and time each way of staging
+    them into fresh output directories."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size_kb", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_dir = os.path.join(tmp_dir, "source")
+        os.makedirs(source_dir)
+        sources = []
+        block = os.urandom(args.size_kb * 1024)
+        for i in range(args.files):
+            source = os.path.join(source_dir, f"gfs.t00z.pgrb2.0p25.f{i:04d}")
+            with open(source, "wb") as f:
+                f.write(block)
+            sources.append(source)
+
+        print(f"Staging {args.files} files of {args.size_kb} KiB")
+        for symlink in (True, False):
+            mode = "symlink" if symlink else "copy"
+            for label, stage, workers in (
+                (f"subprocess {mode}", subprocess_stage, 1),
+                (f"stage_file {mode}", retrieve_data.stage_file, 1),
+                (
+                    f"stage_file {mode} x{args.workers}",
+                    retrieve_data.stage_file,
+                    args.workers,
+                ),
+            ):
+                destination = os.path.join(tmp_dir, label.replace(" ", "_"))
+                os.makedirs(destination)
+                run(label, stage, sources, destination, symlink, workers)
+
+
+if __name__ == "__main__":
+    main()
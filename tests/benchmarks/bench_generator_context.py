@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for setting up many experiments in one process, comparing a
+new GeneratorContext for every experiment (cold, every shared config,
+task group and suite file is read and parsed again) against one context
+shared by all of them (warm, as run_WE2E_tests.py does).
+
+Each test config is completed the way run_WE2E_tests.py does it, and
+the experiments are set up in a temporary directory. With --stage
+config only load_config_for_setup() is timed, which doesn't need the
+experiment to be generated.
+
+Usage, from the top level of the repository:
+
+  PYTHONPATH=ush python tests/benchmarks/bench_generator_context.py \\
+      [--machine linux] [--stage setup|config] [tests ...]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import time
+
+from python_utils import GeneratorContext
+from setup import load_config_for_setup, setup
+
+from bench_setup import HOMEDIR, USHDIR, write_test_config
+
+TEST_CONFIGS = os.path.join(HOMEDIR, "tests", "WE2E", "test_configs")
+
+
+def time_stage(stage, config_fp, context):
+    """Return the wall time of one stage of setting up an experiment
+    with the given context, or the error it raised."""
+    start = time.perf_counter()
+    try:
+        if stage == "config":
+            load_config_for_setup(
+                USHDIR,
+                os.path.join(USHDIR, "config_defaults.yaml"),
+                config_fp,
+                context,
+            )
+        else:
+            setup(USHDIR, user_config_fn=config_fp, context=context)
+    except Exception as err:  # pylint: disable=broad-except
+        return f"{type(err).__name__}: {str(err).strip().splitlines()[0]}"
+    return time.perf_counter() - start
+
+
+def main():
+    """Time each test config with a cold and a warm context, and print a
+    table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("tests", nargs="*", help="WE2E test config files")
+    parser.add_argument("--machine", default="linux")
+    parser.add_argument("--account", default="an_account")
+    parser.add_argument("--stage", choices=["setup", "config"], default="setup")
+    args = parser.parse_args()
+
+    tests = args.tests or sorted(
+        glob.glob(os.path.join(TEST_CONFIGS, "*", "config.*.yaml"))
+    )
+    logging.disable(logging.CRITICAL)
+
+    shared = GeneratorContext()
+    totals = [0.0, 0.0]
+    print(f"{'test':<70s} {'cold':>9s} {'warm':>9s}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for test in tests:
+            test_name, config_fp = write_test_config(test, args, tmp_dir, tmp_dir)
+            times = [
+                time_stage(args.stage, config_fp, GeneratorContext()),
+                time_stage(args.stage, config_fp, shared),
+            ]
+            if isinstance(times[0], str):
+                print(f"{test_name:<70s} skipped, {times[0]}")
+                continue
+            totals = [total + t for total, t in zip(totals, times)]
+            print(f"{test_name:<70s} {times[0]:8.3f}s {times[1]:8.3f}s")
+    print(f"{'total':<70s} {totals[0]:8.3f}s {totals[1]:8.3f}s")
+    print(f"shared context: {shared.hits} hits, {shared.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the wall time of setup() on the WE2E test configs,
+comparing extend_yaml with Jinja2 templates compiled once per distinct
+template string against a new environment and compilation for every
+template, as extend_yaml used to do.
+
+Each test config is completed the way run_WE2E_tests.py does it, and
+the experiments are generated in a temporary directory.
+
+Usage, from the top level of the repository:
+
+  PYTHONPATH=ush python tests/benchmarks/bench_setup.py [--machine linux] [tests ...]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import time
+
+import jinja2
+
+from python_utils import cfg_to_yaml_str, load_config_file
+from python_utils import config_parser
+from setup import setup
+
+HOMEDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+USHDIR = os.path.join(HOMEDIR, "ush")
+TEST_CONFIGS = os.path.join(HOMEDIR, "tests", "WE2E", "test_configs")
+
+CACHED_COMPILE = config_parser.compile_template
+
+
+def uncached_compile(template):
+    """Compile a template in a new environment, as extend_yaml did
+    before templates were cached."""
+    j2env = jinja2.Environment(
+        loader=jinja2.BaseLoader, undefined=jinja2.StrictUndefined
+    )
+    j2env.filters["path_join"] = config_parser.path_join
+    j2env.filters["days_ago"] = config_parser.days_ago
+    j2env.filters["include"] = config_parser.include
+    return j2env.from_string(template)
+
+
+def write_test_config(test, args, expt_basedir, config_dir):
+    """Fill in the machine and experiment settings of a WE2E test config,
+    and return the path of the completed config."""
+    test_name = os.path.basename(test).split(".")[1]
+    test_cfg = load_config_file(test)
+    test_cfg.setdefault("user", {}).update(
+        {"MACHINE": args.machine, "ACCOUNT": args.account}
+    )
+    test_cfg.setdefault("workflow", {}).update(
+        {
+            "EXPT_BASEDIR": expt_basedir,
+            "EXPT_SUBDIR": test_name,
+            "PREEXISTING_DIR_METHOD": "delete",
+        }
+    )
+    config_fp = os.path.join(config_dir, f"config.{test_name}.yaml")
+    with open(config_fp, "w", encoding="utf-8") as f:
+        f.write(cfg_to_yaml_str(test_cfg))
+    return test_name, config_fp
+
+
+def time_setup(config_fp, compile_template):
+    """Return the wall time of a call to setup() with the given way of
+    compiling templates, or the error it raised."""
+    config_parser.compile_template = compile_template
+    CACHED_COMPILE.cache_clear()
+    start = time.perf_counter()
+    try:
+        setup(USHDIR, user_config_fn=config_fp)
+    except Exception as err:  # pylint: disable=broad-except
+        return f"{type(err).__name__}: {str(err).strip().splitlines()[0]}"
+    finally:
+        config_parser.compile_template = CACHED_COMPILE
+    return time.perf_counter() - start
+
+
+def main():
+    """Time setup() for each test config both ways, and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("tests", nargs="*", help="WE2E test config files")
+    parser.add_argument("--machine", default="linux")
+    parser.add_argument("--account", default="an_account")
+    args = parser.parse_args()
+
+    tests = args.tests or sorted(
+        glob.glob(os.path.join(TEST_CONFIGS, "*", "config.*.yaml"))
+    )
+    logging.disable(logging.CRITICAL)
+
+    totals = [0.0, 0.0]
+    print(f"{'test':<70s} {'uncached':>9s} {'cached':>9s}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for test in tests:
+            test_name, config_fp = write_test_config(test, args, tmp_dir, tmp_dir)
+            times = [
+                time_setup(config_fp, uncached_compile),
+                time_setup(config_fp, CACHED_COMPILE),
+            ]
+            if isinstance(times[0], str):
+                print(f"{test_name:<70s} skipped, {times[0]}")
+                continue
+            totals = [total + t for total, t in zip(totals, times)]
+            print(f"{test_name:<70s} {times[0]:8.3f}s {times[1]:8.3f}s")
+    print(f"{'total':<70s} {totals[0]:8.3f}s {totals[1]:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
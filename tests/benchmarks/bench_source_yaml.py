@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Timing harness for the source_yaml shell function. For each J-job and
+ex-script that sources sections of the experiment's var_defns.yaml, it
+times loading the script's section list:
+
+  per section  one source_yaml call, and so one Python process, per section
+  batched      a single source_yaml call converting all the sections at once
+  fragments    a single source_yaml call using the shell fragments setup writes
+  uw           the uw loop source_yaml ran before (only if uw is on the PATH)
+
+and checks that every way defines the same variables.
+
+Usage, from the top level of the repository:
+
+  PYTHONPATH=ush python tests/benchmarks/bench_source_yaml.py \\
+      /path/to/expt_dir/var_defns.yaml [--repeat 3]
+"""
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+import yaml
+
+from python_utils import write_config_snapshots
+
+HOME_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+USH_DIR = os.path.join(HOME_DIR, "ush")
+
+# source_yaml as it was before it took several sections, for comparison
+UW_SOURCE_YAML = r"""
+source_yaml_uw () {
+  local section
+  yaml_file=$1
+  section=$2
+  while read -r line ; do
+    line=$(echo "$line" | sed -E "s/='\[(.*)\]'/=(\1)/")
+    line=${line//,/}
+    line=${line//\"/}
+    line=${line/None/}
+    source <( echo "${line}" )
+  done < <(uw config realize -i "${yaml_file}" --output-format sh --key-path $section)
+}
+"""
+
+
+def section_lists():
+    """Return the list of sections each J-job and ex-script sources,
+    keyed by the name of the script."""
+    pattern = re.compile(
+        r"source_yaml \$\{GLOBAL_VAR_DEFNS_FP\} ((?:[^\n]|\\\n)*)"
+    )
+    lists = {}
+    for script in sorted(
+        glob.glob(os.path.join(HOME_DIR, "jobs", "*"))
+        + glob.glob(os.path.join(HOME_DIR, "scripts", "*.sh"))
+    ):
+        with open(script, "r", encoding="utf-8") as f:
+            match = pattern.search(f.read())
+        if match:
+            lists[os.path.basename(script)] = match.group(1).replace("\\", "").split()
+    return lists
+
+
+def load_sections(yaml_file, sections, mode, names):
+    """Load the sections in a fresh bash, and return the elapsed time and
+    the definitions of the given variable names."""
+    if mode == "per section":
+        load = "\n".join(f"source_yaml {yaml_file} {sect}" for sect in sections)
+    elif mode == "uw":
+        load = "\n".join(f"source_yaml_uw {yaml_file} {sect}" for sect in sections)
+    else:
+        load = f"source_yaml {yaml_file} {' '.join(sections)}"
+    script = f"""
+USHdir={USH_DIR}
+. {USH_DIR}/source_util_funcs.sh
+{UW_SOURCE_YAML}
+{load}
+declare -p {' '.join(names)} 2>/dev/null || true
+"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        ["bash", "-c", script], capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, result.stdout
+
+
+def main():
+    """Time each way of loading every script's section list."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("var_defns", help="var_defns.yaml of a generated experiment")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    modes = ["per section", "batched", "fragments"]
+    if shutil.which("uw"):
+        modes.append("uw")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Keep the fragments of the copies apart, so that only the
+        # fragments mode finds any.
+        plain_fp = os.path.join(tmp_dir, "plain", "var_defns.yaml")
+        fragments_fp = os.path.join(tmp_dir, "fragments", "var_defns.yaml")
+        for yaml_file in (plain_fp, fragments_fp):
+            os.makedirs(os.path.dirname(yaml_file))
+            shutil.copyfile(args.var_defns, yaml_file)
+        write_config_snapshots(fragments_fp)
+
+        with open(plain_fp, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+
+        print(f"{'script':<56s}" + "".join(f"{mode:>14s}" for mode in modes))
+        totals = dict.fromkeys(modes, 0.0)
+        for script, sections in section_lists().items():
+            names = sorted(
+                {name for sect in sections for name in cfg.get(sect, {})}
+            )
+            times = {}
+            definitions = {}
+            for mode in modes:
+                yaml_file = fragments_fp if mode == "fragments" else plain_fp
+                best = None
+                for _ in range(args.repeat):
+                    elapsed, defined = load_sections(yaml_file, sections, mode, names)
+                    best = elapsed if best is None else min(best, elapsed)
+                times[mode] = best
+                definitions[mode] = defined
+                totals[mode] += best
+            mismatched = [
+                mode for mode in modes if definitions[mode] != definitions[modes[0]]
+            ]
+            print(
+                f"{script:<56s}"
+                + "".join(f"{times[mode]:12.3f} s" for mode in modes)
+                + (f"  differs: {', '.join(mismatched)}" if mismatched else "")
+            )
+        print(f"{'total':<56s}" + "".join(f"{totals[mode]:12.3f} s" for mode in modes))
+
+
+if __name__ == "__main__":
+    main()
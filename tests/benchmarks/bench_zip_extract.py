@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark for extracting files from zip archives in
+retrieve_data.py. Compares running unzip -o in a subprocess and moving
+the files out of the archive's internal directories, as retrieve_data.py
+used to, with extract_zip_members, which streams the requested members
+straight to the output path.
+
+Usage, from the top level of the repository:
+
+  PYTHONPATH=ush python tests/benchmarks/bench_zip_extract.py \\
+      [--files 200] [--size_kb 2048] [--requested 50]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+
+import retrieve_data
+
+
+def unzip_extract(archive, source_paths, output_path, work_dir):
+    """Extract the source paths with unzip into the work directory, and
+    move them to the output path."""
+    subprocess.run(
+        ["unzip", "-o", "-q", archive] + source_paths,
+        check=True,
+        cwd=work_dir,
+    )
+    for source_path in source_paths:
+        os.replace(
+            os.path.join(work_dir, source_path),
+            os.path.join(output_path, os.path.basename(source_path)),
+        )
+
+
+def zipfile_extract(archive, source_paths, output_path, work_dir):
+    """Extract the source paths with extract_zip_members."""
+    del work_dir
+    requested = {
+        (-1, None, os.path.basename(source_path)): [source_path]
+        for source_path in source_paths
+    }
+    placed = retrieve_data.extract_zip_members(archive, requested, {-1: output_path})
+    assert len(placed) == len(source_paths)
+
+
+def main():
+    """Build a zip archive of compressible files in internal directories,
+    and time each way of extracting some of them into fresh output
+    directories."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size_kb", type=int, default=2048)
+    parser.add_argument("--requested", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    methods = [("extract_zip_members", zipfile_extract)]
+    if shutil.which("unzip"):
+        methods.insert(0, ("unzip -o", unzip_extract))
+    else:
+        print("unzip is not on the PATH, only timing extract_zip_members")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = os.path.join(tmp_dir, "obs.zip")
+        names = []
+        # Half random, half repeated, so that the data deflate somewhat
+        block = os.urandom(args.size_kb * 512) + bytes(args.size_kb * 512)
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for i in range(args.files):
+                name = f"obs/{i % 24:02d}/obs.{i:04d}.nc"
+                zip_file.writestr(name, block)
+                names.append(name)
+        source_paths = names[:: max(1, args.files // args.requested)][
+            : args.requested
+        ]
+
+        print(
+            f"Extracting {len(source_paths)} of {args.files} files of "
+            f"{args.size_kb} KiB from a {os.path.getsize(archive) / 1e6:.0f} MB archive"
+        )
+        for label, extract in methods:
+            times = []
+            for run in range(args.repeat):
+                run_dir = os.path.join(tmp_dir, f"{label.split()[0]}_{run}")
+                output_path = os.path.join(run_dir, "output")
+                work_dir = os.path.join(run_dir, "work")
+                os.makedirs(output_path)
+                os.makedirs(work_dir)
+                start = time.perf_counter()
+                extract(archive, source_paths, output_path, work_dir)
+                times.append(time.perf_counter() - start)
+                shutil.rmtree(run_dir)
+            print(f"{label:<22s} best {min(times):8.3f} s  mean "
+                  f"{sum(times) / len(times):8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Local stand-ins for the data stores that retrieve_data.py reads from,
+shared by the unit tests of retrieve_data.py.
+"""
+
+#pylint: disable=invalid-name
+
+import functools
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+
+class ThrottlingHandler(http.server.SimpleHTTPRequestHandler):
+
+    """Serves files from a directory over keep-alive connections, with
+    support for single open-ended byte ranges. Answers the first request
+    for each path in throttle with a 503. A 416 response leaves out the
+    total size when content_range is false."""
+
+    protocol_version = "HTTP/1.1"
+    throttle = set()
+    connections = set()
+    paths = []
+    content_range = True
+
+    def do_GET(self):
+        """Serve a GET request, throttling it or answering a Range header
+        if need be."""
+        self.connections.add(self.client_address)
+        self.paths.append(self.path)
+        if self.path in self.throttle:
+            self.throttle.discard(self.path)
+            self.send_error(503)
+            return
+        byte_range = self.headers.get("Range")
+        if not byte_range:
+            super().do_GET()
+            return
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            content = f.read()
+        start, end = byte_range.split("=")[1].split("-")
+        start = int(start)
+        end = int(end) if end else len(content) - 1
+        if start >= len(content):
+            self.send_response(416)
+            if self.content_range:
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        self.send_header("Content-Length", str(end + 1 - start))
+        self.end_headers()
+        self.wfile.write(content[start : end + 1])
+
+    def log_message(self, *args):
+        """Keep the server quiet."""
+
+
+class RetrieveDataTestCase(unittest.TestCase):
+
+    """Sets up a directory of files for a cycle, a local HTTP server that
+    serves them, and a data_locations.yml file with an aws data store
+    that points at it."""
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp_dir.name, "source")
+        self.output = os.path.join(self.tmp_dir.name, "output")
+        os.makedirs(os.path.join(self.source, "20230601"))
+        os.makedirs(self.output)
+        for fcst_hr in (0, 3, 6):
+            for prefix in ("a", "b"):
+                fn = f"{prefix}.t12z.f{fcst_hr:03d}"
+                with open(os.path.join(self.source, "20230601", fn), "w", encoding="utf-8") as f:
+                    f.write(fn)
+
+        handler = functools.partial(ThrottlingHandler, directory=self.source)
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/{{yyyymmdd}}"
+
+        self.config = os.path.join(self.tmp_dir.name, "data_locations.yml")
+        with open(self.config, "w", encoding="utf-8") as f:
+            f.write(
+                "LOCAL:\n"
+                "  aws:\n"
+                "    protocol: download\n"
+                f"    url: {self.url}\n"
+                "    max_connections: 2\n"
+                "    file_names:\n"
+                "      fcst:\n"
+                "        - a.t{hh}z.f{fcst_hr:03d}\n"
+                "        - b.t{hh}z.f{fcst_hr:03d}\n"
+            )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
@@ -4,8 +4,12 @@ ush directory """
 #pylint: disable=invalid-name
 import os
 import sys
+import tempfile
 import unittest
 from multiprocessing import Process
+from unittest import mock
+
+import yaml
 
 from python_utils import (
     cp_vrfy,
@@ -13,9 +17,11 @@ from python_utils import (
     define_macos_utilities,
     set_env_var,
     get_env_var,
+    StageManifest,
 )
 
-from generate_FV3LAM_wflow import generate_FV3LAM_wflow
+from generate_FV3LAM_wflow import generate_FV3LAM_wflow, setup_stage
+from setup import load_config_for_setup
 
 class Testing(unittest.TestCase):
     """ Class to run the tests. """
@@ -46,6 +52,80 @@ class Testing(unittest.TestCase):
         )
         run_workflow(USHdir, logfile)
 
+    def test_template_cycle(self):
+
+        """ Test that templates in a user config that refer to each other
+        in a cycle are logged and left unfilled, rather than stopping
+        the experiment from being set up. """
+
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        USHdir = os.path.join(test_dir, "..", "..", "ush")
+        with open(os.path.join(USHdir, "config.community.yaml"), encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        cfg["user"]["MACHINE"] = "linux"
+        cfg["platform"]["CCPA_OBS_DIR"] = "{{ platform.NDAS_OBS_DIR }}"
+        cfg["platform"]["NDAS_OBS_DIR"] = "{{ platform.CCPA_OBS_DIR }}"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_fp = os.path.join(tmp_dir, "config.yaml")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                yaml.safe_dump(cfg, f)
+            with self.assertLogs(level="WARNING") as logs:
+                expt_config = load_config_for_setup(
+                    USHdir, os.path.join(USHdir, "config_defaults.yaml"), config_fp
+                )
+        self.assertIn(
+            "platform.CCPA_OBS_DIR -> platform.NDAS_OBS_DIR -> platform.CCPA_OBS_DIR",
+            "\n".join(logs.output),
+        )
+        self.assertIn("{{", expt_config["platform"]["CCPA_OBS_DIR"])
+
+    def test_setup_stage_reuse(self):
+
+        """ Test that regenerating an experiment reuses the configuration
+        setup() saved when none of its inputs have changed, including the
+        CCPP suite definition file and the task group files, and runs
+        setup() again, without loading the config again, when an included
+        task group file changes. """
+
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        USHdir = os.path.join(test_dir, "..", "..", "ush")
+        with open(os.path.join(USHdir, "config.community.yaml"), encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        cfg["user"]["MACHINE"] = "linux"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            taskgroup_fp = os.path.join(tmp_dir, "test.yaml")
+            cp_vrfy(os.path.join(USHdir, "..", "parm", "wflow", "test.yaml"), taskgroup_fp)
+            taskgroups = ["parm/wflow/prep.yaml", "parm/wflow/coldstart.yaml",
+                          "parm/wflow/post.yaml", taskgroup_fp]
+            cfg["workflow"]["EXPT_BASEDIR"] = tmp_dir
+            cfg["rocoto"]["tasks"]["taskgroups"] = f"{{{{ {taskgroups}|include }}}}"
+            config_fp = os.path.join(tmp_dir, "config.yaml")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                yaml.safe_dump(cfg, f)
+
+            expt_config, _ = setup_stage(USHdir, incremental=True, user_config_fn=config_fp)
+            manifest = StageManifest(expt_config["workflow"]["EXPTDIR"])
+            files = manifest.stages["setup"]["inputs"]["files"]
+            self.assertIn(taskgroup_fp, files)
+            self.assertIn(expt_config["workflow"]["CCPP_PHYS_SUITE_IN_CCPP_FP"], files)
+
+            with mock.patch("generate_FV3LAM_wflow.setup") as setup:
+                reused, _ = setup_stage(USHdir, incremental=True, user_config_fn=config_fp)
+            setup.assert_not_called()
+            self.assertEqual(reused["workflow"]["EXPTDIR"], expt_config["workflow"]["EXPTDIR"])
+
+            with open(taskgroup_fp, "a", encoding="utf-8") as f:
+                f.write("\n# A change to an included file\n")
+            with mock.patch("generate_FV3LAM_wflow.setup", side_effect=RuntimeError) as setup:
+                with self.assertRaises(RuntimeError):
+                    setup_stage(USHdir, incremental=True, user_config_fn=config_fp)
+            setup.assert_called_once()
+            # setup() goes on from the config loaded to check the inputs
+            self.assertEqual(setup.call_args.kwargs["expt_config"]["workflow"]["EXPTDIR"],
+                             expt_config["workflow"]["EXPTDIR"])
+
     def setUp(self):
         define_macos_utilities()
         set_env_var("DEBUG", False)
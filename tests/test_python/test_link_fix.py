@@ -29,6 +29,36 @@ class Testing(unittest.TestCase):
         )
         self.assertTrue(res == "3357")
 
+    def test_link_fix_sfc_climo(self):
+        """ Test that a dry run creates no links, and that linking again
+        leaves the links in place without changing directory """
+        kwargs = {
+            "verbose": False,
+            "file_group": "sfc_climo",
+            "source_dir": self.task_dir,
+            "target_dir": self.FIXlam,
+            "ccpp_phys_suite": self.cfg["CCPP_PHYS_SUITE"],
+            "constants": self.cfg["constants"],
+            "dot_or_uscore": self.cfg["DOT_OR_USCORE"],
+            "nhw": self.cfg["NHW"],
+            "run_task": False,
+            "sfc_climo_fields": ["facsf", "soil_type"],
+        }
+        cwd = os.getcwd()
+        self.assertEqual(link_fix(dry_run=True, **kwargs), "3357")
+        self.assertEqual(os.listdir(self.FIXlam), [])
+
+        self.assertEqual(link_fix(**kwargs), "3357")
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(len(os.listdir(self.FIXlam)), 8)
+        link = os.path.join(self.FIXlam, "C3357.facsf.tile1.nc")
+        self.assertEqual(os.readlink(link), "C3357.facsf.tile7.halo0.nc")
+        self.assertTrue(os.path.samefile(
+            link, os.path.join(self.task_dir, "C3357.facsf.tile7.halo0.nc")))
+
+        self.assertEqual(link_fix(**kwargs), "3357")
+        self.assertEqual(len(os.listdir(self.FIXlam)), 8)
+
     def setUp(self):
         define_macos_utilities()
         test_dir = os.path.dirname(os.path.abspath(__file__))
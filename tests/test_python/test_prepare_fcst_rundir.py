@@ -0,0 +1,94 @@
+""" Tests for prepare_fcst_rundir.py """
+
+#pylint: disable=invalid-name
+
+from datetime import datetime
+import os
+import tempfile
+import unittest
+
+from python_utils import cp_vrfy, set_env_var
+
+# The modules under test need uwtools, which may not be installed
+try:
+    from uwtools.api.config import get_nml_config
+
+    from prepare_fcst_rundir import update_fcst_nml
+    from set_fv3nml_ens_stoch_seeds import ens_stoch_seeds_settings
+    from update_input_nml import input_nml_settings
+    HAVE_UWTOOLS = True
+except ImportError:
+    HAVE_UWTOOLS = False
+
+@unittest.skipUnless(HAVE_UWTOOLS, "uwtools is not installed")
+class Testing(unittest.TestCase):
+    """ Define the tests """
+    def test_update_fcst_nml(self):
+        """ Test that the seeds, AQM_NA_13km, and restart settings are all
+        applied to the namelist in one update """
+        settings = [
+            ens_stoch_seeds_settings(datetime(2021, 1, 1), self.config),
+            input_nml_settings(restart=True, aqm_na_13km=True),
+        ]
+        merged = update_fcst_nml(self.namelist, settings)
+
+        nml = get_nml_config(self.namelist)
+        self.assertEqual(nml["nam_stochy"]["iseed_sppt"],
+                         merged["nam_stochy"]["iseed_sppt"])
+        self.assertTrue(nml["fv_core_nml"]["warm_start"])
+        self.assertEqual(nml["fv_core_nml"]["n_split"], 8)
+
+    def test_update_fcst_nml_restart(self):
+        """ Test that the namelist is saved with the seeds and AQM_NA_13km
+        settings, but not the restart settings """
+        settings = [
+            ens_stoch_seeds_settings(datetime(2021, 1, 1), self.config),
+            input_nml_settings(restart=False, aqm_na_13km=True),
+        ]
+        merged = update_fcst_nml(
+            self.namelist,
+            settings,
+            restart_settings=input_nml_settings(restart=True, aqm_na_13km=False),
+        )
+
+        orig = get_nml_config(f"{self.namelist}_orig")
+        self.assertEqual(orig["nam_stochy"]["iseed_sppt"],
+                         merged["nam_stochy"]["iseed_sppt"])
+        self.assertEqual(orig["fv_core_nml"]["n_split"], 8)
+        self.assertFalse(orig["fv_core_nml"]["warm_start"])
+
+        nml = get_nml_config(self.namelist)
+        self.assertTrue(nml["fv_core_nml"]["warm_start"])
+        self.assertEqual(nml["fv_core_nml"]["n_split"], 8)
+
+    def setUp(self):
+        set_env_var("VERBOSE", True)
+        set_env_var("ENSMEM_INDX", 2)
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        PARMdir = os.path.join(test_dir, "..", "..", "parm")
+
+        # pylint: disable=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory(
+            dir=os.path.dirname(__file__),
+            prefix="run_fcst",
+            )
+        self.namelist = os.path.join(self.tmp_dir.name, "input.nml")
+        cp_vrfy(os.path.join(PARMdir, "input.nml.FV3"), self.namelist)
+
+        self.config = {
+            "workflow": {
+                "VERBOSE": True,
+                "FV3_NML_FN": "input.nml",
+            },
+            "global": {
+                "DO_SHUM": True,
+                "DO_SKEB": True,
+                "DO_SPPT": True,
+                "DO_SPP": False,
+                "DO_LSM_SPP": False,
+                "ISEED_SPP": [4, 5, 6, 7, 8],
+            },
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
@@ -11,10 +11,11 @@ loaded first before executing unit tests.
 
 """
 
-#pylint: disable=invalid-name
+#pylint: disable=invalid-name,too-many-public-methods
 
 import unittest
 import glob
+import pickle
 import tempfile
 import os
 
@@ -91,6 +92,34 @@ class Testing(unittest.TestCase):
         """ Test that a string is available in a given list. """
         self.assertTrue(util.check_var_valid_value("rice", ["egg", "spam", "rice"]))
 
+    def test_check_valid_param_vals(self):
+        """ Test that every invalid parameter is reported, and that the
+        valid values are reloaded when the file changes """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            valid_vals_fp = os.path.join(tmp_dir, "valid_param_vals.yaml")
+            with open(valid_vals_fp, "w", encoding="utf-8") as f:
+                f.write("valid_vals_VERBOSE: [True, False]\n"
+                        "valid_vals_VX_FIELDS: [APCP, REFC]\n"
+                        "valid_vals_COMPILER: [intel, gnu]\n")
+            valid_vals = util.load_valid_param_vals(valid_vals_fp)
+            self.assertIs(util.load_valid_param_vals(valid_vals_fp), valid_vals)
+
+            cfg = {"VERBOSE": 1, "VX_FIELDS": ["APCP", "TCDC"], "COMPILER": "pgi",
+                   "MACHINE": "HERA"}
+            errors = util.check_valid_param_vals(cfg, valid_vals)
+            self.assertEqual(len(errors), 2)
+            self.assertIn("VX_FIELDS = ['APCP', 'TCDC']", errors[0])
+            self.assertIn("COMPILER = pgi", errors[1])
+            cfg.update(VX_FIELDS=["REFC"], COMPILER="")
+            self.assertEqual(util.check_valid_param_vals(cfg, valid_vals), [])
+
+            with open(valid_vals_fp, "a", encoding="utf-8") as f:
+                f.write("valid_vals_MACHINE: [ORION]\n")
+            stat = os.stat(valid_vals_fp)
+            os.utime(valid_vals_fp, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            valid_vals = util.load_valid_param_vals(valid_vals_fp)
+            self.assertEqual(len(util.check_valid_param_vals(cfg, valid_vals)), 1)
+
     def test_filesys_cmds(self):
         """ Test the functions that perform filesystem commands"""
 
@@ -117,6 +146,121 @@ class Testing(unittest.TestCase):
 
             self.assertFalse(os.path.exists(testable_path))
 
+    def test_stage_files(self):
+        """ Test that files are linked or copied once, that a link is
+        replaced by a copy, and that missing sources are reported """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pairs = []
+            for name in ["a.txt", "b.txt"]:
+                source = os.path.join(tmp_dir, name)
+                with open(source, "w", encoding="utf-8") as f:
+                    f.write(name)
+                pairs.append((source, os.path.join(tmp_dir, f"staged_{name}")))
+
+            self.assertEqual(util.stage_files(pairs, symlink=True), (2, 0))
+            self.assertEqual(util.stage_files(pairs, symlink=True), (0, 2))
+            self.assertEqual(os.readlink(pairs[0][1]), pairs[0][0])
+
+            self.assertEqual(util.stage_files(pairs), (2, 0))
+            self.assertFalse(os.path.islink(pairs[0][1]))
+            self.assertEqual(util.stage_files(pairs), (0, 2))
+
+            with self.assertRaises(FileNotFoundError):
+                util.stage_files(pairs + [(os.path.join(tmp_dir, "c.txt"),
+                                           os.path.join(tmp_dir, "staged_c.txt"))])
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "staged_c.txt")))
+            missing = [(os.path.join(tmp_dir, "c.txt"), os.path.join(tmp_dir, "staged_c.txt"))]
+            self.assertEqual(util.stage_files(missing, symlink=True, require_sources=False),
+                             (1, 0))
+            self.assertTrue(os.path.islink(missing[0][1]))
+
+    def test_merra_climo_files(self):
+        """ Test that the MERRA2 files are found by pattern, and that a pattern
+        matching no files fails a copy but only warns for a link. """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fixaer = os.path.join(tmp_dir, "fix_aer")
+            fixlut = os.path.join(tmp_dir, "fix_lut")
+            os.makedirs(fixaer)
+            os.makedirs(fixlut)
+            for fp in (os.path.join(fixaer, "merra2.aerclim.m01.nc"),
+                       os.path.join(fixaer, "merra2.aerclim.m02.nc")):
+                with open(fp, "w", encoding="utf-8") as f:
+                    f.write("")
+
+            with self.assertRaises(FileNotFoundError):
+                util.merra_climo_files(fixaer, fixlut, "clim")
+            with self.assertLogs(level="WARNING"):
+                pairs, unmatched = util.merra_climo_files(fixaer, fixlut, "clim", symlink=True)
+            self.assertEqual(unmatched, [os.path.join(fixlut, "optics*.dat")])
+            self.assertEqual(
+                pairs,
+                [(os.path.join(fixaer, f"merra2.aerclim.m0{m}.nc"),
+                  os.path.join("clim", f"merra2.aerclim.m0{m}.nc")) for m in (1, 2)],
+            )
+
+            with open(os.path.join(fixlut, "optics_BC.dat"), "w", encoding="utf-8") as f:
+                f.write("")
+            pairs, unmatched = util.merra_climo_files(fixaer, fixlut, "clim")
+            self.assertEqual(len(pairs), 3)
+            self.assertEqual(unmatched, [])
+
+    def test_stage_fix_files(self):
+        """ Test that the fix and MERRA2 files are staged once, and that
+        files of an earlier generation are removed from FIXam and FIXclim """
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fixgsm = os.path.join(tmp_dir, "fix_am")
+            fixaer = os.path.join(tmp_dir, "fix_aer")
+            fixlut = os.path.join(tmp_dir, "fix_lut")
+            for name in [os.path.join(fixgsm, "global_co2.txt"),
+                         os.path.join(fixaer, "merra2.aerclim.m01.nc"),
+                         os.path.join(fixaer, "merra2.aerclim.m02.nc"),
+                         os.path.join(fixlut, "optics_BC.dat")]:
+                os.makedirs(os.path.dirname(name), exist_ok=True)
+                with open(name, "w", encoding="utf-8") as f:
+                    f.write("")
+            exptdir = os.path.join(tmp_dir, "expt")
+            fixclim = os.path.join(exptdir, "fix_clim")
+            expt_config = {
+                "platform": {"FIXgsm": fixgsm, "FIXaer": fixaer, "FIXlut": fixlut},
+                "workflow": {
+                    "SYMLINK_FIX_FILES": True,
+                    "FIXam": os.path.join(exptdir, "fix_am"),
+                    "FIXclim": fixclim,
+                },
+                "fixed_files": {"FIXgsm_FILES_TO_COPY_TO_FIXam": ["global_co2.txt"]},
+                "task_run_fcst": {"USE_MERRA_CLIMO": True},
+            }
+
+            # Leftovers of an earlier generation
+            os.makedirs(os.path.join(fixclim, "old_dir"))
+            os.symlink(os.path.join(tmp_dir, "old.nc"), os.path.join(fixclim, "old.nc"))
+
+            self.assertEqual(util.stage_fix_files(expt_config, util.StageManifest(exptdir)),
+                             (4, 0))
+            self.assertEqual(sorted(os.listdir(fixclim)),
+                             ["merra2.aerclim.m01.nc", "merra2.aerclim.m02.nc",
+                              "optics_BC.dat"])
+            self.assertEqual(util.stage_fix_files(expt_config, util.StageManifest(exptdir)),
+                             (0, 0))
+
+            os.remove(os.path.join(fixaer, "merra2.aerclim.m02.nc"))
+            expt_config["workflow"]["SYMLINK_FIX_FILES"] = False
+            self.assertEqual(util.stage_fix_files(expt_config, util.StageManifest(exptdir)),
+                             (3, 0))
+            self.assertEqual(sorted(os.listdir(fixclim)),
+                             ["merra2.aerclim.m01.nc", "optics_BC.dat"])
+            self.assertFalse(os.path.islink(os.path.join(fixclim, "optics_BC.dat")))
+
+            with open(os.path.join(fixgsm, "global_o3.txt"), "w", encoding="utf-8") as f:
+                f.write("")
+            expt_config["fixed_files"]["FIXgsm_FILES_TO_COPY_TO_FIXam"] = ["global_o3.txt"]
+            self.assertEqual(util.stage_fix_files(expt_config, util.StageManifest(exptdir)),
+                             (1, 0))
+            self.assertEqual(sorted(os.listdir(os.path.join(exptdir, "fix_am"))),
+                             ["fix_co2_proj", "global_o3.txt"])
+
     def test_run_command(self):
         """ Test the return of the run_command task is as expected."""
         self.assertEqual(util.run_command("echo hello"), (0, "hello", ""))
@@ -217,6 +361,407 @@ class Testing(unittest.TestCase):
             "regional_workflow", util.get_ini_value(cfg, "regional_workflow", "repo_url")
         )
 
+    def test_merge_dicts(self):
+        """ Test that merging several layers at once matches updating
+        with each in turn, and reports where each value came from """
+        def layers():
+            defaults = {"workflow": {"A": 1, "B": 2, "C": None},
+                        "rocoto": {"tasks": {"task_a": {"walltime": 1}}}}
+            return defaults, [
+                ("machine", {"workflow": {"B": 3, "D": 4}}),
+                ("user", {"workflow": {"A": None, "E": 5},
+                          "rocoto": {"tasks": {"task_b": {}}},
+                          "bogus": {"F": 6}}),
+            ]
+        expected, sources = layers()
+        invalid = util.check_structure_dict(sources[-1][1], expected)
+        for _, layer in sources:
+            util.update_dict(layer, expected)
+        util.update_dict(expected, expected)
+
+        merged, sources = layers()
+        provenance = {}
+        self.assertEqual(
+            util.merge_dicts(merged, sources, provenance=provenance, validate=["user"]),
+            invalid,
+        )
+        self.assertEqual(merged, expected)
+        self.assertEqual(list(merged["workflow"]), list(expected["workflow"]))
+        self.assertEqual(
+            provenance,
+            {"workflow.B": "machine", "workflow.D": "machine", "workflow.E": "user",
+             "rocoto.tasks.task_a.walltime": "default", "bogus.F": "user"},
+        )
+
+        # A layer that shares its nested dictionaries with the target, as
+        # the user's rocoto tasks do once they are updated into the workflow
+        tasks = {"task_a": {"walltime": 1, "cores": None}}
+        merged = {"rocoto": {"tasks": tasks}}
+        util.merge_dicts(merged, [("user", {"rocoto": {"tasks": tasks}})])
+        self.assertEqual(merged, {"rocoto": {"tasks": {"task_a": {"walltime": 1}}}})
+
+    def test_generator_context(self):
+        """ Test that a GeneratorContext hands out copies of the configs
+        it has loaded, and loads a config again when its file changes """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_fp = os.path.join(tmp_dir, "config.yaml")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                f.write("task: {walltime: '00:30:00'}\n")
+            context = util.GeneratorContext()
+            cfg = context.load_config(config_fp)
+            cfg["task"]["walltime"] = "01:00:00"
+            self.assertEqual(context.load_config(config_fp),
+                             {"task": {"walltime": "00:30:00"}})
+            self.assertEqual((context.hits, context.misses), (1, 1))
+
+            with open(config_fp, "w", encoding="utf-8") as f:
+                f.write("task: {walltime: '00:45:00'}\n")
+            stat = os.stat(config_fp)
+            os.utime(config_fp, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(context.load_config(config_fp),
+                             {"task": {"walltime": "00:45:00"}})
+            self.assertEqual(context.misses, 2)
+
+            # The include filter reads its files through the active context
+            with context.activate():
+                text = util.config_parser.include([config_fp])
+                self.assertIs(util.config_parser.include([config_fp]), text)
+            self.assertIsNone(util.config_parser.INCLUDE_CONTEXT)
+            self.assertEqual(context.load_yaml_str(text),
+                             {"task": {"walltime": "00:45:00"}})
+
+    def test_profile_phase(self):
+        """ Test that phases are only recorded while profiling, nested under
+        the phase they were entered from """
+
+        @util.profile_phase("inner")
+        def inner():
+            return 1
+
+        with util.profile_phase("outer"):
+            inner()
+        self.assertIsNone(util.stop_profiling())
+
+        util.start_profiling()
+        with util.profile_phase("outer"):
+            inner()
+            inner()
+        profiler = util.stop_profiling()
+        self.assertEqual(
+            [(p["path"], p["depth"]) for p in profiler.phases],
+            [("outer", 0), ("outer/inner", 1), ("outer/inner", 1)],
+        )
+        summary = profiler.summary()
+        self.assertEqual([total["calls"] for total in summary], [1, 2])
+        self.assertGreaterEqual(summary[0]["wall"], summary[1]["wall"])
+        self.assertIn("  inner", profiler.report())
+
+    def test_load_shell_config(self):
+        """ Test parsing shell config files without running a shell """
+        cfg = {
+            "workflow": {"EXPTDIR": "/expt/dir", "CYCL_HRS": ["00", "12"], "NAME": ""},
+            "task_run_fcst": {"QUILTING": True, "DT_ATMOS": 36},
+        }
+        self.assertEqual(util.shell_str_to_dict(util.cfg_to_shell_str(cfg)), {
+            "workflow": {"EXPTDIR": "/expt/dir", "CYCL_HRS": ["00", 12], "NAME": ""},
+            "task_run_fcst": {"QUILTING": True, "DT_ATMOS": 36},
+        })
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_fp = os.path.join(tmp_dir, "config.sh")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                f.write(
+                    "# A plain config\n"
+                    "MACHINE='hera'  # comment\n"
+                    "export EXPT_SUBDIR=test_expt\n"
+                    "FIELDS=( \\\n"
+                    '"a" \\\n'
+                    '"b c" \\\n'
+                    ")\n"
+                    "EMPTY=\n"
+                )
+            self.assertEqual(util.load_shell_config(config_fp), {
+                "MACHINE": "hera",
+                "EXPT_SUBDIR": "test_expt",
+                "FIELDS": ["a", "b c"],
+                "EMPTY": None,
+            })
+
+        # Files that need bash to evaluate them are left to bash
+        for contents in ('B="${A}/y"\n', "A=$(date)\n", "source other.sh\n", "A=a b\n"):
+            self.assertIsNone(util.shell_str_to_dict(contents))
+
+    def test_extend_yaml(self):
+        """ Test that templates are filled from the rest of the config,
+        left as-is when they can't be, and compiled once each, without
+        freezing the results of filters that read files"""
+        util.config_parser.compile_template.cache_clear()
+        cfg = {
+            "workflow": {
+                "EXPTDIR": '{{ [workflow.EXPT_BASEDIR, "test"]|path_join }}',
+                "EXPT_BASEDIR": "/base",
+                "LOGDIR": '{{ [workflow.EXPT_BASEDIR, "test"]|path_join }}',
+                "CYCLEDIR": "{{ workflow.EXPTDIR }}/{{ cycle.yyyymmddhh }}",
+            },
+        }
+        util.extend_yaml(cfg)
+        self.assertEqual(cfg["workflow"]["EXPTDIR"], "/base/test")
+        self.assertEqual(cfg["workflow"]["LOGDIR"], "/base/test")
+        self.assertEqual(
+            cfg["workflow"]["CYCLEDIR"], "/base/test/{{ cycle.yyyymmddhh }}"
+        )
+        self.assertEqual(util.config_parser.compile_template.cache_info().misses, 3)
+
+        # A compiled template still reads the files it includes each time
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            include_fp = os.path.join(tmp_dir, "tasks.yaml")
+            template = f'{{{{ ["{include_fp}"]|include }}}}'
+            for task in ("task_a", "task_b"):
+                with open(include_fp, "w", encoding="utf-8") as f:
+                    f.write(f"{task}: {{}}\n")
+                cfg = {"rocoto": {"tasks": template}}
+                util.extend_yaml(cfg)
+                self.assertIn(task, cfg["rocoto"]["tasks"])
+
+    def test_extend_yaml_order(self):
+        """ Test that templates referring to templates later in the
+        config are filled in a single call, that unfilled templates are
+        returned, and that reference cycles are reported or collected"""
+        cfg = {
+            "task": {
+                "NNODES": "{{ (PE + PPN - 1) // PPN }}",
+                "PE": "{{ LAYOUT_X * LAYOUT_Y }}",
+                "PPN": "{{ platform.CORES // THREADS }}",
+                "LAYOUT_X": 4,
+                "LAYOUT_Y": 3,
+                "THREADS": 2,
+                "LOG": "{{ workflow.LOGDIR }}/{{ cycle.yyyymmddhh }}",
+            },
+            "platform": {"CORES": "{{ 2 * 5 }}"},
+            "workflow": {"LOGDIR": "{{ [workflow.EXPTDIR, 'log']|path_join }}",
+                         "EXPTDIR": "/expt"},
+        }
+        unfilled = util.extend_yaml(cfg)
+        self.assertEqual(cfg["task"]["PPN"], 5)
+        self.assertEqual(cfg["task"]["NNODES"], 3)
+        self.assertEqual(unfilled, {"task.LOG": "/expt/log/{{ cycle.yyyymmddhh }}"})
+
+        cfg = {"a": {"X": "{{ a.Y }}", "Y": "{{ b.Z }}"}, "b": {"Z": "{{ a.X }}"}}
+        with self.assertRaisesRegex(ValueError, "a.X -> a.Y -> b.Z -> a.X"):
+            util.extend_yaml(cfg)
+
+        # With a list for them, cycles are collected and left unfilled
+        cfg["a"]["W"] = "{{ a.V }}"
+        cfg["a"]["V"] = 1
+        cycles = []
+        unfilled = util.extend_yaml(cfg, cycles)
+        self.assertEqual(cycles, ["a.X -> a.Y -> b.Z -> a.X"])
+        self.assertEqual(sorted(unfilled), ["a.X", "a.Y", "b.Z"])
+        self.assertEqual(cfg["a"]["W"], 1)
+
+        # A dict shared by YAML aliases is filled where it is first found
+        shared = {"nprocs": "{{ parent.nnodes * parent.ppn }}"}
+        cfg = {
+            "tasks": {
+                "task_a": {"nnodes": 1, "ppn": 1, "envars": shared},
+                "task_b": {"nnodes": 2, "ppn": 12, "envars": shared},
+            },
+            "summary": {"NPROCS_B": "{{ tasks.task_b.envars.nprocs }}"},
+        }
+        util.extend_yaml(cfg)
+        self.assertEqual(cfg["tasks"]["task_b"]["envars"]["nprocs"], 1)
+        self.assertEqual(cfg["summary"]["NPROCS_B"], 1)
+
+    def test_config_snapshots(self):
+        """ Test that a config's snapshot, when asked for, and shell
+        fragments are used until the config changes"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_fp = os.path.join(tmp_dir, "var_defns.yaml")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                f.write(
+                    "workflow:\n"
+                    "  EXPTDIR: /expt/dir\n"
+                    "  CYCL_HRS: [0, 12]\n"
+                    "  FIELDS: ['a', 'b']\n"
+                    "  UNSET: null\n"
+                    "  QUOTED: \"it's\"\n"
+                    "  MESSAGE: 'say \"hi\", then go'\n"
+                    "  SCRIPT: |\n"
+                    "    if true; then\n"
+                    "      echo 'done'\n"
+                    "    fi\n"
+                    "task_run_fcst:\n"
+                    "  NESTED: {key: value}\n"
+                )
+            util.write_config_snapshots(config_fp)
+
+            self.assertEqual(
+                util.load_config_snapshot(config_fp)["workflow"]["CYCL_HRS"], [0, 12]
+            )
+            # The snapshot is only used when asked for
+            snapshot_fp = os.path.join(tmp_dir, "var_defns.pkl")
+            with open(snapshot_fp, "rb") as f:
+                snapshot = pickle.load(f)
+            snapshot["config"]["workflow"]["EXPTDIR"] = "/from/snapshot"
+            with open(snapshot_fp, "wb") as f:
+                pickle.dump(snapshot, f)
+            self.assertEqual(
+                util.load_yaml_config(config_fp, snapshot=True)["workflow"]["EXPTDIR"],
+                "/from/snapshot",
+            )
+            self.assertEqual(
+                util.load_yaml_config(config_fp)["workflow"]["EXPTDIR"], "/expt/dir"
+            )
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(tmp_dir, "var_defns.d"))),
+                ["checksum", "workflow.sh"],
+            )
+            source_yaml = os.path.join(self.ushdir, "bash_utils", "source_yaml.sh")
+            _, out, _ = util.run_command(
+                f"""bash -c 'source {source_yaml}
+                uw() {{ echo UW=called; }}
+                source_yaml {config_fp} workflow
+                echo "$EXPTDIR|${{CYCL_HRS[1]}}|${{FIELDS[0]}}${{FIELDS[1]}}|$UNSET|${{UW:-}}"'"""
+            )
+            self.assertEqual(out.strip(), "/expt/dir|12|ab||")
+            script = os.path.join(tmp_dir, "script.sh")
+            with open(script, "w", encoding="utf-8") as f:
+                f.write(
+                    f"source {source_yaml}\n"
+                    "uw() { echo UW=called; }\n"
+                    f"source_yaml {config_fp} workflow\n"
+                    'echo "$QUOTED|$MESSAGE|$EXPTDIR"\n'
+                    'echo "$SCRIPT"\n'
+                )
+            _, out, _ = util.run_command(f"bash {script}")
+            self.assertEqual(
+                out.split("\n"),
+                ['it\'s|say "hi", then go|/expt/dir',
+                 "if true; then", "  echo 'done'", "fi"],
+            )
+
+            # A changed config is read from the YAML file again
+            with open(config_fp, "a", encoding="utf-8") as f:
+                f.write("  ADDED: 1\n")
+            self.assertIsNone(util.load_config_snapshot(config_fp))
+            self.assertEqual(
+                util.load_yaml_config(config_fp, snapshot=True)["task_run_fcst"]["ADDED"],
+                1,
+            )
+
+    def test_source_yaml_sections(self):
+        """ Test that source_yaml sources several sections in one call,
+        with later sections overriding earlier ones, and parses only
+        those sections"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_fp = os.path.join(tmp_dir, "var_defns.yaml")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                f.write(
+                    "user:\n"
+                    "  USHdir: /not/the/ush/dir\n"
+                    "  MACHINE: linux\n"
+                    "  QUOTED: \"it's\"\n"
+                    "workflow:\n"
+                    "  MACHINE: hera\n"
+                    "  CYCL_HRS: [0, 12]\n"
+                    "  UNSET: null\n"
+                    "  MESSAGE: 'say \"hi\", then go'\n"
+                    "  FIELDS: [\"a,b\", \"c'd\"]\n"
+                    "rocoto:\n"
+                    "  tasks: {task_a: {}}\n"
+                )
+            source_yaml = os.path.join(self.ushdir, "bash_utils", "source_yaml.sh")
+            script = os.path.join(tmp_dir, "script.sh")
+            with open(script, "w", encoding="utf-8") as f:
+                f.write(
+                    f"source {source_yaml}\n"
+                    "uw() { echo UW=called; }\n"
+                    f"source_yaml {config_fp} user workflow\n"
+                    'echo "$USHdir|$MACHINE|${CYCL_HRS[1]}|$UNSET|${UW:-}"\n'
+                    'echo "$QUOTED|$MESSAGE|${FIELDS[0]}|${FIELDS[1]}"\n'
+                )
+            _, out, _ = util.run_command(f"bash {script}")
+            self.assertEqual(
+                out.strip().split("\n"),
+                ["/not/the/ush/dir|hera|12||", 'it\'s|say "hi", then go|a,b|c\'d'],
+            )
+
+            # Sections that weren't asked for aren't parsed
+            with open(config_fp, "a", encoding="utf-8") as f:
+                f.write("other:\n  VALUE: !!python/name:os.system\n")
+            _, out, _ = util.run_command(
+                f"""bash -c 'source {source_yaml}
+                source_yaml {config_fp} workflow
+                echo "$MACHINE"'"""
+            )
+            self.assertEqual(out.strip(), "hera")
+
+            with self.assertRaises(ValueError):
+                util.cfg_sections_to_sourceable_str(
+                    util.load_yaml_config(config_fp, keys=["workflow", "rocoto"]),
+                    ["workflow", "rocoto"],
+                )
+
+    def test_load_yaml_config_sections(self):
+        """ Test loading only some sections of a YAML file, and loading
+        sections lazily"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_fp = os.path.join(tmp_dir, "config.yaml")
+            with open(config_fp, "w", encoding="utf-8") as f:
+                f.write(
+                    "# A comment\n"
+                    "user:\n"
+                    "  MACHINE: linux\n"
+                    "\n"
+                    "workflow:\n"
+                    "  CYCL_HRS: [0, 12]\n"
+                    "  NAME: &name expt\n"
+                    "task_run_fcst:\n"
+                    "  NAME: *name\n"
+                )
+            cfg = util.load_yaml_config(config_fp, keys=["task_run_fcst", "user"])
+            self.assertEqual(cfg, {"user": {"MACHINE": "linux"}, "task_run_fcst": {"NAME": "expt"}})
+
+            cfg = util.load_yaml_config(config_fp, lazy=True)
+            self.assertEqual(list(cfg), ["user", "workflow", "task_run_fcst"])
+            self.assertEqual(cfg["workflow"]["CYCL_HRS"], [0, 12])
+            # The alias can't be resolved in its own section
+            self.assertEqual(cfg["task_run_fcst"]["NAME"], "expt")
+            self.assertEqual(dict(cfg), util.load_config_file(config_fp))
+
+    def test_stage_manifest(self):
+        """ Test that a stage is only rerun when its inputs or outputs
+        change"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_fp = os.path.join(tmp_dir, "input.yaml")
+            output_fp = os.path.join(tmp_dir, "output.nml")
+            with open(input_fp, "w", encoding="utf-8") as f:
+                f.write("a: 1\n")
+
+            def run_stage(manifest, values):
+                if manifest.needs_run("namelist", files=[input_fp], values=values,
+                                      outputs=[output_fp]):
+                    with open(output_fp, "w", encoding="utf-8") as f:
+                        f.write("&nml /\n")
+                    manifest.done("namelist")
+                    return True
+                return False
+
+            self.assertTrue(run_stage(util.StageManifest(tmp_dir), {"npx": 10}))
+            self.assertFalse(run_stage(util.StageManifest(tmp_dir), {"npx": 10}))
+            # Not reusing the saved manifest
+            self.assertTrue(run_stage(util.StageManifest(tmp_dir, reuse=False), {"npx": 10}))
+            # Changed values
+            self.assertTrue(run_stage(util.StageManifest(tmp_dir), {"npx": 11}))
+            # Changed input file
+            with open(input_fp, "a", encoding="utf-8") as f:
+                f.write("b: 2\n")
+            self.assertTrue(run_stage(util.StageManifest(tmp_dir), {"npx": 11}))
+            # Removed output
+            os.remove(output_fp)
+            self.assertTrue(run_stage(util.StageManifest(tmp_dir), {"npx": 11}))
+            self.assertFalse(run_stage(util.StageManifest(tmp_dir), {"npx": 11}))
+
     def test_print_msg(self):
         """ Test that a bool is returned from print_info_msg"""
         self.assertEqual(util.print_info_msg("Hello World!", verbose=False), False)
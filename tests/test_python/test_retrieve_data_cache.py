@@ -0,0 +1,110 @@
+"""
+Unit tests of the cache of retrieved files, and the transfer report, of
+retrieve_data.py.
+"""
+
+#pylint: disable=invalid-name
+
+import glob
+import json
+import os
+
+import retrieve_data
+
+from .retrieve_data_fixtures import RetrieveDataTestCase, ThrottlingHandler
+
+
+class UnitTesting(RetrieveDataTestCase):
+
+    """Tests of the FileCache and the TransferReport."""
+
+    def test_cache(self):
+        """A second retrieval is served from the cache, and the cache
+        evicts the least recently used files to stay in budget."""
+
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'aws',
+            '--data_type', 'LOCAL',
+            '--fcst_hrs', '0', '6', '3',
+            '--ics_or_lbcs', 'LBCS',
+            '--summary_file', 'summary.sh',
+            '--cache_dir', cache_dir,
+            '--transfer_backend', 'python',
+        ]
+        # fmt: on
+        retrieve_data.main(args + ["--output_path", self.output])
+
+        # Nothing is left on the server, so the files must come from
+        # the cache.
+        second = os.path.join(self.tmp_dir.name, "second")
+        os.makedirs(second)
+        for fn in os.listdir(os.path.join(self.source, "20230601")):
+            os.remove(os.path.join(self.source, "20230601", fn))
+        retrieve_data.main(args + ["--output_path", second])
+        for fn in os.listdir(self.output):
+            if fn != "summary.sh":
+                self.assertTrue(
+                    os.path.samefile(os.path.join(self.output, fn),
+                                     os.path.join(second, fn))
+                )
+        with open(os.path.join(second, "summary.sh"), encoding="utf-8") as f:
+            self.assertIn(f"EXTRN_MDL_CACHE_DIR={cache_dir}", f.read())
+
+        # Each file is 11 bytes, so only two fit.
+        cache = retrieve_data.FileCache(cache_dir, 22)
+        url = self.url.format(yyyymmdd="20230601")
+        target = os.path.join(self.tmp_dir.name, "target")
+        self.assertTrue(cache.fetch(f"{url}/a.t12z.f000", target))
+        cache.store("new", os.path.join(self.output, "b.t12z.f006"))
+        self.assertTrue(cache.fetch(f"{url}/a.t12z.f000", target))
+        self.assertTrue(cache.fetch("new", target))
+        self.assertFalse(cache.fetch(f"{url}/b.t12z.f000", target))
+        cache.close()
+
+    def test_transfer_report(self):
+        """The transfer report records the retries, bytes, and cache use
+        of each file, with totals for the data store."""
+
+        ThrottlingHandler.throttle = {"/20230601/a.t12z.f000"}
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'aws',
+            '--data_type', 'LOCAL',
+            '--fcst_hrs', '0',
+            '--output_path', self.output,
+            '--ics_or_lbcs', 'LBCS',
+            '--report_file', 'report.json',
+            '--cache_dir', cache_dir,
+            '--transfer_backend', 'python',
+            '--log_transfers',
+        ]
+        # fmt: on
+        retrieve_data.main(args)
+
+        with open(os.path.join(self.output, "report.json"), encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(report["cycle_date"], "2023060112")
+        files = {os.path.basename(rec["source"]): rec for rec in report["files"]}
+        self.assertEqual(files["a.t12z.f000"]["retries"], 1)
+        self.assertEqual(files["a.t12z.f000"]["bytes"], len("a.t12z.f000"))
+        self.assertEqual(files["b.t12z.f000"]["cache"], "miss")
+        store = report["data_stores"]["aws"]
+        self.assertEqual((store["files"], store["retrieved"]), (2, 2))
+        self.assertEqual(store["bytes"], 2 * len("a.t12z.f000"))
+        self.assertGreater(store["MB_per_s"], 0)
+
+        for fn in glob.glob(os.path.join(self.output, "?.t12z.f000")):
+            os.remove(fn)
+        retrieve_data.main(args)
+        with open(os.path.join(self.output, "report.json"), encoding="utf-8") as f:
+            store = json.load(f)["data_stores"]["aws"]
+        self.assertEqual((store["cache_hits"], store["bytes"]), (2, 0))
@@ -0,0 +1,265 @@
+"""
+Unit tests of retrieve_data.py that retrieve files from HPSS, through
+fake hsi and htar commands.
+"""
+
+#pylint: disable=invalid-name
+
+import datetime
+import os
+import tarfile
+import zipfile
+
+import retrieve_data
+
+from .retrieve_data_fixtures import RetrieveDataTestCase
+
+
+FAKE_HSI = """#!/usr/bin/env python3
+# A stand-in for hsi that serves files under $FAKE_HPSS and logs each
+# session to $FAKE_HPSS/sessions.
+import os
+import shutil
+import sys
+
+root = os.environ["FAKE_HPSS"]
+with open(os.path.join(root, "sessions"), "a", encoding="utf-8") as log:
+    log.write(" ".join(sys.argv[1:]) + "\\n")
+args = [arg for arg in sys.argv[1:] if arg != "-P"]
+if args[0] == "in":
+    with open(args[1], encoding="utf-8") as cmd_file:
+        cmds = [line.split() for line in cmd_file if line.strip()]
+else:
+    cmds = [args]
+status = 0
+for cmd in cmds:
+    path = cmd[-1]
+    if os.path.exists(root + path) and cmd[0] == "get":
+        shutil.copy(root + path, os.path.basename(path))
+    elif os.path.exists(root + path):
+        print(f"FILE\\t{path}\\t10\\t10")
+    else:
+        print("*** hpss_Lstat: No such file or directory [-2: HPSS_ENOENT]",
+              file=sys.stderr)
+        status = 72
+sys.exit(status)
+"""
+
+
+FAKE_HTAR = """#!/usr/bin/env python3
+# A stand-in for htar -xvf that extracts from tar files under
+# $FAKE_HPSS and logs each session to $FAKE_HPSS/sessions.
+import fnmatch
+import os
+import sys
+import tarfile
+
+root = os.environ["FAKE_HPSS"]
+with open(os.path.join(root, "sessions"), "a", encoding="utf-8") as log:
+    log.write("htar " + " ".join(sys.argv[1:]) + "\\n")
+archive, paths = sys.argv[2], [os.path.normpath(p) for p in sys.argv[3:]]
+found = set()
+with tarfile.open(root + archive) as tar:
+    for member in tar.getmembers():
+        name = os.path.normpath(member.name)
+        matches = [p for p in paths if fnmatch.fnmatch(name, p)]
+        if matches:
+            tar.extract(member)
+            found.update(matches)
+sys.exit(0 if found == set(paths) else 72)
+"""
+
+
+class UnitTesting(RetrieveDataTestCase):
+
+    """Tests of probing and extracting HPSS archives."""
+
+    def install_fake_hpss(self):
+        """Put fake hsi and htar commands on the PATH, serving files from
+        a directory that is returned."""
+        hpss = os.path.join(self.tmp_dir.name, "hpss")
+        bindir = os.path.join(self.tmp_dir.name, "bin")
+        os.makedirs(hpss, exist_ok=True)
+        os.makedirs(bindir, exist_ok=True)
+        for name, script in (("hsi", FAKE_HSI), ("htar", FAKE_HTAR)):
+            with open(os.path.join(bindir, name), "w", encoding="utf-8") as f:
+                f.write(script)
+            os.chmod(os.path.join(bindir, name), 0o755)
+
+        env = os.environ.copy()
+        self.addCleanup(os.environ.update, env)
+        self.addCleanup(os.environ.clear)
+        os.environ["FAKE_HPSS"] = hpss
+        os.environ["PATH"] = f"{bindir}:{os.environ['PATH']}"
+        return hpss
+
+    def test_find_archive_files(self):
+        """All candidate archives are probed in one hsi session. Archives
+        found are reused from the listing cache, while missing ones are
+        probed again, so that an archive that appears later is used."""
+
+        hpss = self.install_fake_hpss()
+        os.makedirs(os.path.join(hpss, "arch", "20230601"))
+        with open(os.path.join(hpss, "arch", "20230601", "new_12.tar"), "w",
+                  encoding="utf-8") as f:
+            f.write("tar")
+        listings_fp = os.path.join(self.tmp_dir.name, "listings.sqlite")
+
+        def find():
+            listings = retrieve_data.ListingCache(listings_fp)
+            try:
+                return retrieve_data.find_archive_files(
+                    paths=["/arch/{yyyymmdd}"] * 3,
+                    file_names=[
+                        "old_{hh}.tar",
+                        ["a_{hh}.tar", "b_{hh}.tar"],
+                        "new_{hh}.tar",
+                    ],
+                    cycle_date=datetime.datetime(2023, 6, 1, 12),
+                    ens_group=-1,
+                    listings=listings,
+                )
+            finally:
+                listings.close()
+
+        for _ in range(2):
+            self.assertEqual(find(), ({0: "/arch/20230601/new_12.tar"}, 2))
+        with open(os.path.join(hpss, "arch", "20230601", "old_12.tar"), "w",
+                  encoding="utf-8") as f:
+            f.write("tar")
+        self.assertEqual(find(), ({0: "/arch/20230601/old_12.tar"}, 0))
+
+        with open(os.path.join(hpss, "sessions"), encoding="utf-8") as f:
+            sessions = f.readlines()
+        self.assertEqual(len(sessions), 3)
+
+        # Only the archive found is cached
+        listings = retrieve_data.ListingCache(listings_fp)
+        self.assertTrue(listings.listing("/arch/20230601/new_12.tar"))
+        self.assertFalse(listings.listing("/arch/20230601/a_12.tar"))
+        listings.close()
+
+    def test_hpss_ensemble(self):
+        """Files for every member come out of a single htar call per
+        archive, and files missing from the archive are unavailable."""
+
+        hpss = self.install_fake_hpss()
+        os.makedirs(os.path.join(hpss, "arch"))
+        staging = os.path.join(self.tmp_dir.name, "staging")
+        for mem in (1, 2, 3):
+            for fcst_hr in (3, 6):
+                fn = os.path.join(
+                    staging, "ens.20230601", "12", f"mem{mem:03d}",
+                    f"f.t12z.atmf{fcst_hr:03d}.nc",
+                )
+                os.makedirs(os.path.dirname(fn), exist_ok=True)
+                with open(fn, "w", encoding="utf-8") as f:
+                    f.write(fn)
+        with tarfile.open(os.path.join(hpss, "arch", "ens_grp1.tar"), "w") as tar:
+            tar.add(os.path.join(staging, "ens.20230601"), arcname="./ens.20230601")
+
+        with open(self.config, "a", encoding="utf-8") as f:
+            f.write(
+                "ENS:\n"
+                "  hpss:\n"
+                "    protocol: htar\n"
+                "    archive_path:\n"
+                "      - /arch\n"
+                "    archive_internal_dir:\n"
+                "      - ./ens.{yyyymmdd}/{hh}/atmos/mem{mem:03d}\n"
+                "      - ./ens.{yyyymmdd}/{hh}/mem{mem:03d}\n"
+                "    archive_file_names:\n"
+                "      fcst:\n"
+                "        - ens_grp{ens_group}.tar\n"
+                "    file_names:\n"
+                "      fcst:\n"
+                "        - f.t{hh}z.atmf{fcst_hr:03d}.nc\n"
+            )
+
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'hpss',
+            '--data_type', 'ENS',
+            '--fcst_hrs', '3', '6', '3',
+            '--output_path', os.path.join(self.output, "mem{mem:03d}"),
+            '--ics_or_lbcs', 'LBCS',
+            '--members', '1', '3',
+        ]
+        # fmt: on
+        workdir = os.path.join(self.tmp_dir.name, "work")
+        os.makedirs(workdir)
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        self.addCleanup(os.chdir, cwd)
+        retrieve_data.main(args)
+
+        for mem in (1, 2, 3):
+            for fcst_hr in (3, 6):
+                fn = os.path.join(self.output, f"mem{mem:03d}",
+                                  f"f.t12z.atmf{fcst_hr:03d}.nc")
+                self.assertTrue(os.path.exists(fn))
+        self.assertEqual(os.listdir(workdir), [])
+        with open(os.path.join(hpss, "sessions"), encoding="utf-8") as f:
+            sessions = [line for line in f if line.startswith("htar")]
+        self.assertEqual(len(sessions), 1)
+
+        with self.assertRaises(SystemExit):
+            retrieve_data.main(args[:-3] + ['--members', '1', '4'])
+
+    def test_hpss_zip(self):
+        """Requested members of a zip archive on HPSS are extracted
+        straight into the output path."""
+
+        hpss = self.install_fake_hpss()
+        os.makedirs(os.path.join(hpss, "arch"))
+        for archive in ("obs.zip", "obs_copy.zip"):
+            with zipfile.ZipFile(os.path.join(hpss, "arch", archive), "w") as zip_file:
+                for hh in range(24):
+                    zip_file.writestr(f"obs/{hh:02d}/obs.t{hh:02d}z.nc", f"obs {hh}")
+
+        with open(self.config, "a", encoding="utf-8") as f:
+            f.write(
+                "ZIP:\n"
+                "  hpss:\n"
+                "    protocol: htar\n"
+                "    archive_format: zip\n"
+                "    archive_path:\n"
+                "      - /arch\n"
+                "    archive_internal_dir:\n"
+                "      - ./obs/{hh}\n"
+                "    archive_file_names:\n"
+                "      - [obs.zip, obs_copy.zip]\n"
+                "    file_names:\n"
+                "      obs:\n"
+                "        - obs.t{hh}z.*\n"
+            )
+
+        # fmt: off
+        args = [
+            '--file_set', 'obs',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'hpss',
+            '--data_type', 'ZIP',
+            '--output_path', self.output,
+        ]
+        # fmt: on
+        workdir = os.path.join(self.tmp_dir.name, "work")
+        os.makedirs(workdir)
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        self.addCleanup(os.chdir, cwd)
+        retrieve_data.main(args)
+
+        self.assertEqual(os.listdir(self.output), ["obs.t12z.nc"])
+        with open(os.path.join(self.output, "obs.t12z.nc"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "obs 12")
+        self.assertEqual(os.listdir(workdir), [])
+
+        # The second archive isn't staged once the first had every file
+        with open(os.path.join(hpss, "sessions"), encoding="utf-8") as f:
+            gets = [line.split()[-1] for line in f if line.startswith("get")]
+        self.assertEqual(gets, ["/arch/obs.zip"])
@@ -0,0 +1,444 @@
+"""
+Unit tests of retrieve_data.py that download files from a local HTTP
+server, or copy them from disk.
+"""
+
+#pylint: disable=invalid-name
+
+import argparse
+import datetime
+import glob
+import os
+
+import retrieve_data
+
+from .retrieve_data_fixtures import RetrieveDataTestCase, ThrottlingHandler
+
+
+class UnitTesting(RetrieveDataTestCase):
+
+    """Tests of retrieving files over HTTP and from disk."""
+
+    def test_concurrent_download(self):
+        """Download files with several workers, backing off from a
+        throttled request, and write the summary file."""
+
+        ThrottlingHandler.throttle = {"/20230601/b.t12z.f003"}
+
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'aws',
+            '--data_type', 'LOCAL',
+            '--fcst_hrs', '0', '6', '3',
+            '--output_path', self.output,
+            '--ics_or_lbcs', 'LBCS',
+            '--summary_file', 'summary.sh',
+            '--max_workers', '4',
+        ]
+        # fmt: on
+        retrieve_data.main(args)
+
+        self.assertEqual(len(glob.glob(os.path.join(self.output, "?.t12z.f*"))), 6)
+        self.assertFalse(ThrottlingHandler.throttle)
+        with open(os.path.join(self.output, "summary.sh"), encoding="utf-8") as f:
+            summary = f.read()
+        self.assertIn("EXTRN_MDL_FNS=( a.t12z.f000 a.t12z.f003 a.t12z.f006 "
+                      "b.t12z.f000 b.t12z.f003 b.t12z.f006 )", summary)
+
+    def test_alternate_locations(self):
+        """Files missing from the first location are downloaded from the
+        second one, never at the same time as the first. As in a
+        one-at-a-time pass, the forecast hours before the first missing
+        file only use the first location, and those after it try them
+        all."""
+
+        ThrottlingHandler.throttle = set()
+        ThrottlingHandler.paths = []
+        mirror = os.path.join(self.source, "mirror")
+        os.makedirs(mirror)
+        for fn in os.listdir(os.path.join(self.source, "20230601")):
+            with open(os.path.join(mirror, fn), "w", encoding="utf-8") as f:
+                f.write(fn)
+        os.remove(os.path.join(self.source, "20230601", "b.t12z.f003"))
+
+        cla = argparse.Namespace(
+            cycle_date=datetime.datetime(2023, 6, 1, 12),
+            fcst_hrs=[0, 3, 6],
+            members=None,
+            output_path=self.output,
+            check_file=False,
+            transfer_backend="python",
+            max_workers=4,
+        )
+        url = f"http://127.0.0.1:{self.server.server_port}"
+        unavailable = retrieve_data.get_requested_files(
+            cla,
+            file_templates=["a.t{hh}z.f{fcst_hr:03d}", "b.t{hh}z.f{fcst_hr:03d}"],
+            input_locs=[f"{url}/{{yyyymmdd}}", f"{url}/mirror"],
+            method="download",
+            check_all=True,
+        )
+
+        self.assertEqual(unavailable, [f"{url}/20230601/b.t12z.f003"])
+        for fn in os.listdir(mirror):
+            with open(os.path.join(self.output, fn), encoding="utf-8") as f:
+                self.assertEqual(f.read(), fn)
+        self.assertFalse(glob.glob(os.path.join(self.output, "*.part")))
+        mirror_paths = [p for p in ThrottlingHandler.paths if p.startswith("/mirror")]
+        self.assertEqual(
+            sorted(mirror_paths),
+            ["/mirror/a.t12z.f003", "/mirror/a.t12z.f006",
+             "/mirror/b.t12z.f003", "/mirror/b.t12z.f006"],
+        )
+        first = ThrottlingHandler.paths.index("/20230601/b.t12z.f003")
+        self.assertGreater(ThrottlingHandler.paths.index("/mirror/a.t12z.f003"), first)
+
+    def test_shared_file(self):
+        """A file whose template has no forecast hour is downloaded once,
+        not by every forecast hour at the same time."""
+
+        ThrottlingHandler.throttle = set()
+        ThrottlingHandler.paths = []
+        cla = argparse.Namespace(
+            cycle_date=datetime.datetime(2023, 6, 1, 12),
+            fcst_hrs=[0, 3, 6],
+            members=None,
+            output_path=self.output,
+            check_file=False,
+            transfer_backend="python",
+            max_workers=4,
+        )
+        unavailable = retrieve_data.get_requested_files(
+            cla,
+            file_templates=["a.t{hh}z.f000", "b.t{hh}z.f{fcst_hr:03d}"],
+            input_locs=self.url,
+            method="download",
+        )
+
+        self.assertEqual(unavailable, [])
+        self.assertEqual(ThrottlingHandler.paths.count("/20230601/a.t12z.f000"), 1)
+        with open(os.path.join(self.output, "a.t12z.f000"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000")
+        self.assertFalse(glob.glob(os.path.join(self.output, "*.part")))
+
+    def test_python_backend(self):
+        """Download files over pooled keep-alive connections, resuming
+        a partial file and verifying a complete one."""
+
+        ThrottlingHandler.throttle = set()
+        ThrottlingHandler.connections = set()
+        with open(os.path.join(self.output, "a.t12z.f000.part"), "w", encoding="utf-8") as f:
+            f.write("a.t12")
+        with open(os.path.join(self.output, "b.t12z.f000"), "w", encoding="utf-8") as f:
+            f.write("b.t12z.f000")
+
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'aws',
+            '--data_type', 'LOCAL',
+            '--fcst_hrs', '0', '6', '3',
+            '--output_path', self.output,
+            '--ics_or_lbcs', 'LBCS',
+            '--transfer_backend', 'python',
+        ]
+        # fmt: on
+        retrieve_data.main(args)
+
+        for fn in os.listdir(os.path.join(self.source, "20230601")):
+            with open(os.path.join(self.output, fn), encoding="utf-8") as f:
+                self.assertEqual(f.read(), fn)
+        self.assertFalse(glob.glob(os.path.join(self.output, "*.part")))
+        self.assertEqual(len(ThrottlingHandler.connections), 1)
+
+        # A missing file is unavailable, rather than an error
+        pool = retrieve_data.ConnectionPool()
+        url = self.url.format(yyyymmdd="20230601")
+        self.assertFalse(
+            retrieve_data.http_download_file(f"{url}/c.t12z.f000", self.output, pool)
+        )
+        self.assertTrue(retrieve_data.http_check_file(f"{url}/a.t12z.f000", pool))
+        pool.close()
+
+    def test_complete_file_without_total(self):
+        """A complete file is kept when the server rejects the resumed
+        range without reporting the total size."""
+
+        ThrottlingHandler.throttle = set()
+        ThrottlingHandler.content_range = False
+        self.addCleanup(setattr, ThrottlingHandler, "content_range", True)
+        output = os.path.join(self.output, "a.t12z.f000")
+        with open(output, "w", encoding="utf-8") as f:
+            f.write("a.t12z.f000")
+
+        pool = retrieve_data.ConnectionPool()
+        url = self.url.format(yyyymmdd="20230601")
+        self.assertTrue(
+            retrieve_data.http_download_file(f"{url}/a.t12z.f000", self.output, pool)
+        )
+        pool.close()
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000")
+        self.assertFalse(os.path.exists(f"{output}.part"))
+
+    def test_keep_complete_file(self):
+        """A file downloaded before is never moved: it stays in place
+        when the server fails, throttles or refuses the request, and is
+        only replaced once the rest of a longer file has arrived."""
+
+        ThrottlingHandler.throttle = set()
+        url = self.url.format(yyyymmdd="20230601")
+        output = os.path.join(self.output, "a.t12z.f000")
+        pool = retrieve_data.ConnectionPool()
+        self.addCleanup(pool.close)
+
+        # Gone from the server
+        os.rename(os.path.join(self.source, "20230601", "a.t12z.f000"),
+                  os.path.join(self.source, "a.t12z.f000"))
+        with open(output, "w", encoding="utf-8") as f:
+            f.write("a.t12z.f000")
+        self.assertFalse(
+            retrieve_data.http_download_file(f"{url}/a.t12z.f000", self.output, pool)
+        )
+        os.rename(os.path.join(self.source, "a.t12z.f000"),
+                  os.path.join(self.source, "20230601", "a.t12z.f000"))
+
+        # Throttled
+        ThrottlingHandler.throttle = {"/20230601/a.t12z.f000"}
+        with self.assertRaises(retrieve_data.ThrottledError):
+            retrieve_data.http_download_file(f"{url}/a.t12z.f000", self.output, pool)
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000")
+        self.assertFalse(os.path.exists(f"{output}.part"))
+
+        # Longer on the server than the file downloaded before
+        with open(output, "w", encoding="utf-8") as f:
+            f.write("a.t12")
+        self.assertTrue(
+            retrieve_data.http_download_file(f"{url}/a.t12z.f000", self.output, pool)
+        )
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000")
+        self.assertFalse(os.path.exists(f"{output}.part"))
+
+        # Longer than the file on the server
+        with open(output, "w", encoding="utf-8") as f:
+            f.write("a.t12z.f000 and more")
+        self.assertFalse(
+            retrieve_data.http_download_file(f"{url}/a.t12z.f000", self.output, pool)
+        )
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000 and more")
+
+    def test_grib_index_ranges(self):
+        """Matching records are turned into coalesced byte ranges, with
+        sub-messages sharing their parent's range."""
+
+        index = (
+            "1:0:d=2023060112:PRMSL:mean sea level:anl:\n"
+            "2:100:d=2023060112:TMP:2 m above ground:anl:\n"
+            "3:250:d=2023060112:SPFH:2 m above ground:anl:\n"
+            "4:400:d=2023060112:UGRD:10 m above ground:anl:\n"
+            "4.2:400:d=2023060112:VGRD:10 m above ground:anl:\n"
+            "5:600:d=2023060112:HGT:surface:anl:\n"
+        )
+        ranges = retrieve_data.grib_index_ranges
+        self.assertEqual(ranges(index, [":2 m above ground:"]), [(100, 399)])
+        self.assertEqual(
+            ranges(index, [":PRMSL:", ":VGRD:"]), [(0, 99), (400, 599)]
+        )
+        self.assertEqual(ranges(index, [":UGRD:", ":HGT:"]), [(400, None)])
+        self.assertEqual(ranges(index, [":RH:"]), [])
+
+    def test_grib_subset(self):
+        """Download only the records named in a store's variables."""
+
+        records = [b"GRIB-PRMSL-7777", b"GRIB-TMP2M-7777", b"GRIB-UV10M-7777"]
+        index = ""
+        offset = 0
+        for num, (record, name) in enumerate(
+            zip(records, ["PRMSL:mean sea level", "TMP:2 m above ground",
+                          "UGRD:10 m above ground"]), start=1):
+            index += f"{num}:{offset}:d=2023060112:{name}:anl:\n"
+            offset += len(record)
+        grib = os.path.join(self.source, "20230601", "g.t12z.f000.grib2")
+        with open(grib, "wb") as f:
+            f.write(b"".join(records))
+        with open(f"{grib}.idx", "w", encoding="utf-8") as f:
+            f.write(index)
+
+        with open(self.config, "a", encoding="utf-8") as f:
+            f.write(
+                "GRIB:\n"
+                "  aws:\n"
+                "    protocol: download\n"
+                f"    url: {self.url}\n"
+                "    variables:\n"
+                "      - ':PRMSL:'\n"
+                "      - ':UGRD:10 m above ground:'\n"
+                "    file_names:\n"
+                "      anl:\n"
+                "        - g.t{hh}z.f{fcst_hr:03d}.grib2\n"
+                "        - a.t{hh}z.f{fcst_hr:03d}\n"
+            )
+
+        # fmt: off
+        args = [
+            '--file_set', 'anl',
+            '--config', self.config,
+            '--cycle_date', '2023060112',
+            '--data_stores', 'aws',
+            '--data_type', 'GRIB',
+            '--output_path', self.output,
+            '--ics_or_lbcs', 'ICS',
+        ]
+        # fmt: on
+        retrieve_data.main(args)
+
+        with open(os.path.join(self.output, "g.t12z.f000.grib2"), "rb") as f:
+            self.assertEqual(f.read(), records[0] + records[2])
+        # Files without an inventory are downloaded whole
+        with open(os.path.join(self.output, "a.t12z.f000"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000")
+
+    def test_unavailable_accounting(self):
+        """Files missing from the first location are reported in the
+        same order as a one-at-a-time retrieval would, and the forecast
+        hours after the first missing file go on to the next location
+        even when the first had all their files."""
+
+        os.remove(os.path.join(self.source, "20230601", "a.t12z.f003"))
+        cla = argparse.Namespace(
+            cycle_date=datetime.datetime(2023, 6, 1, 12),
+            fcst_hrs=[0, 3, 6],
+            members=None,
+            output_path=self.output,
+            symlink=True,
+            check_file=False,
+            max_workers=4,
+        )
+        source = os.path.join(self.source, "{yyyymmdd}")
+        for max_workers in (1, 4):
+            cla.max_workers = max_workers
+            for fn in os.listdir(self.output):
+                os.remove(os.path.join(self.output, fn))
+            unavailable = retrieve_data.get_requested_files(
+                cla,
+                file_templates=["a.t{hh}z.f{fcst_hr:03d}", "b.t{hh}z.f{fcst_hr:03d}"],
+                input_locs=[source, source],
+                method="disk",
+            )
+            self.assertEqual(
+                unavailable,
+                [os.path.join(self.source, "20230601", "a.t12z.f003")],
+            )
+            self.assertEqual(
+                sorted(os.listdir(self.output)),
+                ["a.t12z.f000", "a.t12z.f006", "b.t12z.f003", "b.t12z.f006"],
+            )
+
+    def test_batch_cycles(self):
+        """Retrieve several cycles in one process into per-cycle output
+        directories, each with its own summary file."""
+
+        ThrottlingHandler.throttle = set()
+        ThrottlingHandler.connections = set()
+        os.makedirs(os.path.join(self.source, "20230602"))
+        for fn in ("a.t12z.f000", "b.t12z.f000"):
+            with open(os.path.join(self.source, "20230602", fn), "w", encoding="utf-8") as f:
+                f.write(fn)
+        output = os.path.join(self.output, "{yyyymmddhh}")
+        for cycle in ("2023060112", "2023060212"):
+            os.makedirs(os.path.join(self.output, cycle))
+
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_dates', '2023060112', '2023060212', '24',
+            '--data_stores', 'aws',
+            '--data_type', 'LOCAL',
+            '--fcst_hrs', '0',
+            '--output_path', output,
+            '--ics_or_lbcs', 'LBCS',
+            '--summary_file', 'summary.sh',
+            '--transfer_backend', 'python',
+        ]
+        # fmt: on
+        retrieve_data.main(args)
+
+        for cycle in ("2023060112", "2023060212"):
+            with open(os.path.join(self.output, cycle, "summary.sh"), encoding="utf-8") as f:
+                self.assertIn(f"EXTRN_MDL_CDATE={cycle}", f.read())
+            with open(os.path.join(self.output, cycle, "b.t12z.f000"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "b.t12z.f000")
+        self.assertEqual(len(ThrottlingHandler.connections), 1)
+
+    def test_prefetch(self):
+        """Prefetch skips cycles that are already staged, and gives up on
+        cycles whose data never appear."""
+
+        ThrottlingHandler.throttle = set()
+        output = os.path.join(self.output, "{yyyymmddhh}")
+        for cycle in ("2023053112", "2023060112"):
+            os.makedirs(os.path.join(self.output, cycle))
+        with open(os.path.join(self.output, "2023053112", "summary.sh"), "w",
+                  encoding="utf-8") as f:
+            f.write("DATA_SRC=aws\n")
+
+        # fmt: off
+        args = [
+            '--file_set', 'fcst',
+            '--config', self.config,
+            '--cycle_dates', '2023053112', '2023060212', '24',
+            '--data_stores', 'aws',
+            '--data_type', 'LOCAL',
+            '--fcst_hrs', '0',
+            '--output_path', output,
+            '--ics_or_lbcs', 'LBCS',
+            '--summary_file', 'summary.sh',
+            '--prefetch',
+            '--prefetch_interval', '0',
+        ]
+        # fmt: on
+        with self.assertRaises(SystemExit):
+            retrieve_data.main(args)
+
+        self.assertFalse(glob.glob(os.path.join(self.output, "2023053112", "?.t12z.f*")))
+        with open(os.path.join(self.output, "2023060112", "summary.sh"), encoding="utf-8") as f:
+            self.assertIn("EXTRN_MDL_CDATE=2023060112", f.read())
+
+    def test_stage_files(self):
+        """Files on disk are linked or copied into place, replacing any
+        existing files, without running cp or ln."""
+
+        source = os.path.join(self.source, "20230601", "a.t12z.f000")
+        with open(os.path.join(self.output, "a.t12z.f000"), "w", encoding="utf-8") as f:
+            f.write("stale")
+        os.chmod(source, 0o640)
+
+        self.assertTrue(retrieve_data.stage_file(source, self.output))
+        target = os.path.join(self.output, "a.t12z.f000")
+        self.assertFalse(os.path.islink(target))
+        self.assertEqual(os.stat(target).st_mode & 0o777, 0o640 & ~self.umask())
+        with open(target, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "a.t12z.f000")
+
+        self.assertTrue(retrieve_data.stage_file(source, self.output, symlink=True))
+        self.assertEqual(os.readlink(target), source)
+
+        missing = os.path.join(self.source, "20230601", "c.t12z.f000")
+        self.assertFalse(retrieve_data.stage_file(missing, self.output))
+        self.assertEqual(os.listdir(self.output), ["a.t12z.f000"])
+
+    @staticmethod
+    def umask():
+        """Return the process umask."""
+        mask = os.umask(0)
+        os.umask(mask)
+        return mask
@@ -3,6 +3,8 @@
 import os
 import unittest
 
+from python_utils import GeneratorContext
+
 from set_predef_grid_params import set_predef_grid_params
 
 class Testing(unittest.TestCase):
@@ -43,3 +45,17 @@ class Testing(unittest.TestCase):
             fcst_config["QUILTING"],
         )
         self.assertEqual(params_dict["WRTCMP_nx"], 1799)
+
+    def test_set_predef_grid_params_context(self):
+        """ Check that the grids are read through a GeneratorContext, and
+        that changing the parameters returned doesn't change its copy."""
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        ushdir = os.path.join(test_dir, "..", "..", "ush")
+        context = GeneratorContext()
+        params_dict = set_predef_grid_params(ushdir, "RRFS_CONUS_3km", True, context)
+        self.assertEqual(params_dict["WRTCMP_nx"], 1799)
+        params_dict = set_predef_grid_params(ushdir, "RRFS_CONUS_3km", False, context)
+        self.assertNotIn("QUILTING", params_dict)
+        params_dict = set_predef_grid_params(ushdir, "RRFS_CONUS_3km", True, context)
+        self.assertEqual(params_dict["WRTCMP_nx"], 1799)
+        self.assertEqual((context.hits, context.misses), (2, 1))
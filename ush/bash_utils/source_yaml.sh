@@ -13,24 +13,66 @@ Incorrect number of arguments specified:
 
 Usage:
 
-  ${func_name} yaml_file [section]
+  ${func_name} yaml_file [section ...]
 
   yaml_file: path to the YAML file to source
-  section:   optional subsection of yaml
+  section:   optional subsections of yaml, sourced in the order given
 "
   fi
-  local section
-  yaml_file=$1
-  section=$2
+  local yaml_file=$1
+  shift
+  local sections=( "$@" )
+
+  if [ "${#sections[@]}" -eq 0 ] ; then
+    while read -r line ; do
 
-  while read -r line ; do
 
+      # A regex to match list representations
+      line=$(echo "$line" | sed -E "s/='\[(.*)\]'/=(\1)/")
+      line=${line//,/}
+      line=${line//\"/}
+      line=${line/None/}
+      source <( echo "${line}" )
+    done < <(uw config realize -i "${yaml_file}" --output-format sh)
+    return
+  fi
 
-    # A regex to match list representations
-    line=$(echo "$line" | sed -E "s/='\[(.*)\]'/=(\1)/")
-    line=${line//,/}
-    line=${line//\"/}
-    line=${line/None/}
-    source <( echo "${line}" )
-  done < <(uw config realize -i "${yaml_file}" --output-format sh --key-path $section)
+  # Source the shell fragments that setup wrote for the sections, as long
+  # as the YAML file still has the checksum recorded with the fragments.
+  # This skips starting Python and parsing the whole file.
+  local fragments_dir="${yaml_file%.*}.d"
+  local section
+  if [ -f "${fragments_dir}/checksum" ] ; then
+    local checksum saved_checksum
+    local have_fragments="TRUE"
+    for section in "${sections[@]}" ; do
+      if [ ! -f "${fragments_dir}/${section}.sh" ] ; then
+        have_fragments="FALSE"
+        break
+      fi
+    done
+    read -r saved_checksum < "${fragments_dir}/checksum"
+    checksum=$(sha256sum "${yaml_file}" 2>/dev/null)
+    if [ "${have_fragments}" = "TRUE" ] && \
+       [ "${checksum%% *}" = "${saved_checksum}" ] ; then
+      for section in "${sections[@]}" ; do
+        source "${fragments_dir}/${section}.sh"
+      done
+      return
+    fi
+  fi
+
+  # Otherwise, convert all the sections in a single call, which prints
+  # them already in bash syntax, and source the result once.
+  # The converter is found next to this file, since sourcing the user
+  # section may reset USHdir.
+  local config_utils="${BASH_SOURCE[0]%/*}/../config_utils.py"
+  local sourceable
+  sourceable=$( python3 "${config_utils}" -c "${yaml_file}" \
+                --sections "${sections[@]}" ) || \
+    print_err_msg_exit "
+Could not convert the sections of a YAML file to bash:
+  yaml_file = \"${yaml_file}\"
+  sections = ( ${sections[*]} )"
+  source <( printf "%s\n" "${sourceable}" )
 }
@@ -113,7 +113,9 @@ def parse_args(argv):
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    cfg = load_yaml_config(args.path_to_defns)
+    cfg = load_yaml_config(
+        args.path_to_defns, keys=["workflow", "task_run_fcst", "cpl_aqm_parm"], snapshot=True
+    )
     cfg = flatten_dict(cfg)
     import_vars(dictionary=cfg)
     create_ufs_configure_file(
@@ -24,32 +24,48 @@ from python_utils import (
     import_vars,
     export_vars,
     cp_vrfy,
-    ln_vrfy,
-    mkdir_vrfy,
     mv_vrfy,
-    check_for_preexist_dir_file,
     cfg_to_yaml_str,
     find_pattern_in_str,
     flatten_dict,
+    load_yaml_config,
+    GeneratorContext,
+    StageManifest,
+    setup_input_files,
+    stage_fix_files,
+    profile_phase,
+    start_profiling,
+    stop_profiling,
 )
 
-from setup import setup
+from setup import setup, load_config_for_setup, fill_templates, set_srw_paths
 from set_fv3nml_sfc_climo_filenames import set_fv3nml_sfc_climo_filenames
+from set_fv3nml_sfc_climo_filenames import NEEDED_VARS as SFC_CLIMO_VARS
 from get_crontab_contents import add_crontab_line
 from check_python_version import check_python_version
 
-# pylint: disable=too-many-locals,too-many-branches, too-many-statements
+# pylint: disable=too-many-locals,too-many-branches, too-many-statements, too-many-arguments
+@profile_phase("generate_FV3LAM_wflow")
 def generate_FV3LAM_wflow(
         ushdir,
         logfile: str = "log.generate_FV3LAM_wflow",
-        debug: bool = False) -> str:
+        debug: bool = False,
+        incremental: bool = False,
+        user_config_fn: str = "config.yaml",
+        context=None) -> str:
     """Function to setup a forecast experiment and create a workflow
     (according to the parameters specified in the config file)
 
     Args:
-        ushdir  (str) : The full path of the ush/ directory where this script is located
-        logfile (str) : The name of the file where logging is written
-        debug   (bool): Enable extra output for debugging
+        ushdir      (str) : The full path of the ush/ directory where this script is located
+        logfile     (str) : The name of the file where logging is written
+        debug       (bool): Enable extra output for debugging
+        incremental (bool): Regenerate an existing experiment, only redoing the
+                            stages whose inputs changed since it was last generated
+        user_config_fn (str): The user config file, relative to ushdir or absolute
+        context (GeneratorContext): Context the shared config files are loaded
+                                    through; pass the same one when generating
+                                    several experiments to load them once
     Returns:
         EXPTDIR (str) : The full path of the directory where this experiment has been generated
     """
@@ -70,7 +86,8 @@ def generate_FV3LAM_wflow(
 
     # The setup function reads the user configuration file and fills in
     # non-user-specified values from config_defaults.yaml
-    expt_config = setup(ushdir,debug=debug)
+    expt_config, manifest = setup_stage(ushdir, debug, incremental, user_config_fn,
+                                        context)
 
     #
     # -----------------------------------------------------------------------
@@ -114,11 +131,15 @@ def generate_FV3LAM_wflow(
         # Call the python script to generate the experiment's XML file
         #
         rocoto_yaml_fp = expt_config["workflow"]["ROCOTO_YAML_FP"]
-        render(
-            input_file = template_xml_fp,
-            output_file = wflow_xml_fp,
-            values_src = rocoto_yaml_fp,
-            )
+        if manifest.needs_run("rocoto_xml", files=[template_xml_fp, rocoto_yaml_fp],
+                              outputs=[wflow_xml_fp]):
+            with profile_phase("render rocoto XML"):
+                render(
+                    input_file = template_xml_fp,
+                    output_file = wflow_xml_fp,
+                    values_src = rocoto_yaml_fp,
+                    )
+            manifest.done("rocoto_xml")
     #
     # -----------------------------------------------------------------------
     #
@@ -151,10 +172,13 @@ def generate_FV3LAM_wflow(
     launch_content =  template.safe_substitute(template_variables)
 
     launch_fp = os.path.join(exptdir, wflow_launch_script_fn)
-    with open(launch_fp, "w", encoding='utf-8') as expt_launch_fn:
-        expt_launch_fn.write(launch_content)
+    if manifest.needs_run("launch_script", files=[wflow_launch_script_fp],
+                          values={"launch_content": launch_content}, outputs=[launch_fp]):
+        with open(launch_fp, "w", encoding='utf-8') as expt_launch_fn:
+            expt_launch_fn.write(launch_content)
 
-    os.chmod(launch_fp, os.stat(launch_fp).st_mode|S_IXUSR)
+        os.chmod(launch_fp, os.stat(launch_fp).st_mode|S_IXUSR)
+        manifest.done("launch_script")
 
     #
     # -----------------------------------------------------------------------
@@ -179,115 +203,70 @@ def generate_FV3LAM_wflow(
                          exptdir=exptdir,debug=debug)
 
     #
-    # Copy or symlink fix files
+    # Copy or symlink fix files, and the MERRA2 aerosol climatology data.
     #
-    if SYMLINK_FIX_FILES:
-        log_info(
-            f"""
-            Symlinking fixed files from system directory (FIXgsm) to a subdirectory (FIXam):
-              FIXgsm = '{FIXgsm}'
-              FIXam = '{FIXam}'""",
-            verbose=debug,
-        )
-
-        ln_vrfy(f"""-fsn '{FIXgsm}' '{FIXam}'""")
-    else:
-
-        log_info(
-            f"""
-            Copying fixed files from system directory (FIXgsm) to a subdirectory (FIXam):
-              FIXgsm = '{FIXgsm}'
-              FIXam = '{FIXam}'""",
-            verbose=debug,
-        )
-
-        check_for_preexist_dir_file(FIXam, "delete")
-        mkdir_vrfy("-p", FIXam)
-        mkdir_vrfy("-p", os.path.join(FIXam, "fix_co2_proj"))
-
-        num_files = len(FIXgsm_FILES_TO_COPY_TO_FIXam)
-        for i in range(num_files):
-            fn = f"{FIXgsm_FILES_TO_COPY_TO_FIXam[i]}"
-            cp_vrfy(os.path.join(FIXgsm, fn), os.path.join(FIXam, fn))
+    stage_fix_files(expt_config, manifest, debug=debug)
     #
     # -----------------------------------------------------------------------
     #
-    # Copy MERRA2 aerosol climatology data.
+    # Copy templates of various input files to the experiment directory.
     #
     # -----------------------------------------------------------------------
     #
-    if USE_MERRA_CLIMO:
+    template_copies = {
+        DATA_TABLE_TMPL_FP: DATA_TABLE_FP,
+        FIELD_TABLE_TMPL_FP: FIELD_TABLE_FP,
+        CCPP_PHYS_SUITE_IN_CCPP_FP: CCPP_PHYS_SUITE_FP,
+        FIELD_DICT_IN_UWM_FP: FIELD_DICT_FP,
+    }
+    if manifest.needs_run("input_templates", files=list(template_copies),
+                          outputs=list(template_copies.values())):
         log_info(
-            f"""
-            Copying MERRA2 aerosol climatology data files from system directory
-            (FIXaer/FIXlut) to a subdirectory (FIXclim) in the experiment directory:
-              FIXaer = '{FIXaer}'
-              FIXlut = '{FIXlut}'
-              FIXclim = '{FIXclim}'""",
+            """
+            Copying templates of various input files to the experiment directory...""",
             verbose=debug,
         )
 
-        check_for_preexist_dir_file(FIXclim, "delete")
-        mkdir_vrfy("-p", FIXclim)
-
-        if SYMLINK_FIX_FILES:
-            ln_vrfy("-fsn", os.path.join(FIXaer, "merra2.aerclim*.nc"), FIXclim)
-            ln_vrfy("-fsn", os.path.join(FIXlut, "optics*.dat"), FIXclim)
-        else:
-            cp_vrfy(os.path.join(FIXaer, "merra2.aerclim*.nc"), FIXclim)
-            cp_vrfy(os.path.join(FIXlut, "optics*.dat"), FIXclim)
-    #
-    # -----------------------------------------------------------------------
-    #
-    # Copy templates of various input files to the experiment directory.
-    #
-    # -----------------------------------------------------------------------
-    #
-    log_info(
-        """
-        Copying templates of various input files to the experiment directory...""",
-        verbose=debug,
-    )
-
-    log_info(
-        """
-        Copying the template data table file to the experiment directory...""",
-        verbose=debug,
-    )
-    cp_vrfy(DATA_TABLE_TMPL_FP, DATA_TABLE_FP)
+        log_info(
+            """
+            Copying the template data table file to the experiment directory...""",
+            verbose=debug,
+        )
+        cp_vrfy(DATA_TABLE_TMPL_FP, DATA_TABLE_FP)
 
-    log_info(
-        """
-        Copying the template field table file to the experiment directory...""",
-        verbose=debug,
-    )
-    cp_vrfy(FIELD_TABLE_TMPL_FP, FIELD_TABLE_FP)
+        log_info(
+            """
+            Copying the template field table file to the experiment directory...""",
+            verbose=debug,
+        )
+        cp_vrfy(FIELD_TABLE_TMPL_FP, FIELD_TABLE_FP)
 
-    #
-    # Copy the CCPP physics suite definition file from its location in the
-    # clone of the FV3 code repository to the experiment directory (EXPT-
-    # DIR).
-    #
-    log_info(
-        """
-        Copying the CCPP physics suite definition XML file from its location in
-        the forecast model directory structure to the experiment directory...""",
-        verbose=debug,
-    )
-    cp_vrfy(CCPP_PHYS_SUITE_IN_CCPP_FP, CCPP_PHYS_SUITE_FP)
-    #
-    # Copy the field dictionary file from its location in the
-    # clone of the FV3 code repository to the experiment directory (EXPT-
-    # DIR).
-    #
-    log_info(
-        """
-        Copying the field dictionary file from its location in the
-        forecast model directory structure to the experiment
-        directory...""",
-        verbose=debug,
-    )
-    cp_vrfy(FIELD_DICT_IN_UWM_FP, FIELD_DICT_FP)
+        #
+        # Copy the CCPP physics suite definition file from its location in the
+        # clone of the FV3 code repository to the experiment directory (EXPT-
+        # DIR).
+        #
+        log_info(
+            """
+            Copying the CCPP physics suite definition XML file from its location in
+            the forecast model directory structure to the experiment directory...""",
+            verbose=debug,
+        )
+        cp_vrfy(CCPP_PHYS_SUITE_IN_CCPP_FP, CCPP_PHYS_SUITE_FP)
+        #
+        # Copy the field dictionary file from its location in the
+        # clone of the FV3 code repository to the experiment directory (EXPT-
+        # DIR).
+        #
+        log_info(
+            """
+            Copying the field dictionary file from its location in the
+            forecast model directory structure to the experiment
+            directory...""",
+            verbose=debug,
+        )
+        cp_vrfy(FIELD_DICT_IN_UWM_FP, FIELD_DICT_FP)
+        manifest.done("input_templates")
     #
     # -----------------------------------------------------------------------
     #
@@ -510,33 +489,50 @@ def generate_FV3LAM_wflow(
     # -----------------------------------------------------------------------
     #
 
-    physics_cfg = get_yaml_config(FV3_NML_YAML_CONFIG_FP)
-    base_namelist = get_nml_config(FV3_NML_BASE_SUITE_FP)
-    base_namelist.update_values(physics_cfg[CCPP_PHYS_SUITE])
-    base_namelist.update_values(settings)
-    for sect, values in base_namelist.copy().items():
-        if not values:
-            del base_namelist[sect]
-            continue
-        for k, v in values.copy().items():
-            if v is None:
-                del base_namelist[sect][k]
-    base_namelist.dump(FV3_NML_FP)
-    #
-    # If not running the TN_MAKE_GRID task (which implies the workflow will
-    # use pregenerated grid files), set the namelist variables specifying
-    # the paths to surface climatology files.  These files are located in
-    # (or have symlinks that point to them) in the FIXlam directory.
-    #
-    # Note that if running the TN_MAKE_GRID task, this action usually cannot
-    # be performed here but must be performed in that task because the names
-    # of the surface climatology files depend on the CRES parameter (which is
-    # the C-resolution of the grid), and this parameter is in most workflow
-    # configurations is not known until the grid is created.
-    #
-    if not expt_config['rocoto']['tasks'].get('task_make_grid'):
+    make_grid = bool(expt_config['rocoto']['tasks'].get('task_make_grid'))
+    flat_config = flatten_dict(expt_config)
+    nml_values = {
+        "settings": settings,
+        "CCPP_PHYS_SUITE": CCPP_PHYS_SUITE,
+        "task_make_grid": make_grid,
+        "sfc_climo": {var: flat_config.get(var) for var in SFC_CLIMO_VARS},
+    }
+    nml_files = [
+        FV3_NML_YAML_CONFIG_FP,
+        FV3_NML_BASE_SUITE_FP,
+        os.path.join(PARMdir, "fixed_files_mapping.yaml"),
+    ]
+    if manifest.needs_run("namelist", files=nml_files, values=nml_values,
+                          outputs=[FV3_NML_FP]):
+        with profile_phase("write namelist"):
+            physics_cfg = get_yaml_config(FV3_NML_YAML_CONFIG_FP)
+            base_namelist = get_nml_config(FV3_NML_BASE_SUITE_FP)
+            base_namelist.update_values(physics_cfg[CCPP_PHYS_SUITE])
+            base_namelist.update_values(settings)
+            for sect, values in base_namelist.copy().items():
+                if not values:
+                    del base_namelist[sect]
+                    continue
+                for k, v in values.copy().items():
+                    if v is None:
+                        del base_namelist[sect][k]
+            base_namelist.dump(FV3_NML_FP)
+        #
+        # If not running the TN_MAKE_GRID task (which implies the workflow will
+        # use pregenerated grid files), set the namelist variables specifying
+        # the paths to surface climatology files.  These files are located in
+        # (or have symlinks that point to them) in the FIXlam directory.
+        #
+        # Note that if running the TN_MAKE_GRID task, this action usually cannot
+        # be performed here but must be performed in that task because the names
+        # of the surface climatology files depend on the CRES parameter (which is
+        # the C-resolution of the grid), and this parameter is in most workflow
+        # configurations is not known until the grid is created.
+        #
+        if not make_grid:
 
-        set_fv3nml_sfc_climo_filenames(flatten_dict(expt_config), debug)
+            set_fv3nml_sfc_climo_filenames(flat_config, debug)
+        manifest.done("namelist")
 
     #
     # -----------------------------------------------------------------------
@@ -649,14 +645,18 @@ def generate_FV3LAM_wflow(
     #
     #-----------------------------------------------------------------------
     #
-    if any((DO_SPP, DO_SPPT, DO_SHUM, DO_SKEB, DO_LSM_SPP)):
-        realize(
-            input_config=FV3_NML_FP,
-            input_format="nml",
-            output_file=FV3_NML_STOCH_FP,
-            output_format="nml",
-            update_config=get_nml_config(settings),
-            )
+    if any((DO_SPP, DO_SPPT, DO_SHUM, DO_SKEB, DO_LSM_SPP)) and \
+            manifest.needs_run("stochastic_namelist", files=[FV3_NML_FP],
+                               values=settings, outputs=[FV3_NML_STOCH_FP]):
+        with profile_phase("realize stochastic namelist"):
+            realize(
+                input_config=FV3_NML_FP,
+                input_format="nml",
+                output_file=FV3_NML_STOCH_FP,
+                output_format="nml",
+                update_config=get_nml_config(settings),
+                )
+        manifest.done("stochastic_namelist")
 
     #
     # -----------------------------------------------------------------------
@@ -667,7 +667,7 @@ def generate_FV3LAM_wflow(
     #
     # -----------------------------------------------------------------------
     #
-    cp_vrfy(os.path.join(ushdir, EXPT_CONFIG_FN), EXPTDIR)
+    cp_vrfy(os.path.join(ushdir, user_config_fn), os.path.join(EXPTDIR, EXPT_CONFIG_FN))
 
     #
     # -----------------------------------------------------------------------
@@ -724,6 +724,64 @@ def generate_FV3LAM_wflow(
     return EXPTDIR
 
 
+@profile_phase("setup_stage")
+def setup_stage(ushdir: str, debug: bool = False, incremental: bool = False,
+                user_config_fn: str = "config.yaml", context=None):
+    """
+    Runs setup(), and returns the experiment configuration along with the
+    manifest of the stages of experiment generation.
+
+    If incremental = True and none of the files setup() reads have changed
+    since the experiment was last generated, the configuration setup() saved
+    in the experiment directory then is loaded instead of running it again.
+    Otherwise, setup() goes on from the configuration loaded to check them.
+    """
+    context = context or GeneratorContext()
+    expt_config = None
+    if incremental:
+        # Find the experiment directory, and the manifest saved in it
+        expt_config = load_config_for_setup(
+            ushdir,
+            os.path.join(ushdir, "config_defaults.yaml"),
+            os.path.join(ushdir, user_config_fn),
+            context,
+        )
+        # Fill in the path of the CCPP suite definition file, as setup() does
+        expt_config["user"].update(set_srw_paths(ushdir, expt_config))
+        fill_templates(expt_config)
+        workflow_config = expt_config["workflow"]
+        manifest = StageManifest(workflow_config["EXPTDIR"])
+        if not manifest.needs_run(
+                "setup",
+                files=setup_input_files(ushdir, expt_config, user_config_fn,
+                                        context.included),
+                outputs=[workflow_config["GLOBAL_VAR_DEFNS_FP"],
+                         workflow_config["ROCOTO_YAML_FP"]]):
+            log_info(
+                f"""
+                Reusing the experiment configuration from the last generation:
+                  GLOBAL_VAR_DEFNS_FP = '{workflow_config["GLOBAL_VAR_DEFNS_FP"]}'"""
+            )
+            expt_config = dict(
+                load_yaml_config(workflow_config["GLOBAL_VAR_DEFNS_FP"], snapshot=True)
+            )
+            expt_config["rocoto"] = load_yaml_config(workflow_config["ROCOTO_YAML_FP"])
+            return expt_config, manifest
+
+    expt_config = setup(ushdir, user_config_fn, debug=debug, incremental=incremental,
+                        context=context, expt_config=expt_config)
+
+    workflow_config = expt_config["workflow"]
+    if not incremental:
+        manifest = StageManifest(workflow_config["EXPTDIR"], reuse=False)
+    manifest.needs_run(
+        "setup",
+        files=setup_input_files(ushdir, expt_config, user_config_fn, context.included),
+        outputs=[workflow_config["GLOBAL_VAR_DEFNS_FP"], workflow_config["ROCOTO_YAML_FP"]])
+    manifest.done("setup")
+    return expt_config, manifest
+
+
 def setup_logging(logfile: str = "log.generate_FV3LAM_wflow", debug: bool = False) -> None:
     """
     Sets up logging, printing high-priority (INFO and higher) messages to screen, and printing all
@@ -765,6 +823,15 @@ if __name__ == "__main__":
 
     parser.add_argument('-d', '--debug', action='store_true',
                         help='Script will be run in debug mode with more verbose output')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Regenerate an existing experiment, only redoing the steps '\
+                        'whose inputs changed since it was last generated')
+    parser.add_argument('-c', '--config', default='config.yaml',
+                        help='The user config file, relative to the ush directory or absolute')
+    parser.add_argument('-p', '--profile', nargs='?', const='', metavar='FILE',
+                        help='Print the time spent in each phase of the generation. If FILE '\
+                        'ends in .json, also write the phases to it as JSON; otherwise '\
+                        'write a cProfile dump to it, to be read with pstats')
     pargs = parser.parse_args()
 
     USHdir = os.path.dirname(os.path.abspath(__file__))
@@ -772,8 +839,11 @@ if __name__ == "__main__":
 
     # Call the generate_FV3LAM_wflow function defined above to generate the
     # experiment/workflow.
+    if pargs.profile is not None:
+        start_profiling(cprofile=bool(pargs.profile) and not pargs.profile.endswith(".json"))
     try:
-        expt_dir = generate_FV3LAM_wflow(USHdir, wflow_logfile, pargs.debug)
+        expt_dir = generate_FV3LAM_wflow(USHdir, wflow_logfile, pargs.debug,
+                                         pargs.incremental, pargs.config)
     except: # pylint: disable=bare-except
         logging.exception(
             dedent(
@@ -789,6 +859,14 @@ if __name__ == "__main__":
         )
         sys.exit(1)
 
+    profiler = stop_profiling()
+    if profiler is not None:
+        logging.info(f"Time spent in each phase of the generation:\n{profiler.report()}")
+        if pargs.profile.endswith(".json"):
+            profiler.write_json(pargs.profile)
+        elif pargs.profile:
+            profiler.cprofile.dump_stats(pargs.profile)
+
     # pylint: disable=undefined-variable
     # Note workflow generation completion
     log_info(
@@ -4,24 +4,23 @@ import os
 import sys
 import argparse
 import re
-import glob
+import fnmatch
 
 from python_utils import (
     import_vars,
     print_input_args,
     print_info_msg,
     print_err_msg_exit,
-    create_symlink_to_file,
     define_macos_utilities,
     check_var_valid_value,
     flatten_dict,
-    cd_vrfy,
     mkdir_vrfy,
-    find_pattern_in_str,
     load_yaml_config,
+    profile_phase,
 )
 
 
+@profile_phase("link_fix")
 def link_fix(
     verbose,
     file_group,
@@ -33,6 +32,7 @@ def link_fix(
     nhw,
     run_task,
     sfc_climo_fields,
+    dry_run=False,
     **kwargs,
 ):
     """This file defines a function that links fix files to the target
@@ -51,6 +51,8 @@ def link_fix(
         run_task: boolean value indicating whether the task is to be run
                   in the experiment
         climo_fields: list of fields needed for climo
+        dry_run: print the links that would be created instead of
+                 creating them
 
     Returns:
         a string: resolution
@@ -224,103 +226,63 @@ def link_fix(
             fns.append(f"C*.{sfc_climo_field}.tile{tile_rgnl}.halo{nh0}.nc")
             fns.append(f"C*.{sfc_climo_field}.tile{tile_rgnl}.halo{nh4}.nc")
 
-    fps = [os.path.join(source_dir, itm) for itm in fns]
     #
     # -----------------------------------------------------------------------
     #
-    # Find all files matching the globbing patterns and make sure that they
-    # all have the same resolution (an integer) in their names.
+    # Find the files matching the globbing patterns in a single scan of the
+    # source directory, and make sure that they all have the same resolution
+    # (an integer) in their names.
     #
     # -----------------------------------------------------------------------
     #
-    i = 0
-    res_prev = ""
-    res = ""
-    fp_prev = ""
-
-    for pattern in fps:
-        files = glob.glob(pattern)
-        if not files:
-            print_err_msg_exit(
-                f"""
-                Trying to link files in group: {file_group} 
-                No files were found matching the pattern {pattern}.
-                """
-            )
-        for fp in files:
-
-            fn = os.path.basename(fp)
-
-            regex_search = "^C([0-9]*).*"
-            res = find_pattern_in_str(regex_search, fn)
-            if not res:
-                print_err_msg_exit(
-                    f"""
-                    The resolution could not be extracted from the current file's name.  The
-                    full path to the file (fp) is:
-                      fp = '{fp}'
-                    This may be because fp contains the * globbing character, which would
-                    imply that no files were found that match the globbing pattern specified
-                    in fp."""
-                )
-            else:
-                res = res[0]
-
-            if (i > 0) and (res != res_prev):
-                print_err_msg_exit(
-                    f"""
-                    The resolutions (as obtained from the file names) of the previous and
-                    current file (fp_prev and fp, respectively) are different:
-                      fp_prev = '{fp_prev}'
-                      fp      = '{fp}'
-                    Please ensure that all files have the same resolution."""
-                )
-
-            i = i + 1
-            fp_prev = f"{fp}"
-            res_prev = res
+    res, source_fns = find_fix_files(file_group, source_dir, fns)
     #
     # -----------------------------------------------------------------------
     #
     # Replace the * globbing character in the set of globbing patterns with
-    # the resolution.  This will result in a set of (full paths to) specific
-    # files.
-    #
-    # -----------------------------------------------------------------------
-    #
-    fps = [itm.replace("*", res) for itm in fps]
-    #
-    # -----------------------------------------------------------------------
-    #
-    # In creating the various symlinks below, it is convenient to work in
-    # the FIXlam directory.  We will change directory back to the original
-    # later below.
+    # the resolution.  This will result in a set of specific file names,
+    # each of which must exist in the source directory.
     #
     # -----------------------------------------------------------------------
     #
-    save_dir = os.getcwd()
-    cd_vrfy(target_dir)
+    fns = [itm.replace("*", res) for itm in fns]
+    for fn in fns:
+        if fn not in source_fns:
+            print_err_msg_exit(
+                f"""
+                Cannot create symlink to specified target file because the latter does
+                not exist or is not a file:
+                    target = '{os.path.join(source_dir, fn)}'"""
+            )
     #
     # -----------------------------------------------------------------------
     #
-    # Use the set of full file paths generated above as the link targets to
-    # create symlinks to these files in the target directory.
-    #
-    # -----------------------------------------------------------------------
+    # Plan the symlinks to create in the target directory, as pairs of the
+    # name of each symlink and the path it points to.
     #
     # If the task in consideration (one of the pre-processing tasks
     # TN_MAKE_GRID, TN_MAKE_OROG, and TN_MAKE_SFC_CLIMO) was run, then
     # the source location of the fix files will be located under the
     # experiment directory.  In this case, we use relative symlinks for
-    # portability and readability. Make absolute links otherwise.
+    # portability and readability, as create_symlink_to_file does where
+    # RELATIVE_LINK_FLAG is set. Make absolute links otherwise.
     #
-    relative_link_flag = False
-    if run_task:
-        relative_link_flag = True
-
-    for fp in fps:
-        fn = os.path.basename(fp)
-        create_symlink_to_file(fp, fn, relative_link_flag)
+    # -----------------------------------------------------------------------
+    #
+    if os.path.realpath(source_dir) == os.path.realpath(target_dir):
+        print_err_msg_exit(
+            f"""
+            The fix files can't be linked into the directory they are in:
+              source_dir = '{source_dir}'
+              target_dir = '{target_dir}'"""
+        )
+    if run_task and os.getenv("RELATIVE_LINK_FLAG"):
+        link_dir = os.path.relpath(
+            os.path.realpath(source_dir), os.path.realpath(target_dir)
+        )
+    else:
+        link_dir = source_dir
+    links = [(fn, os.path.join(link_dir, fn)) for fn in fns]
     #
     # -----------------------------------------------------------------------
     #
@@ -343,7 +305,7 @@ def link_fix(
     if file_group == "grid":
         target = f"{cres}{dot_or_uscore}grid.tile{tile_rgnl}.halo{nh4}.nc"
         symlink = f"{cres}{dot_or_uscore}grid.tile{tile_rgnl}.nc"
-        create_symlink_to_file(target, symlink, True)
+        links.append((symlink, target))
     #
     # -----------------------------------------------------------------------
     #
@@ -363,19 +325,137 @@ def link_fix(
             # Create links without "halo" in the name
             halo = f"{cres}.{field}.tile{tile_rgnl}.halo{nh4}.nc"
             no_halo = re.sub(f".halo{nh4}", "", halo)
-            create_symlink_to_file(halo, no_halo, True)
+            links.append((no_halo, halo))
 
             # Create links without halo and tile7, and with "tile1"
             halo_tile = f"{cres}.{field}.tile{tile_rgnl}.halo{nh0}.nc"
             no_halo_tile = re.sub(f"tile{tile_rgnl}.halo{nh0}", "tile1", halo_tile)
-            create_symlink_to_file(halo_tile, no_halo_tile, True)
-
-    # Change directory back to original one.
-    cd_vrfy(save_dir)
+            links.append((no_halo_tile, halo_tile))
+    #
+    # -----------------------------------------------------------------------
+    #
+    # Create all the symlinks relative to the target directory, without
+    # changing the working directory, or just print them for a dry run.
+    #
+    # -----------------------------------------------------------------------
+    #
+    if dry_run:
+        plan = "\n".join(f"  {symlink} -> {target}" for symlink, target in links)
+        print_info_msg(
+            f"Would create the following links in {target_dir}:\n{plan}",
+            verbose=True,
+        )
+    else:
+        create_links(target_dir, links)
 
     return res
 
 
+def find_fix_files(file_group, source_dir, patterns):
+    """Find the files in a directory matching any of a set of globbing
+    patterns, in a single scan of the directory, and check that the
+    resolution in all of their names is the same.
+
+    Args:
+        file_group: the group of fix files, used in error messages
+        source_dir: the directory to scan
+        patterns: list of globbing patterns of file names, each of which
+                  starts with "C*"
+    Returns:
+        The resolution, and the set of the names of all the files in the
+        directory
+    """
+
+    matchers = [re.compile(fnmatch.translate(pattern)) for pattern in patterns]
+    regex_res = re.compile("^C([0-9]*).*")
+
+    with os.scandir(source_dir) as entries:
+        source_fns = {entry.name for entry in entries}
+
+    matched = set()
+    res = None
+    fn_res = None
+    for fn in sorted(source_fns):
+        hits = {i for i, matcher in enumerate(matchers) if matcher.match(fn)}
+        if not hits:
+            continue
+        matched |= hits
+
+        match_res = regex_res.match(fn)
+        if match_res is None:
+            print_err_msg_exit(
+                f"""
+                The resolution could not be extracted from the current file's name.  The
+                full path to the file (fp) is:
+                  fp = '{os.path.join(source_dir, fn)}'"""
+            )
+        if res is None:
+            res, fn_res = match_res.group(1), fn
+        elif match_res.group(1) != res:
+            print_err_msg_exit(
+                f"""
+                The resolutions (as obtained from the file names) of the previous and
+                current file (fp_prev and fp, respectively) are different:
+                  fp_prev = '{os.path.join(source_dir, fn_res)}'
+                  fp      = '{os.path.join(source_dir, fn)}'
+                Please ensure that all files have the same resolution."""
+            )
+
+    for i, pattern in enumerate(patterns):
+        if i not in matched:
+            print_err_msg_exit(
+                f"""
+                Trying to link files in group: {file_group}
+                No files were found matching the pattern {os.path.join(source_dir, pattern)}.
+                """
+            )
+
+    return res, source_fns
+
+
+def create_links(target_dir, links):
+    """Create symlinks in a directory, replacing any files of the same
+    names. Links that already point to the right target are left as they
+    are. The links are created relative to a file descriptor of the
+    directory where the platform supports it, and the working directory
+    isn't changed.
+
+    Args:
+        target_dir: the directory to create the links in
+        links: list of pairs of the name of each link and the path it
+               points to
+    Returns:
+        The number of links created
+    """
+
+    use_dir_fd = {os.symlink, os.readlink, os.unlink} <= os.supports_dir_fd
+    if use_dir_fd:
+        dir_fd = os.open(target_dir, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        paths = links
+    else:
+        dir_fd = None
+        paths = [(os.path.join(target_dir, symlink), target) for symlink, target in links]
+
+    created = 0
+    try:
+        for symlink, target in paths:
+            try:
+                if os.readlink(symlink, dir_fd=dir_fd) == target:
+                    continue
+            except OSError:
+                pass
+            try:
+                os.symlink(target, symlink, dir_fd=dir_fd)
+            except FileExistsError:
+                os.unlink(symlink, dir_fd=dir_fd)
+                os.symlink(target, symlink, dir_fd=dir_fd)
+            created += 1
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return created
+
+
 def parse_args(argv):
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(
@@ -398,12 +478,29 @@ def parse_args(argv):
         help="Path to var_defns file.",
     )
 
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help="Print the links that would be created, without creating them.",
+    )
+
     return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    cfg = load_yaml_config(args.path_to_defns)
+    cfg = load_yaml_config(
+        args.path_to_defns,
+        keys=[
+            "workflow",
+            f"task_make_{args.file_group.lower()}",
+            "constants",
+            "grid_params",
+            "fixed_files",
+        ],
+        snapshot=True,
+    )
     link_fix(
         verbose=cfg["workflow"]["VERBOSE"],
         file_group=args.file_group,
@@ -417,4 +514,5 @@ if __name__ == "__main__":
         nhw=cfg["grid_params"]["NHW"],
         run_task=True,
         sfc_climo_fields=cfg["fixed_files"]["SFC_CLIMO_FIELDS"],
+        dry_run=args.dry_run,
     )
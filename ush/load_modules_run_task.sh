@@ -140,9 +140,7 @@ if [ -n "${SRW_ENV:-}" ] ; then
 fi
 
 # Source the necessary blocks of the experiment config YAML
-for sect in platform workflow ; do
-  source_yaml ${GLOBAL_VAR_DEFNS_FP} ${sect}
-done
+source_yaml ${GLOBAL_VAR_DEFNS_FP} platform workflow
 
 if [ "${machine}" != "wcoss2" ]; then
   module load "${BUILD_MOD_FN}" || print_err_msg_exit "\
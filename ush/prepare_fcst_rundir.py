@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+"""
+Prepares a forecast's run directory in one process: updates the FV3
+namelist for stochastic seeds, the AQM_NA_13km domain, and restarts in a
+single read and write, then creates the aqm.rc, model_configure,
+diag_table and ufs.configure files. This replaces calling a separate
+script for each of those steps from the run_fcst task.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from textwrap import dedent
+
+from uwtools.api.config import get_nml_config, realize
+
+from python_utils import (
+    cfg_to_yaml_str,
+    flatten_dict,
+    import_vars,
+    load_yaml_config,
+    print_info_msg,
+    print_input_args,
+    str_to_type,
+)
+
+import create_aqm_rc_file
+import create_diag_table_file
+import create_model_configure_file
+import create_ufs_configure_file
+from set_fv3nml_ens_stoch_seeds import ens_stoch_seeds_settings
+from update_input_nml import input_nml_settings
+
+# The sections of var_defns.yaml each file is created from, as read by the
+# script that creates it
+SECTIONS = {
+    create_aqm_rc_file: ["platform", "workflow", "cpl_aqm_parm"],
+    create_model_configure_file: ["workflow", "task_run_fcst"],
+    create_diag_table_file: ["workflow"],
+    create_ufs_configure_file: ["workflow", "task_run_fcst", "cpl_aqm_parm"],
+}
+
+
+def update_fcst_nml(namelist, settings, verbose=True, restart_settings=None):
+    """Apply the updates of several steps to the FV3 namelist with one
+    read and one write. With restart settings, the namelist with the
+    other updates applied is first saved with an _orig suffix, and the
+    restart settings are then applied in a second write.
+
+    Args:
+        namelist: path to the namelist
+        settings: list of dictionaries of namelist settings by group,
+                  applied in order
+        verbose: print the merged settings
+        restart_settings: dictionary of namelist settings by group for
+                          a restart
+    Returns:
+        The merged settings
+    """
+
+    if restart_settings is not None:
+        merged = update_fcst_nml(namelist, settings, verbose=verbose)
+        shutil.copy(namelist, f"{namelist}_orig")
+        for group, values in update_fcst_nml(
+                namelist, [restart_settings], verbose=verbose).items():
+            merged.setdefault(group, {}).update(values)
+        return merged
+
+    merged = {}
+    for step_settings in settings:
+        for group, values in step_settings.items():
+            merged.setdefault(group, {}).update(values)
+    if not merged:
+        return merged
+
+    print_info_msg(
+        dedent(
+            f"""
+            Updating {namelist}
+
+            The updated values are:
+
+            {cfg_to_yaml_str(merged)}
+
+            """
+        ),
+        verbose=verbose,
+    )
+    realize(
+        input_config=namelist,
+        input_format="nml",
+        output_file=namelist,
+        output_format="nml",
+        update_config=get_nml_config(merged),
+    )
+    return merged
+
+
+def prepare_fcst_rundir(
+    expt_config,
+    cdate,
+    run_dir,
+    fcst_len_hrs,
+    fhrot,
+    sub_hourly_post,
+    dt_subhourly_post_mnts,
+    dt_atmos,
+    ens_stoch_seeds=False,
+    aqm_na_13km=False,
+    restart=False,
+    init_concentrations=False,
+): # pylint: disable=too-many-arguments
+    """Prepares the run directory of a forecast
+
+    Args:
+        expt_config: experiment configuration with (at least) the platform,
+                     workflow, global, task_run_fcst, and cpl_aqm_parm sections
+        cdate: cycle date
+        run_dir: run directory
+        fcst_len_hrs: forecast length in hours
+        fhrot: forecast hour at restart
+        sub_hourly_post
+        dt_subhourly_post_mnts
+        dt_atmos
+        ens_stoch_seeds: set the ensemble member's stochastic seeds
+        aqm_na_13km: update the namelist for the AQM_NA_13km domain
+        restart: update the namelist for a restart, saving it first
+                 as it is for a cold start
+        init_concentrations: passed on to create_aqm_rc_file
+    Returns:
+        Boolean
+    """
+
+    print_input_args({k: v for k, v in locals().items() if k != "expt_config"})
+
+    workflow_config = expt_config["workflow"]
+    settings = []
+    if ens_stoch_seeds:
+        settings.append(ens_stoch_seeds_settings(cdate, expt_config))
+    settings.append(input_nml_settings(False, aqm_na_13km))
+    update_fcst_nml(
+        os.path.join(run_dir, workflow_config["FV3_NML_FN"]),
+        settings,
+        verbose=workflow_config["VERBOSE"],
+        restart_settings=input_nml_settings(True, False) if restart else None,
+    )
+
+    # Each module reads its variables from its own globals
+    for module, sections in SECTIONS.items():
+        import_vars(
+            dictionary=flatten_dict({k: expt_config[k] for k in sections}),
+            target_dict=vars(module),
+        )
+
+    if expt_config["cpl_aqm_parm"]["CPL_AQM"]:
+        create_aqm_rc_file.create_aqm_rc_file(
+            cdate=cdate,
+            run_dir=run_dir,
+            init_concentrations=init_concentrations,
+        )
+    create_model_configure_file.create_model_configure_file(
+        cdate=cdate,
+        fcst_len_hrs=fcst_len_hrs,
+        fhrot=fhrot,
+        run_dir=run_dir,
+        sub_hourly_post=sub_hourly_post,
+        dt_subhourly_post_mnts=dt_subhourly_post_mnts,
+        dt_atmos=dt_atmos,
+    )
+    create_diag_table_file.create_diag_table_file(run_dir)
+    create_ufs_configure_file.create_ufs_configure_file(run_dir)
+    return True
+
+
+def parse_args(argv):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Prepares the run directory of a forecast."
+    )
+
+    parser.add_argument(
+        "-r", "--run-dir", dest="run_dir", required=True, help="Run directory."
+    )
+
+    parser.add_argument(
+        "-c",
+        "--cdate",
+        dest="cdate",
+        required=True,
+        help="Date string in YYYYMMDDHH format.",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--fcst_len_hrs",
+        dest="fcst_len_hrs",
+        required=True,
+        help="Forecast length in hours.",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--fhrot",
+        dest="fhrot",
+        required=True,
+        help="Forecast hour at restart.",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--sub-hourly-post",
+        dest="sub_hourly_post",
+        required=True,
+        help="Set sub hourly post to either TRUE/FALSE by passing corresponding string.",
+    )
+
+    parser.add_argument(
+        "-d",
+        "--dt-subhourly-post-mnts",
+        dest="dt_subhourly_post_mnts",
+        required=True,
+        help="Subhourly post minitues.",
+    )
+
+    parser.add_argument(
+        "-t",
+        "--dt-atmos",
+        dest="dt_atmos",
+        required=True,
+        help="Forecast model's main time step.",
+    )
+
+    parser.add_argument(
+        "--ens-stoch-seeds",
+        dest="ens_stoch_seeds",
+        action="store_true",
+        help="Set the ensemble member's stochastic seeds in the namelist.",
+    )
+
+    parser.add_argument(
+        "--aqm_na_13km",
+        action="store_true",
+        help="Update the namelist for AQM_NA_13km in air quality modeling.",
+    )
+
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Update the namelist for restart.",
+    )
+
+    parser.add_argument(
+        "-i",
+        "--init_concentrations",
+        dest="init_concentrations",
+        default="false",
+        help="Flag for initial concentrations in aqm.rc.",
+    )
+
+    parser.add_argument(
+        "-p",
+        "--path-to-defns",
+        dest="path_to_defns",
+        required=True,
+        help="Path to var_defns file.",
+    )
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    cfg = load_yaml_config(
+        args.path_to_defns,
+        keys=["platform", "workflow", "global", "task_run_fcst", "cpl_aqm_parm"],
+        snapshot=True,
+    )
+    prepare_fcst_rundir(
+        expt_config=cfg,
+        cdate=str_to_type(args.cdate),
+        run_dir=args.run_dir,
+        fcst_len_hrs=str_to_type(args.fcst_len_hrs),
+        fhrot=str_to_type(args.fhrot),
+        sub_hourly_post=str_to_type(args.sub_hourly_post),
+        dt_subhourly_post_mnts=str_to_type(args.dt_subhourly_post_mnts),
+        dt_atmos=str_to_type(args.dt_atmos),
+        ens_stoch_seeds=args.ens_stoch_seeds,
+        aqm_na_13km=args.aqm_na_13km,
+        restart=args.restart,
+        init_concentrations=str_to_type(args.init_concentrations),
+    )
@@ -1,6 +1,10 @@
 from .misc import uppercase, lowercase, find_pattern_in_str, find_pattern_in_file
 from .check_for_preexist_dir_file import check_for_preexist_dir_file
-from .check_var_valid_value import check_var_valid_value
+from .check_var_valid_value import (
+    check_var_valid_value,
+    load_valid_param_vals,
+    check_valid_param_vals,
+)
 from .create_symlink_to_file import create_symlink_to_file
 from .define_macos_utilities import define_macos_utilities
 from .environment import (
@@ -36,16 +40,34 @@ from .config_parser import (
     get_ini_value,
     load_config_file,
     load_shell_config,
+    shell_str_to_dict,
     cfg_to_shell_str,
     load_xml_config,
     cfg_to_xml_str,
     flatten_dict,
     structure_dict,
     check_structure_dict,
+    merge_dicts,
     update_dict,
     cfg_main,
     load_config_file,
     load_yaml_config,
     cfg_to_yaml_str,
     extend_yaml,
+    load_config_snapshot,
+    cfg_sections_to_sourceable_str,
+    write_config_snapshots,
+)
+from .stage_manifest import StageManifest
+from .generator_context import GeneratorContext
+from .stage_files import stage_files
+from .generation_stages import (
+    merra_climo_files,
+    setup_input_files,
+    stage_fix_files,
+)
+from .profiling import (
+    profile_phase,
+    start_profiling,
+    stop_profiling,
 )
@@ -1,5 +1,10 @@
 #!/usr/bin/env python3
 
+import os
+from textwrap import dedent
+
+from .config_parser import load_yaml_config
+
 
 def check_var_valid_value(var, values):
     """Check if specified variable has a valid value
@@ -16,3 +21,104 @@ def check_var_valid_value(var, values):
     if var not in values:
         raise ValueError(f"Got '{var}', expected one of the following:\n   {values}")
     return True
+
+
+class ValidValues:
+    """The valid values of a parameter, hashed for constant-time membership
+    tests. Membership is the same as in the list of values, so e.g. 1 is
+    a member of [True, False]. Unhashable values are kept in a list."""
+
+    def __init__(self, values):
+        self.values = values
+        hashable = []
+        self.unhashable = []
+        for value in values:
+            try:
+                hash(value)
+                hashable.append(value)
+            except TypeError:
+                self.unhashable.append(value)
+        self.hashable = frozenset(hashable)
+
+    def __contains__(self, value):
+        try:
+            if value in self.hashable:
+                return True
+        except TypeError:
+            pass
+        return value in self.unhashable
+
+    def __repr__(self):
+        return repr(self.values)
+
+
+# Compiled valid values, with the modification time of the file they were
+# compiled from, keyed by the file's path
+_VALID_PARAM_VALS_CACHE = {}
+
+
+def load_valid_param_vals(valid_vals_fp):
+    """Load a file of valid parameter values (e.g. valid_param_vals.yaml),
+    whose keys are the parameter names prefixed with "valid_vals_". The
+    result is kept until the file's modification time changes, so that
+    generating several experiments in one process parses it once.
+
+    Args:
+        valid_vals_fp: path to the file
+    Returns:
+        A dictionary of ValidValues keyed by parameter name
+    """
+
+    valid_vals_fp = os.path.abspath(valid_vals_fp)
+    mtime = os.stat(valid_vals_fp).st_mtime_ns
+    cached = _VALID_PARAM_VALS_CACHE.get(valid_vals_fp)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    valid_vals = {}
+    for key, values in load_yaml_config(valid_vals_fp).items():
+        if key.startswith("valid_vals_"):
+            valid_vals[key[len("valid_vals_"):]] = ValidValues(values)
+    _VALID_PARAM_VALS_CACHE[valid_vals_fp] = (mtime, valid_vals)
+    return valid_vals
+
+
+def check_valid_param_vals(cfg, valid_vals):
+    """Check the values of all the parameters of a flattened config that
+    have a list of valid values
+
+    Args:
+        cfg: flattened config dictionary
+        valid_vals: dictionary returned by load_valid_param_vals
+    Returns:
+        A list of messages describing each invalid parameter, empty if
+        all of them are valid
+    """
+
+    errors = []
+    for k, valid in valid_vals.items():
+        v = cfg.get(k)
+        if v is None or v == "":
+            continue
+        if isinstance(v, list):
+            if not all(ele in valid for ele in v):
+                errors.append(
+                    dedent(
+                        f"""
+                        The variable
+                            {k} = {v}
+                        in the user's configuration has at least one invalid value.  Possible values are:
+                            {k} = {valid}"""
+                    )
+                )
+        elif v not in valid:
+            errors.append(
+                dedent(
+                    f"""
+                    The variable
+                        {k} = {v}
+                    in the user's configuration does not have a valid value.  Possible values are:
+                        {k} = {valid}"""
+                )
+            )
+    return errors
@@ -15,17 +15,25 @@ returnded by load_config to make queries.
 """
 
 import argparse
+import collections.abc
 import configparser
 import datetime
+import functools
+import hashlib
 import json
 import os
 import pathlib
+import pickle
 import re
+import shlex
+import tempfile
 from textwrap import dedent
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
 import jinja2
+import jinja2.meta
+from jinja2 import nodes as j2nodes
 #
 # Note: yaml may not be available in which case we suppress
 # the exception, so that we can have other functionality
@@ -33,24 +41,237 @@ import jinja2
 #
 try:
     import yaml
+
+    # The libyaml loader is several times faster than the pure-Python one,
+    # where PyYAML was built with it.
+    YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except ModuleNotFoundError:
     pass
 
 from .environment import list_to_str, str_to_list, str_to_type
+from .profiling import profile_phase
 from .run_command import run_command
 
 ##########
 # YAML
 ##########
-def load_yaml_config(config_file):
-    """Safe load a yaml file"""
+def load_yaml_config(config_file, keys=None, lazy=False, snapshot=False):
+    """Safe load a yaml file, or, if asked to, its snapshot if one was
+    written for the file's current contents
+
+    Args:
+        config_file: path to the YAML file
+        keys: list of top-level sections to load, if None all of them.
+              The other sections are not parsed.
+        lazy: return a mapping that parses each top-level section the
+              first time it is accessed
+        snapshot: use the snapshot written by write_config_snapshots,
+                  as setup does for var_defns.yaml. Only for files whose
+                  snapshot was written by the workflow itself.
+    Returns:
+        A dictionary, or a LazyYAMLConfig if lazy is set and all the
+        sections were asked for
+    """
+
+    cfg = load_config_snapshot(config_file) if snapshot else None
+    if cfg is not None:
+        if keys is not None:
+            cfg = {k: v for k, v in cfg.items() if k in keys}
+        return cfg
 
     with open(config_file, "r") as f:
-        cfg = yaml.safe_load(f)
+        contents = f.read()
+
+    if keys is None and not lazy:
+        return yaml.load(contents, Loader=YAML_LOADER)
 
+    cfg = LazyYAMLConfig(contents)
+    if keys is not None:
+        return {k: cfg[k] for k in cfg if k in keys}
     return cfg
 
 
+# A key at the start of a line, followed by a colon
+YAML_TOP_LEVEL_KEY = re.compile(
+    r"""^('[^']*'|"[^"]*"|[^\s#'"&*!|>%@`?:,\[\]{}-][^:#]*?)[ \t]*:(?:\s|$)"""
+)
+
+
+def split_yaml_sections(contents):
+    """Split a YAML document into the text of each of its top-level
+    sections, without parsing the sections
+
+    Args:
+        contents: the YAML document as a string
+    Returns:
+        A dictionary of the text of each section, keyed by its top-level
+        key, or None if the document can't be split at its top-level keys
+    """
+
+    sections = {}
+    key = None
+    lines = []
+    for line in contents.splitlines(keepends=True):
+        if line[:1] in ("", " ", "\t", "\r", "\n", "#"):
+            if key is not None:
+                lines.append(line)
+            continue
+        match = YAML_TOP_LEVEL_KEY.match(line)
+        if match is None:
+            # Document markers, directives, top-level sequences, etc.
+            return None
+        if key is not None:
+            sections[key] = "".join(lines)
+        key = yaml.load(match.group(1), Loader=YAML_LOADER)
+        if key in sections:
+            return None
+        lines = [line]
+    if key is not None:
+        sections[key] = "".join(lines)
+    return sections
+
+
+class LazyYAMLConfig(collections.abc.Mapping):
+    """A read-only mapping of the top-level sections of a YAML document,
+    each of which is parsed the first time it is accessed. A document
+    that can't be parsed a section at a time, e.g. one with aliases to
+    anchors in other sections, is parsed whole instead."""
+
+    def __init__(self, contents):
+        self._contents = contents
+        self._parsed = {}
+        self._sections = split_yaml_sections(contents)
+        if self._sections is None:
+            self._parse_all()
+
+    def _parse_all(self):
+        self._parsed = yaml.load(self._contents, Loader=YAML_LOADER) or {}
+        self._sections = dict.fromkeys(self._parsed)
+
+    def __getitem__(self, key):
+        if key not in self._parsed:
+            text = self._sections[key]
+            try:
+                section = yaml.load(text, Loader=YAML_LOADER)
+            except yaml.YAMLError:
+                section = None
+            if isinstance(section, dict) and list(section) == [key]:
+                self._parsed[key] = section[key]
+            else:
+                self._parse_all()
+        return self._parsed[key]
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+
+def file_checksum(file_name):
+    """Return the sha256 checksum of a file's contents as a hex string"""
+
+    with open(file_name, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def config_snapshot_paths(config_file):
+    """Return the paths of the pickled snapshot of a config file and of
+    the directory of its per-section shell fragments"""
+
+    base = os.path.splitext(config_file)[0]
+    return f"{base}.pkl", f"{base}.d"
+
+
+def load_config_snapshot(config_file):
+    """Return the config saved in the snapshot of a config file, or None
+    if there is no snapshot or the file has changed since it was taken"""
+
+    snapshot_fp, _ = config_snapshot_paths(config_file)
+    if not os.path.exists(snapshot_fp):
+        return None
+    try:
+        with open(snapshot_fp, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if snapshot.get("checksum") != file_checksum(config_file):
+        return None
+    return snapshot["config"]
+
+
+def cfg_to_sourceable_str(cfg):
+    """Get the contents of a single-level config section as lines that
+    can be sourced in bash, with the same variables the source_yaml shell
+    function makes of the output of `uw config realize --output-format sh`:
+    lists become bash arrays, and None an empty string. Every value is
+    quoted, so that each line is sourced on its own terms."""
+
+    def quote(v):
+        return "''" if v is None else shlex.quote(str(v))
+
+    lines = []
+    for k, v in cfg.items():
+        if isinstance(v, list):
+            lines.append(f"{k}=({' '.join(quote(item) for item in v)})")
+        else:
+            lines.append(f"{k}={quote(v)}")
+    return "\n".join(lines) + "\n"
+
+
+def cfg_sections_to_sourceable_str(cfg, sections):
+    """Get the contents of several single-level sections of a config as
+    lines that can be sourced in bash, in the order the sections are
+    given, so that later sections override earlier ones"""
+
+    sourceable = ""
+    for sect in sections:
+        settings = cfg.get(sect)
+        if not isinstance(settings, dict) or any(
+            isinstance(v, dict) for v in settings.values()
+        ):
+            raise ValueError(
+                f"Section {sect} is not a single-level section of the config"
+            )
+        sourceable += cfg_to_sourceable_str(settings)
+    return sourceable
+
+
+def write_config_snapshots(config_file):
+    """Write a pickled snapshot of a YAML config file for Python readers,
+    and a shell fragment for each of its sections for source_yaml. Both
+    record the checksum of the file, so that they are ignored once the
+    file changes. Sections holding nested dicts get no fragment, and are
+    read from the YAML file."""
+
+    with open(config_file, "r") as f:
+        cfg = yaml.load(f, Loader=YAML_LOADER)
+    checksum = file_checksum(config_file)
+
+    snapshot_fp, fragments_dir = config_snapshot_paths(config_file)
+    with open(snapshot_fp, "wb") as f:
+        pickle.dump({"checksum": checksum, "config": cfg}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Clear out the fragments of an earlier version of the file
+    os.makedirs(fragments_dir, exist_ok=True)
+    for fn in os.listdir(fragments_dir):
+        if fn == "checksum" or fn.endswith(".sh"):
+            os.remove(os.path.join(fragments_dir, fn))
+
+    for sect, settings in cfg.items():
+        fragment_fp = os.path.join(fragments_dir, f"{sect}.sh")
+        if not isinstance(settings, dict) or any(
+            isinstance(v, dict) for v in settings.values()
+        ):
+            continue
+        with open(fragment_fp, "w") as f:
+            f.write(cfg_to_sourceable_str(settings))
+    # The checksum is written last, so that fragments are only trusted
+    # once all of them are in place.
+    with open(os.path.join(fragments_dir, "checksum"), "w") as f:
+        f.write(f"{checksum}\n")
+
+
 try:
 
     class custom_dumper(yaml.Dumper):
@@ -85,24 +306,42 @@ def cycstr(loader, node):
     arg = loader.construct_scalar(node)
     return f'<cyclestr>{arg}</cyclestr>'
 
-def include(filepaths):
+# A GeneratorContext that include reads its files through, while one is
+# active (see GeneratorContext.activate)
+INCLUDE_CONTEXT = None
 
-    ''' Returns a dictionary that includes the contents of the referenced
-    YAML file(s). '''
+def include_path(filepath):
 
+    ''' Returns the absolute path of a file referenced by include, where
+    relative paths are relative to the top of the SRW App. '''
+
+    if os.path.isabs(filepath):
+        return filepath
     srw_path = pathlib.Path(__file__).resolve().parents[0].parents[0]
+    return os.path.join(os.path.dirname(srw_path), filepath)
+
+def read_includes(filepaths):
+
+    ''' Returns the contents of the referenced YAML file(s), merged at the
+    top level, as a YAML string. '''
 
     cfg = {}
     for filepath in filepaths:
-        abs_path = filepath
-        if not os.path.isabs(filepath):
-            abs_path = os.path.join(os.path.dirname(srw_path), filepath)
-        with open(abs_path, 'r') as fp:
-            contents = yaml.load(fp, Loader=yaml.SafeLoader)
+        with open(include_path(filepath), 'r') as fp:
+            contents = yaml.load(fp, Loader=YAML_LOADER)
         for key, value in contents.items():
             cfg[key] = value
     return yaml.dump(cfg, sort_keys=False)
 
+def include(filepaths):
+
+    ''' Returns a dictionary that includes the contents of the referenced
+    YAML file(s). '''
+
+    if INCLUDE_CONTEXT is not None:
+        return INCLUDE_CONTEXT.include(filepaths)
+    return read_includes(filepaths)
+
 def join_str(loader, node):
     """Custom tag hangler to join strings"""
     seq = loader.construct_sequence(node)
@@ -126,11 +365,12 @@ def nowtimestamp(loader, node):
     return "id_" + str(int(datetime.datetime.now().timestamp()))
 
 try:
-    yaml.add_constructor("!cycstr", cycstr, Loader=yaml.SafeLoader)
-    yaml.add_constructor("!include", include, Loader=yaml.SafeLoader)
-    yaml.add_constructor("!join_str", join_str, Loader=yaml.SafeLoader)
-    yaml.add_constructor("!startstopfreq", startstopfreq, Loader=yaml.SafeLoader)
-    yaml.add_constructor("!nowtimestamp", nowtimestamp ,Loader=yaml.SafeLoader)
+    for yaml_loader in {yaml.SafeLoader, YAML_LOADER}:
+        yaml.add_constructor("!cycstr", cycstr, Loader=yaml_loader)
+        yaml.add_constructor("!include", include, Loader=yaml_loader)
+        yaml.add_constructor("!join_str", join_str, Loader=yaml_loader)
+        yaml.add_constructor("!startstopfreq", startstopfreq, Loader=yaml_loader)
+        yaml.add_constructor("!nowtimestamp", nowtimestamp ,Loader=yaml_loader)
 except NameError:
     pass
 
@@ -148,102 +388,332 @@ def days_ago(arg):
     return (datetime.date.today() -
             datetime.timedelta(days=arg)).strftime("%Y%m%d00")
 
-def extend_yaml(yaml_dict, full_dict=None, parent=None):
-    """
-    Updates yaml_dict inplace by rendering any existing Jinja2 templates
-    that exist in a value.
-    """
 
-    if full_dict is None:
-        full_dict = yaml_dict
+def render_time_filter(func):
+    """Wrap a Jinja2 filter whose result can change from one render to
+    the next, e.g. because it reads a file or today's date. Jinja2 would
+    otherwise call it only once, when compiling a template that applies
+    it to constants."""
+
+    @jinja2.pass_context
+    @functools.wraps(func)
+    def wrapper(_context, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+# A single environment is shared by all the templates rendered by
+# extend_yaml. It doesn't depend on the config being filled, so each
+# distinct template string only needs to be compiled once.
+J2ENV = jinja2.Environment(loader=jinja2.BaseLoader, undefined=jinja2.StrictUndefined)
+J2ENV.filters["path_join"] = path_join
+J2ENV.filters["days_ago"] = render_time_filter(days_ago)
+J2ENV.filters["include"] = render_time_filter(include)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(template):
+    """Return the compiled Jinja2 template for a template string,
+    compiling only those that haven't been seen recently"""
+
+    return J2ENV.from_string(template)
+
+def template_reference_chain(node):
+    """Return the keys of a config entry referred to by a Jinja2 node as a
+    tuple, e.g. ("workflow", "EXPTDIR") for workflow.EXPTDIR,
+    workflow["EXPTDIR"], or workflow.get("EXPTDIR"). Returns None for
+    nodes that aren't references."""
+
+    if isinstance(node, j2nodes.Name):
+        return (node.name,)
+    if isinstance(node, j2nodes.Getattr):
+        base = template_reference_chain(node.node)
+        return base and base + (node.attr,)
+    if isinstance(node, j2nodes.Getitem) and isinstance(node.arg, j2nodes.Const):
+        base = template_reference_chain(node.node)
+        return base and base + (node.arg.value,)
+    if (
+        isinstance(node, j2nodes.Call)
+        and isinstance(node.node, j2nodes.Getattr)
+        and node.node.attr == "get"
+        and node.args
+        and isinstance(node.args[0], j2nodes.Const)
+    ):
+        base = template_reference_chain(node.node.node)
+        return base and base + (node.args[0].value,)
+    return None
 
-    if parent is None:
-        full_dict = yaml_dict
 
-    if not isinstance(yaml_dict, dict):
+def find_template_references(node, refs):
+    """Add the reference chains found under a Jinja2 node to refs"""
+
+    chain = template_reference_chain(node)
+    if chain:
+        refs.add(chain)
+        # The default of a get() may hold references of its own
+        if isinstance(node, j2nodes.Call):
+            for arg in node.args[1:]:
+                find_template_references(arg, refs)
         return
+    for child in node.iter_child_nodes():
+        find_template_references(child, refs)
 
-    for k, val in yaml_dict.items():
 
+@functools.lru_cache(maxsize=4096)
+def template_references(template):
+    """Return the set of reference chains to variables that a template
+    string doesn't define itself, like loop variables"""
+
+    ast = J2ENV.parse(template)
+    free = jinja2.meta.find_undeclared_variables(ast)
+    refs = set()
+    find_template_references(ast, refs)
+    return frozenset(ref for ref in refs if ref[0] in free)
+
+
+def split_templates(v_str):
+    """Return the templates in a string that are rendered on their own.
+
+    Find expressions first, and process them as a single template if
+    they exist. Find individual double curly brace template in the
+    string otherwise. We need one substitution template at a time so
+    that we can opt to leave some un-filled when they are not yet set.
+    For example, we can save cycle-dependent templates to fill in at run
+    time."""
+
+    if "{%" in v_str:
+        return [v_str]
+    # Separates out all the double curly bracket pairs
+    return [m.group() for m in re.finditer(r"{{[^}]*}}|\S", v_str) if "{{" in m.group()]
+
+
+def collect_templates(yaml_dict, path, parent, entries, seen=None):
+    """Append an entry to entries for each templated value in yaml_dict,
+    recursively. Each entry records where the value is, along with the
+    dict and parent dict that its bare variable names are taken from.
+
+    A dict that appears more than once in the config, as YAML aliases
+    make it, gets its entries from the first place it is found. The
+    other places are kept as aliases of those entries."""
+
+    if seen is None:
+        seen = {}
+    for k, val in yaml_dict.items():
         if isinstance(val, dict):
-            extend_yaml(val, full_dict, yaml_dict)
+            collect_templates(val, path + (k,), yaml_dict, entries, seen)
+            continue
+
+        vals = val if isinstance(val, list) else [val]
+        for v_idx, v in enumerate(vals):
+            v_str = str(v.text) if isinstance(v, ET.Element) else str(v)
+            # Save a bit of compute and only do this part for strings that
+            # contain the jinja double brackets.
+            if not any(ele in v_str for ele in ["{{", "{%"]):
+                continue
+            v_path = path + (k, v_idx) if isinstance(val, list) else path + (k,)
+            if (id(yaml_dict), k, v_idx) in seen:
+                seen[(id(yaml_dict), k, v_idx)]["aliases"].append(v_path)
+                continue
+            templates = split_templates(v_str)
+            refs = set()
+            for template in templates:
+                try:
+                    compile_template(template)
+                except:
+                    print(f"ERROR filling template: {template}, {v_str}")
+                    raise
+                refs.update(template_references(template))
+            entries.append(
+                {
+                    "path": v_path,
+                    "aliases": [],
+                    "dict": yaml_dict,
+                    "dict_path": path,
+                    "parent": parent,
+                    "key": k,
+                    "index": v_idx,
+                    "value": v,
+                    "templates": templates,
+                    "refs": refs,
+                }
+            )
+            seen[(id(yaml_dict), k, v_idx)] = entries[-1]
+
+
+def resolve_reference(chain, entry, full_dict):
+    """Return the path of the deepest config entry that a reference chain
+    in a templated entry reaches, or None when it isn't in the config"""
+
+    root, keys = chain[0], chain[1:]
+    if root == "parent" and entry["parent"] is not None:
+        node, path = entry["parent"], entry["dict_path"][:-1]
+    elif root in entry["dict"]:
+        node, path = entry["dict"][root], entry["dict_path"] + (root,)
+    elif root in full_dict:
+        node, path = full_dict[root], (root,)
+    else:
+        return None
+
+    for key in keys:
+        if isinstance(node, dict) and key in node:
+            node = node[key]
+        elif isinstance(node, list) and isinstance(key, int) and -len(node) <= key < len(node):
+            key = key % len(node)
+            node = node[key]
         else:
+            break
+        path += (key,)
+    return path
+
+
+def order_templates(entries, full_dict, cycles=None):
+    """Return the entries ordered so that each templated value comes
+    after the templated values it refers to. Values that don't depend
+    on each other keep the order they have in the config. Raises a
+    ValueError naming the values in any reference cycle, unless a list
+    of cycles is given. Each cycle is then added to it, and its values
+    are ordered as if the reference closing it wasn't there."""
+
+    # Every templated entry at or under each config path
+    by_prefix = {}
+    for e_idx, entry in enumerate(entries):
+        for e_path in [entry["path"]] + entry.get("aliases", []):
+            for depth in range(1, len(e_path) + 1):
+                e_prefixes = by_prefix.setdefault(e_path[:depth], [])
+                if not e_prefixes or e_prefixes[-1] != e_idx:
+                    e_prefixes.append(e_idx)
+
+    deps = []
+    for e_idx, entry in enumerate(entries):
+        e_deps = set()
+        for chain in entry["refs"]:
+            path = resolve_reference(chain, entry, full_dict)
+            # A reference to a dict holding the value itself can't be
+            # filled first.
+            if path is None or entry["path"][: len(path)] == path:
+                continue
+            e_deps.update(by_prefix.get(path, []))
+        e_deps.discard(e_idx)
+        deps.append(sorted(e_deps))
+
+    order = []
+    state = {}
+    for start in range(len(entries)):
+        if start in state:
+            continue
+        # Depth-first search, without recursion, for the post order
+        stack = [(start, iter(deps[start]))]
+        state[start] = "visiting"
+        while stack:
+            e_idx, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                state[e_idx] = "done"
+                order.append(entries[e_idx])
+            elif state.get(child) == "visiting":
+                cycle = [e_idx for e_idx, _ in stack]
+                cycle = cycle[cycle.index(child):] + [child]
+                cycle = " -> ".join(
+                    ".".join(str(k) for k in entries[c]["path"]) for c in cycle
+                )
+                if cycles is None:
+                    raise ValueError(
+                        f"Templates refer to each other in a cycle: {cycle}"
+                    )
+                cycles.append(cycle)
+            elif child not in state:
+                state[child] = "visiting"
+                stack.append((child, iter(deps[child])))
+    return order
+
+
+def render_template_entry(entry, full_dict):
+    """Render the templates of a single entry in place, and return the
+    resulting value"""
+
+    yaml_dict, k, v = entry["dict"], entry["key"], entry["value"]
+    v_str = str(v.text) if isinstance(v, ET.Element) else str(v)
+
+    data = []
+    for template in entry["templates"]:
+        j2tmpl = compile_template(template)
+        try:
+            # Fill in a template that has the appropriate variables
+            # set.
+            template = j2tmpl.render(parent=entry["parent"], **yaml_dict, **full_dict)
+        except jinja2.exceptions.UndefinedError as e:
+            # Leave a templated field as-is in the resulting dict
+            pass
+        except ValueError:
+            pass
+        except TypeError:
+            pass
+        except ZeroDivisionError:
+            pass
+        except:
+            print(f"{k}: {template}")
+            raise
+
+        data.append(template)
+
+    convert_type = True
+    for tmpl, rendered in zip(entry["templates"], data):
+        v_str = v_str.replace(tmpl, rendered)
+        if "string" in tmpl:
+            convert_type = False
+
+    if convert_type:
+        v_str = str_to_type(v_str, return_string=2)
+
+    if isinstance(v, ET.Element):
+        v.text = v_str
+    elif isinstance(yaml_dict[k], list):
+        yaml_dict[k][entry["index"]] = v_str
+    else:
+        # Put the full template line back together as it was,
+        # filled or not
+        yaml_dict[k] = v_str
+    return v_str
+
 
-            if not isinstance(val, list):
-                val = [val]
-
-            for v_idx, v in enumerate(val):
-                # Save a bit of compute and only do this part for strings that
-                # contain the jinja double brackets.
-                v_str = str(v.text) if isinstance(v, ET.Element) else str(v)
-                if isinstance(v, ET.Element):
-                    print('ELEMENT VSTR', v_str, v.text, yaml_dict)
-                is_a_template = any((ele for ele in ["{{", "{%"] if ele in v_str))
-                if is_a_template:
-                    # Find expressions first, and process them as a single template
-                    # if they exist
-                    # Find individual double curly brace template in the string
-                    # otherwise. We need one substitution template at a time so that
-                    # we can opt to leave some un-filled when they are not yet set.
-                    # For example, we can save cycle-dependent templates to fill in
-                    # at run time.
-                    if "{%" in v_str:
-                        templates = [v_str]
-                    else:
-                        # Separates out all the double curly bracket pairs
-                        templates = [m.group() for m in
-                                re.finditer(r"{{[^}]*}}|\S", v_str)  if '{{'
-                                in m.group()]
-                    data = []
-                    for template in templates:
-                        j2env = jinja2.Environment(
-                            loader=jinja2.BaseLoader, undefined=jinja2.StrictUndefined
-                        )
-                        j2env.filters["path_join"] = path_join
-                        j2env.filters["days_ago"] = days_ago
-                        j2env.filters["include"] = include
-                        try:
-                            j2tmpl = j2env.from_string(template)
-                        except:
-                            print(f"ERROR filling template: {template}, {v_str}")
-                            raise
-                        try:
-                            # Fill in a template that has the appropriate variables
-                            # set.
-                            template = j2tmpl.render(parent=parent, **yaml_dict, **full_dict)
-                        except jinja2.exceptions.UndefinedError as e:
-                            # Leave a templated field as-is in the resulting dict
-                            pass
-                        except ValueError:
-                            pass
-                        except TypeError:
-                            pass
-                        except ZeroDivisionError:
-                            pass
-                        except:
-                            print(f"{k}: {template}")
-                            raise
-
-                        data.append(template)
-
-                    convert_type = True
-                    for tmpl, rendered in zip(templates, data):
-                        v_str = v_str.replace(tmpl, rendered)
-                        if "string" in tmpl:
-                            convert_type = False
-
-                    if convert_type:
-                        v_str = str_to_type(v_str, return_string=2)
-
-                    if isinstance(v, ET.Element):
-                        print('Replacing ET text with', v_str)
-                        v.text = v_str
-                    elif isinstance(yaml_dict[k], list):
-                        yaml_dict[k][v_idx] = v_str
-                    else:
-                        # Put the full template line back together as it was,
-                        # filled or not
-                        yaml_dict[k] = v_str
+@profile_phase("extend_yaml")
+def extend_yaml(yaml_dict, cycles=None):
+    """
+    Updates yaml_dict inplace by rendering any existing Jinja2 templates
+    that exist in a value.
+
+    Each templated value is parsed once to find the config entries it
+    refers to, and the values are rendered once each, in an order where
+    every value comes after the templated values it refers to. Templates
+    that refer to entries that are not set are left as they are.
+
+    Args:
+        yaml_dict: the config to fill
+        cycles: a list to add any reference cycles to, instead of
+                raising an error. The values in a cycle are left with
+                templates in them.
+    Returns:
+        A dict of the values that still hold templates, keyed by their
+        dotted path in yaml_dict
+    Raises:
+        ValueError if templated values refer to each other in a cycle,
+        and no cycles list is given
+    """
+
+    if not isinstance(yaml_dict, dict):
+        return {}
+
+    entries = []
+    collect_templates(yaml_dict, (), None, entries)
+
+    unfilled = {}
+    for entry in order_templates(entries, yaml_dict, cycles):
+        value = render_template_entry(entry, yaml_dict)
+        if any(ele in str(value) for ele in ["{{", "{%"]):
+            unfilled[".".join(str(k) for k in entry["path"])] = value
+    return unfilled
 
 
 ##########
@@ -279,23 +749,133 @@ def load_shell_as_ini_config(file_name, return_string=1):
         cfg = cfg.replace("# [", "[")
         cfg = cfg.replace("\\\n", " ")
 
-    # write content to temp file and load it as ini
-    temp_file = os.path.join(os.getcwd(), "_temp." + str(os.getpid()) + ".ini")
-    with open(temp_file, "w") as file:
-        file.write(cfg)
-
     # load it as a structured ini file
-    try:
-        cfg = load_ini_config(temp_file, return_string)
-    finally:
-        os.remove(temp_file)
+    return ini_str_to_dict(cfg, return_string)
 
-    return cfg
+
+# A section of a structured shell config, as written by cfg_to_shell_str
+SHELL_SECTION = re.compile(r"^# \[([^\]]+)\]\s*$")
+# A variable assignment, possibly exported
+SHELL_ASSIGNMENT = re.compile(r"^(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=(.*)$")
+
+
+def split_shell_words(value):
+    """Split the right hand side of a shell variable assignment into its
+    words, the way bash would, for values that need no expansion
+
+    Args:
+        value: the text after the equal sign
+    Returns:
+        A list of the words, or None if bash would have to expand,
+        substitute or run anything to get the value
+    """
+
+    words = []
+    word = None
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c in " \t":
+            if word is not None:
+                words.append(word)
+                word = None
+        elif c == "'":
+            end = value.find("'", i + 1)
+            if end < 0:
+                return None
+            word = (word or "") + value[i + 1 : end]
+            i = end
+        elif c == '"':
+            end = value.find('"', i + 1)
+            if end < 0:
+                return None
+            quoted = value[i + 1 : end]
+            if any(special in quoted for special in "$`\\"):
+                return None
+            word = (word or "") + quoted
+            i = end
+        elif c == "#" and word is None:
+            break
+        elif c in "$`\\;&|<>(){}*?[" or (c == "~" and word is None):
+            return None
+        else:
+            word = (word or "") + c
+        i += 1
+    if word is not None:
+        words.append(word)
+    return words
+
+
+def shell_str_to_dict(contents, return_string=0):
+    """Parse a shell config file without running a shell. Handles the
+    structured format written by cfg_to_shell_str, with sections in
+    `# [name]` comments, and plain files of variable assignments.
+
+    Args:
+        contents: the contents of the config file
+        return_string: passed on to str_to_list for each value
+    Returns:
+        A dictionary of the sections, or of the variables of a file with
+        no sections. None if the file needs a shell to be evaluated,
+        e.g. it runs commands or uses variable expansion.
+    """
+
+    contents = contents.replace("\\\n", " ")
+
+    cfg = {}
+    variables = {}
+    section = None
+    for line in contents.splitlines():
+        line = line.strip()
+        match = SHELL_SECTION.match(line)
+        if match:
+            # Variables before the first section aren't part of any
+            if variables:
+                return None
+            section = cfg.setdefault(match.group(1), {})
+            continue
+        if not line or line.startswith("#"):
+            continue
+        match = SHELL_ASSIGNMENT.match(line)
+        if match is None:
+            return None
+        key, value = match.groups()
+
+        # Arrays
+        value = value.strip()
+        array = value.startswith("(")
+        if array:
+            end = value.find(")")
+            if end < 0:
+                return None
+            words = split_shell_words(value[1:end])
+            rest = split_shell_words(value[end + 1 :])
+            if words is None or rest != []:
+                return None
+            value = str_to_list(value[: end + 1], return_string)
+        else:
+            words = split_shell_words(value)
+            if words is None or len(words) > 1:
+                return None
+            # Unlike the INI format, bash doesn't tell an empty string
+            # from an unset value
+            if words and (words[0] or section is not None):
+                value = str_to_type(words[0], return_string)
+            else:
+                value = None
+
+        if section is not None:
+            section[key] = value
+        else:
+            variables[key] = value
+
+    return cfg or variables
 
 
 def load_shell_config(config_file, return_string=0):
     """Loads old style shell config files.
-    We source the config script in a subshell and gets the variables it sets
+    Files that only set variables are parsed directly. Anything else is
+    sourced in a subshell to get the variables it sets.
 
     Args:
          config_file: path to config file script
@@ -303,29 +883,26 @@ def load_shell_config(config_file, return_string=0):
          dictionary that should be equivalent to one obtained from parsing a yaml file.
     """
 
-    # First try to load it as a structured shell config file
-    try:
-        cfg = load_shell_as_ini_config(config_file, return_string)
+    with open(config_file, "r") as file:
+        cfg = shell_str_to_dict(file.read(), return_string)
+    if cfg is not None:
         return cfg
-    except:
-        pass
 
     # Save env vars before and after sourcing the scipt and then
     # do a diff to get variables specifically defined/updated in the script
     # Method sounds brittle but seems to work ok so far
-    pid = os.getpid()
-    code = dedent(
-        f"""      #!/bin/bash
-      t1="./t1.{pid}"
-      t2="./t2.{pid}"
-      (set -o posix; set) > $t1
-      {{ . {config_file}; set +x; }} &>/dev/null
-      (set -o posix; set) > $t2
-      diff $t1 $t2 | grep "> " | cut -c 3-
-      rm -rf $t1 $t2
-    """
-    )
-    (_, config_str, _) = run_command(code)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        code = dedent(
+            f"""          #!/bin/bash
+          t1="{tmp_dir}/t1"
+          t2="{tmp_dir}/t2"
+          (set -o posix; set) > $t1
+          {{ . {config_file}; set +x; }} &>/dev/null
+          (set -o posix; set) > $t2
+          diff $t1 $t2 | grep "> " | cut -c 3-
+        """
+        )
+        (_, config_str, _) = run_command(code)
     lines = config_str.splitlines()
 
     # build the dictionary
@@ -380,9 +957,16 @@ def load_ini_config(config_file, return_string=0):
             )
         )
 
+    with open(config_file, "r") as file:
+        return ini_str_to_dict(file.read(), return_string)
+
+
+def ini_str_to_dict(contents, return_string=0):
+    """Parse the contents of an INI config file"""
+
     config = configparser.RawConfigParser()
     config.optionxform = str
-    config.read(config_file)
+    config.read_string(contents)
     config_dict = {s: dict(config.items(s)) for s in config.sections()}
     for _, vs in config_dict.items():
         for k, v in vs.items():
@@ -548,6 +1132,97 @@ def update_dict(dict_o, dict_t, provide_default=False):
             dict_t[k] = v
 
 
+def merge_dicts(dict_t, layers, provenance=None, validate=()):
+    """Update a dictionary with several others in a single traversal. The
+    result is that of calling update_dict(layer, dict_t) for each layer in
+    turn, then update_dict(dict_t, dict_t) to remove null entries, but no
+    dictionary is copied or walked more than once.
+
+    Args:
+        dict_t: target dictionary to update
+        layers: list of (name, dictionary) pairs, in increasing order of
+                precedence
+        provenance: optional dictionary to fill with the name of the layer
+                    that supplied each final value, keyed by its dotted path
+                    (e.g. "workflow.EXPT_SUBDIR"). Values that were already
+                    in dict_t are attributed to "default".
+        validate: names of the layers whose keys must all be in dict_t, as
+                  check_structure_dict(layer, dict_t) would check
+    Returns:
+        dict: Invalid key-value pairs of the validated layers, as
+        check_structure_dict returns them.
+    """
+    invalid = {}
+    _merge_level(
+        dict_t, layers, "default", dict_t, "", provenance, set(validate), invalid
+    )
+    return invalid
+
+
+def _merge_level(dict_t, layers, origin, template, path, provenance, validate, invalid):
+    """Merge one level of the layers into dict_t, then recurse into the
+    nested dictionaries. See merge_dicts.
+
+    origin is the name of the layer dict_t itself came from, and template
+    the dictionary (if any) that the keys of the validated layers must be
+    in. The template may be dict_t itself, so it is consulted before
+    dict_t is changed."""
+
+    sub_templates = {}
+    if template is not None:
+        checked = [layer for name, layer in layers if name in validate]
+        if origin in validate:
+            checked.append(dict_t)
+        for layer in checked:
+            for k, v in layer.items():
+                if k not in template:
+                    invalid[k] = v
+                elif isinstance(v, dict) and isinstance(template[k], dict):
+                    sub_templates[k] = template[k]
+
+    # Apply the layers at this level as update_dict would, deferring the
+    # nested dictionaries that update existing ones to a single recursion
+    # per key
+    nested = {}
+    origins = {}
+    for name, layer in layers:
+        # A layer may share nested dictionaries with dict_t, even be dict_t
+        for k, v in list(layer.items()):
+            if isinstance(v, dict) and isinstance(dict_t.get(k), dict):
+                nested.setdefault(k, []).append((name, v))
+                continue
+            nested.pop(k, None)
+            if v is None and k in dict_t:
+                del dict_t[k]
+                origins.pop(k, None)
+            else:
+                dict_t[k] = v
+                origins[k] = name
+
+    # Remove the null entries and recurse
+    prefix = f"{path}." if path else ""
+    nulls = []
+    for k, v in dict_t.items():
+        if v is None:
+            nulls.append(k)
+        elif isinstance(v, dict):
+            _merge_level(
+                v,
+                nested.get(k, ()),
+                origins.get(k, origin),
+                sub_templates.get(k),
+                prefix + k,
+                provenance,
+                validate,
+                invalid,
+            )
+        elif provenance is not None:
+            provenance[prefix + k] = origins.get(k, origin)
+    for k in nulls:
+        del dict_t[k]
+
+
+
 def check_structure_dict(dict_o, dict_t):
     """Check if a dictionary's structure follows a template.
     The invalid entries are returned as a dictionary.
@@ -590,8 +1265,10 @@ def filter_dict(dict_o, keys_regex):
 ##################
 # CONFIG loader
 ##################
-def load_config_file(file_name, return_string=0):
-    """Load config file based on file name extension"""
+@profile_phase("load_config_file")
+def load_config_file(file_name, return_string=0, keys=None):
+    """Load config file based on file name extension. For YAML files,
+    keys is an optional list of the top-level sections to load."""
 
     ext = os.path.splitext(file_name)[1][1:]
     if ext == "sh":
@@ -601,7 +1278,7 @@ def load_config_file(file_name, return_string=0):
     if ext == "json":
         return load_json_config(file_name)
     if ext in ["yaml", "yml"]:
-        return load_yaml_config(file_name)
+        return load_yaml_config(file_name, keys=keys)
     if ext == "xml":
         return load_xml_config(file_name, return_string)
 
@@ -666,7 +1343,24 @@ def cfg_main():
         help="Validation config file used to validate a given config file",
     )
 
+    parser.add_argument(
+        "--sections",
+        "-s",
+        dest="sections",
+        nargs="+",
+        required=False,
+        help="Print only these sections of the config, as lines that can be\
+                              sourced in bash, in the order given.",
+    )
+
     args = parser.parse_args()
+
+    if args.sections:
+        # Only the requested sections of the file are parsed
+        cfg = load_config_file(args.cfg, 2, keys=args.sections)
+        print(cfg_sections_to_sourceable_str(cfg, args.sections), end="")
+        return
+
     cfg = load_config_file(args.cfg, 2)
 
     if args.validate:
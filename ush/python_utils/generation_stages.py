@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import glob
+import logging
+import os
+import shutil
+import time
+from textwrap import dedent
+
+from .check_for_preexist_dir_file import check_for_preexist_dir_file
+from .filesys_cmds_vrfy import mkdir_vrfy
+from .print_msg import log_info
+from .profiling import profile_phase
+from .stage_files import stage_files
+
+
+def setup_input_files(ushdir: str, expt_config: dict, user_config_fn: str = "config.yaml",
+                      included: list = ()) -> list:
+    """
+    Returns the paths of the files that setup() reads for the given experiment
+    configuration and user config file: the config files, the files included
+    in the rocoto task groups (included), and the CCPP suite definition file.
+    """
+    parmdir = os.path.join(ushdir, os.pardir, "parm")
+    machine = expt_config["user"]["MACHINE"]
+    files = [
+        os.path.join(ushdir, user_config_fn),
+        os.path.join(ushdir, "config_defaults.yaml"),
+        os.path.join(ushdir, "machine", f"{machine.lower()}.yaml"),
+        os.path.join(ushdir, "constants.yaml"),
+        os.path.join(ushdir, "predef_grid_params.yaml"),
+        os.path.join(ushdir, "valid_param_vals.yaml"),
+        os.path.join(parmdir, "fixed_files_mapping.yaml"),
+        *sorted(glob.glob(os.path.join(parmdir, "wflow", "*.yaml"))),
+        *included,
+        expt_config["workflow"]["CCPP_PHYS_SUITE_IN_CCPP_FP"],
+    ]
+    return list(dict.fromkeys(files))
+
+
+def merra_climo_files(fixaer: str, fixlut: str, fixclim: str, symlink: bool = False):
+    """
+    Returns the (source, destination) pairs of the MERRA2 aerosol climatology
+    files to stage in fixclim, and the patterns that matched no files. When
+    copying, a pattern that matches no files is an error; when linking, only a
+    warning, as ln -s with an unmatched pattern only makes a dangling link.
+    """
+    pairs = []
+    unmatched = []
+    for pattern in (os.path.join(fixaer, "merra2.aerclim*.nc"),
+                    os.path.join(fixlut, "optics*.dat")):
+        sources = sorted(glob.glob(pattern))
+        if not sources:
+            unmatched.append(pattern)
+        pairs += [(fp, os.path.join(fixclim, os.path.basename(fp))) for fp in sources]
+    if unmatched:
+        msg = dedent(
+            f"""
+            No MERRA2 climatology files to {'link' if symlink else 'copy'} match:
+            """
+        ) + "\n".join(f"  {pattern}" for pattern in unmatched)
+        if not symlink:
+            raise FileNotFoundError(msg)
+        logging.warning(msg)
+    return pairs, unmatched
+
+
+def _remove_stale(directory: str, keep: set) -> None:
+    """
+    Removes the entries of directory whose names are not in keep.
+    """
+    for name in os.listdir(directory):
+        if name in keep:
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def stage_fix_files(expt_config: dict, manifest, debug: bool = False) -> tuple:
+    """
+    Copies or symlinks the fix files of an experiment to FIXam, and the MERRA2
+    aerosol climatology files to FIXclim if they are used. The files are
+    staged concurrently, those already in place from an earlier generation are
+    left as they are, and each group is skipped when the manifest shows that
+    nothing it depends on has changed. Files in a copied FIXam, and in FIXclim,
+    that are not among the files to stage are removed, so none are left from an
+    earlier generation.
+
+    Args:
+        expt_config (dict): The experiment configuration
+        manifest (StageManifest): The manifest of the experiment's stages
+        debug (bool): Log the details of each group of files
+    Returns:
+        A tuple of the number of files staged and the number left in place
+    """
+    platform_config = expt_config["platform"]
+    workflow_config = expt_config["workflow"]
+    symlink = workflow_config["SYMLINK_FIX_FILES"]
+    fixgsm = platform_config["FIXgsm"]
+    fixam = workflow_config["FIXam"]
+    files_to_copy = expt_config["fixed_files"]["FIXgsm_FILES_TO_COPY_TO_FIXam"]
+
+    start = time.perf_counter()
+    counts = [0, 0]
+    fix_values = {
+        "SYMLINK_FIX_FILES": symlink,
+        "FIXgsm": fixgsm,
+        "FIXam": fixam,
+        "FIXgsm_FILES_TO_COPY_TO_FIXam": files_to_copy,
+    }
+    if manifest.needs_run("fix_files", values=fix_values, outputs=[fixam]):
+        if symlink:
+            log_info(
+                f"""
+                Symlinking fixed files from system directory (FIXgsm) to a subdirectory (FIXam):
+                  FIXgsm = '{fixgsm}'
+                  FIXam = '{fixam}'""",
+                verbose=debug,
+            )
+
+            # A directory copied by an earlier generation is replaced
+            if os.path.isdir(fixam) and not os.path.islink(fixam):
+                check_for_preexist_dir_file(fixam, "delete")
+            pairs = [(fixgsm, fixam)]
+        else:
+            log_info(
+                f"""
+                Copying fixed files from system directory (FIXgsm) to a subdirectory (FIXam):
+                  FIXgsm = '{fixgsm}'
+                  FIXam = '{fixam}'""",
+                verbose=debug,
+            )
+
+            # A link made by an earlier generation is replaced, so that
+            # nothing is copied into FIXgsm itself
+            if os.path.islink(fixam):
+                os.remove(fixam)
+            mkdir_vrfy("-p", fixam)
+            # Files of an earlier configuration don't belong with these
+            _remove_stale(fixam, set(files_to_copy) | {"fix_co2_proj"})
+            mkdir_vrfy("-p", os.path.join(fixam, "fix_co2_proj"))
+
+            pairs = [
+                (os.path.join(fixgsm, fn), os.path.join(fixam, fn))
+                for fn in files_to_copy
+            ]
+        with profile_phase("stage fix files"):
+            staged = stage_files(pairs, symlink=symlink, require_sources=not symlink)
+        counts = [total + n for total, n in zip(counts, staged)]
+        manifest.done("fix_files")
+
+    fixaer = platform_config["FIXaer"]
+    fixlut = platform_config["FIXlut"]
+    fixclim = workflow_config["FIXclim"]
+    merra_values = {
+        "SYMLINK_FIX_FILES": symlink,
+        "FIXaer": fixaer,
+        "FIXlut": fixlut,
+        "FIXclim": fixclim,
+    }
+    if expt_config["task_run_fcst"]["USE_MERRA_CLIMO"] and manifest.needs_run(
+            "merra_climo", values=merra_values, outputs=[fixclim]):
+        log_info(
+            f"""
+            Copying MERRA2 aerosol climatology data files from system directory
+            (FIXaer/FIXlut) to a subdirectory (FIXclim) in the experiment directory:
+              FIXaer = '{fixaer}'
+              FIXlut = '{fixlut}'
+              FIXclim = '{fixclim}'""",
+            verbose=debug,
+        )
+
+        mkdir_vrfy("-p", fixclim)
+
+        pairs, unmatched = merra_climo_files(fixaer, fixlut, fixclim, symlink)
+        # Files of an earlier configuration don't belong with these
+        _remove_stale(fixclim, {os.path.basename(dst) for _, dst in pairs})
+        with profile_phase("stage MERRA2 files"):
+            staged = stage_files(pairs, symlink=symlink)
+        counts = [total + n for total, n in zip(counts, staged)]
+        # Try again next time if any of the files were missing
+        if not unmatched:
+            manifest.done("merra_climo")
+
+    if any(counts):
+        log_info(
+            f"""
+            Staged fix files in {time.perf_counter() - start:.2f} s:
+              {counts[0]} {'linked' if symlink else 'copied'}, """
+            f"{counts[1]} already in place"
+        )
+    return tuple(counts)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import contextlib
+import copy
+import os
+
+from . import config_parser
+from .config_parser import load_config_file, read_includes
+from .xml_parser import load_xml_file
+
+try:
+    import yaml
+except ModuleNotFoundError:
+    pass
+
+
+class GeneratorContext:
+    """Inputs shared by the experiments generated in one process, each
+    loaded once and reused for every experiment generated with the same
+    context: the default, machine, fixed files and constants configs, the
+    predefined grids, the rocoto task groups included by the default
+    workflow, and the CCPP suite definition files.
+
+    An entry is loaded again when the modification time or size of its
+    file changes. Configs are handed out as copies that the caller may
+    change; parsed XML trees are shared and must only be read.
+
+    Typical use:
+
+        context = GeneratorContext()
+        for config in configs:
+            generate_FV3LAM_wflow(ushdir, user_config_fn=config, context=context)
+    """
+
+    def __init__(self):
+        # Loaded entries, keyed by kind and path(s), with the stamps of the
+        # files they were loaded from
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        # Paths of the files included in the latest activation
+        self.included = []
+
+    def __getstate__(self):
+        # Only the loaded entries are sent to worker processes
+        return {"_entries": self._entries, "hits": 0, "misses": 0, "included": []}
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _cached(self, key, paths, loader):
+        """Return the entry for key, loading it if any of the files it
+        was loaded from has changed since"""
+
+        stamps = tuple(self._stamp(path) for path in paths)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamps:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = loader()
+        self._entries[key] = (stamps, value)
+        return value
+
+    def load_config(self, config_file):
+        """Return a copy of a config file's contents, see load_config_file"""
+
+        path = os.path.abspath(config_file)
+        cfg = self._cached(("config", path), [path], lambda: load_config_file(path))
+        return copy.deepcopy(cfg)
+
+    def load_xml(self, xml_file):
+        """Return the parsed tree of an XML file, see load_xml_file. The
+        tree is shared, and must not be changed."""
+
+        path = os.path.abspath(xml_file)
+        return self._cached(("xml", path), [path], lambda: load_xml_file(path))
+
+    def include(self, filepaths):
+        """Return the YAML text of the files referenced by the include
+        Jinja filter, see read_includes"""
+
+        paths = tuple(config_parser.include_path(filepath) for filepath in filepaths)
+        self.included.extend(path for path in paths if path not in self.included)
+        return self._cached(("include", paths), paths, lambda: read_includes(paths))
+
+    def load_yaml_str(self, text):
+        """Return a copy of the contents of a YAML string, parsed once for
+        each distinct string (e.g. the task groups rendered by include)"""
+
+        cfg = self._cached(
+            ("yaml_str", text), [], lambda: yaml.load(text, Loader=yaml.SafeLoader)
+        )
+        return copy.deepcopy(cfg)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Read the files of include Jinja filters through this context in
+        the body of the with statement, recording their paths in included"""
+
+        self.included = []
+        previous = config_parser.INCLUDE_CONTEXT
+        config_parser.INCLUDE_CONTEXT = self
+        try:
+            yield self
+        finally:
+            config_parser.INCLUDE_CONTEXT = previous
+
+    def preload(self, ushdir, machine):
+        """Load the config files that every experiment on a machine reads,
+        e.g. before forking processes that generate experiments"""
+
+        parmdir = os.path.join(ushdir, os.pardir, "parm")
+        for config_file in (
+            os.path.join(ushdir, "config_defaults.yaml"),
+            os.path.join(ushdir, "machine", f"{machine.lower()}.yaml"),
+            os.path.join(parmdir, "fixed_files_mapping.yaml"),
+            os.path.join(ushdir, "constants.yaml"),
+            os.path.join(parmdir, "wflow", "default_workflow.yaml"),
+            os.path.join(ushdir, "predef_grid_params.yaml"),
+        ):
+            self.load_config(config_file)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+Named phases of experiment generation, timed when profiling is enabled.
+
+A phase is entered with the profile_phase context manager, which can also
+decorate a function:
+
+    with profile_phase("merge config layers"):
+        ...
+
+    @profile_phase("link_fix")
+    def link_fix(...):
+
+Phases do nothing until start_profiling() is called. Until
+stop_profiling(), each phase records its wall time, CPU time and the peak
+resident memory of the process when it ends, nested under the phase it
+was entered from.
+"""
+
+import contextlib
+import cProfile
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The profiler phases are recorded in, if profiling is enabled
+_PROFILER = None
+
+
+def peak_rss_mb():
+    """Return the peak resident memory of this process in MB, or None
+    where it can't be measured"""
+
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return maxrss / 1024**2 if sys.platform == "darwin" else maxrss / 1024
+
+
+class PhaseProfiler:
+    """Records of the phases entered while profiling, in the order they
+    were entered, and optionally a cProfile profile of the same time"""
+
+    def __init__(self, cprofile=False):
+        self.phases = []
+        self._stack = []
+        self._start = time.perf_counter()
+        self.cprofile = cProfile.Profile() if cprofile else None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record the time spent in the body of the with statement"""
+
+        self._stack.append(name)
+        record = {
+            "name": name,
+            "path": "/".join(self._stack),
+            "depth": len(self._stack) - 1,
+            "start": time.perf_counter() - self._start,
+        }
+        self.phases.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            record["peak_rss_mb"] = peak_rss_mb()
+            self._stack.pop()
+
+    def summary(self):
+        """Return the phases totalled by their path of nested names, in
+        the order each was first entered"""
+
+        totals = {}
+        for record in self.phases:
+            total = totals.setdefault(
+                record["path"],
+                {
+                    "name": record["name"],
+                    "depth": record["depth"],
+                    "calls": 0,
+                    "wall": 0.0,
+                    "cpu": 0.0,
+                    "peak_rss_mb": None,
+                },
+            )
+            total["calls"] += 1
+            total["wall"] += record.get("wall", 0.0)
+            total["cpu"] += record.get("cpu", 0.0)
+            if record.get("peak_rss_mb") is not None:
+                total["peak_rss_mb"] = max(
+                    total["peak_rss_mb"] or 0.0, record["peak_rss_mb"]
+                )
+        return list(totals.values())
+
+    def report(self):
+        """Return the summary of the phases as a table"""
+
+        lines = [
+            f"{'phase':<52s}{'calls':>6s}{'wall (s)':>10s}{'cpu (s)':>10s}"
+            f"{'peak RSS (MB)':>15s}"
+        ]
+        for total in self.summary():
+            name = "  " * total["depth"] + total["name"]
+            peak = total["peak_rss_mb"]
+            lines.append(
+                f"{name:<52s}{total['calls']:>6d}{total['wall']:>10.3f}"
+                f"{total['cpu']:>10.3f}"
+                + (f"{peak:>15.1f}" if peak is not None else f"{'-':>15s}")
+            )
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        """Write every phase and the summary of the phases as JSON"""
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"phases": self.phases, "summary": self.summary()}, f, indent=2
+            )
+
+
+def start_profiling(cprofile=False):
+    """Start recording phases, and a cProfile profile if asked for
+
+    Returns:
+        The PhaseProfiler the phases are recorded in
+    """
+
+    global _PROFILER  # pylint: disable=global-statement
+    _PROFILER = PhaseProfiler(cprofile)
+    if _PROFILER.cprofile is not None:
+        _PROFILER.cprofile.enable()
+    return _PROFILER
+
+
+def stop_profiling():
+    """Stop recording phases
+
+    Returns:
+        The PhaseProfiler the phases were recorded in, or None if
+        profiling wasn't started
+    """
+
+    global _PROFILER  # pylint: disable=global-statement
+    profiler, _PROFILER = _PROFILER, None
+    if profiler is not None and profiler.cprofile is not None:
+        profiler.cprofile.disable()
+    return profiler
+
+
+@contextlib.contextmanager
+def profile_phase(name):
+    """Record the body of the with statement, or the decorated function,
+    as a phase if profiling is enabled"""
+
+    if _PROFILER is None:
+        yield
+        return
+    with _PROFILER.phase(name):
+        yield
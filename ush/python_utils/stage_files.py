@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import shutil
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from textwrap import dedent
+
+# Metadata operations on shared parallel filesystems (e.g. Lustre, GPFS)
+# are slow, but many of them can be in flight at once
+STAGE_FILES_MAX_WORKERS = 8
+
+
+def _in_place(source, destination, symlink):
+    """Return True if the destination is already the link to, or a copy
+    of, the source that staging it would make"""
+
+    try:
+        if symlink:
+            return os.readlink(destination) == source
+        src, dst = os.stat(source), os.lstat(destination)
+    except OSError:
+        return False
+    return (
+        not stat.S_ISLNK(dst.st_mode)
+        and src.st_size == dst.st_size
+        and int(src.st_mtime) == int(dst.st_mtime)
+    )
+
+
+def _stage(source, destination, symlink):
+    """Link or copy one file, replacing the destination. Return False if
+    it was already in place."""
+
+    if _in_place(source, destination, symlink):
+        return False
+    tmp = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if symlink:
+            os.symlink(source, tmp)
+        else:
+            shutil.copy2(source, tmp)
+        os.replace(tmp, destination)
+    finally:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+    return True
+
+
+def stage_files(pairs, symlink=False, require_sources=True,
+                max_workers=STAGE_FILES_MAX_WORKERS):
+    """Symlink or copy files concurrently. The existence of all the
+    sources is checked before anything is staged. Destinations that are
+    already links to their source, or copies of it with the same size and
+    modification time, are left as they are, so staging the same files
+    again is cheap.
+
+    Args:
+        pairs: list of (source, destination) paths
+        symlink: create symbolic links instead of copies
+        require_sources: raise an error if any of the sources doesn't
+                         exist; otherwise only warn, and link to them
+                         anyway, as ln -s does. Copies always need
+                         their sources.
+        max_workers: number of threads staging files at once
+    Returns:
+        A tuple of the number of files staged and the number left in
+        place
+    Raises:
+        FileNotFoundError if any of the sources doesn't exist, and they
+        are required
+    """
+
+    pairs = list(pairs)
+    if not pairs:
+        return 0, 0
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pairs))) as executor:
+        exists = list(executor.map(lambda pair: os.path.exists(pair[0]), pairs))
+        missing = [source for (source, _), ok in zip(pairs, exists) if not ok]
+        if missing:
+            msg = dedent(
+                f"""
+                The following files to {'link' if symlink else 'copy'} do not exist:
+                """
+            ) + "\n".join(f"  {source}" for source in missing)
+            if require_sources or not symlink:
+                raise FileNotFoundError(msg)
+            logging.warning(msg)
+        staged = sum(
+            executor.map(lambda pair: _stage(pair[0], pair[1], symlink), pairs)
+        )
+    return staged, len(pairs) - staged
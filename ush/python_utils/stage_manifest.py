@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+
+from .config_parser import file_checksum
+
+
+def file_fingerprint(path):
+    """Fingerprint the contents of an input file
+
+    Args:
+        path: path to the file
+    Returns:
+        The sha256 checksum of the file, or None if it does not exist
+    """
+
+    if not os.path.isfile(path):
+        return None
+    return file_checksum(path)
+
+
+def output_fingerprint(path):
+    """Fingerprint a generated file, directory or symlink without reading
+    its contents, which may be large (e.g. copied fix files)
+
+    Args:
+        path: path to the output
+    Returns:
+        The target of a symlink, the size and modification time of a file,
+        or a list of the fingerprints of the entries of a directory. None
+        if the path does not exist.
+    """
+
+    if os.path.islink(path):
+        return f"link:{os.readlink(path)}"
+    if os.path.isdir(path):
+        return sorted(
+            [entry.name, output_fingerprint(entry.path)]
+            for entry in os.scandir(path)
+        )
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    return None
+
+
+def values_fingerprint(values):
+    """Fingerprint a dictionary of configuration values
+
+    Args:
+        values: a dictionary that can be written as JSON, using str() for
+                any value JSON does not support (e.g. datetimes)
+    Returns:
+        The sha256 checksum of the values
+    """
+
+    dump = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+class StageManifest:
+    """Record of the fingerprints of the inputs and outputs of each stage
+    of experiment generation, saved in the experiment directory. A stage
+    whose input files and values are unchanged, and whose outputs have not
+    been touched since it last ran, can be skipped when the experiment is
+    regenerated.
+
+    Typical use:
+
+        if manifest.needs_run("namelist", files=[...], values={...},
+                              outputs=[nml_fp]):
+            ... generate nml_fp ...
+            manifest.done("namelist")
+    """
+
+    FILE_NAME = "generation_manifest.json"
+
+    def __init__(self, exptdir, reuse=True):
+        """
+        Args:
+            exptdir: the experiment directory
+            reuse: load the manifest saved by an earlier generation, so
+                   that its stages can be skipped
+        """
+        self.path = os.path.join(exptdir, self.FILE_NAME)
+        self.stages = {}
+        self.pending = {}
+        if reuse and os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.stages = json.load(f)
+            except (OSError, ValueError):
+                self.stages = {}
+
+    def needs_run(self, stage, files=(), values=None, outputs=()):
+        """Check whether a stage must be (re)run
+
+        Args:
+            stage: name of the stage
+            files: paths of the files the stage reads
+            values: dictionary of the configuration values the stage uses
+            outputs: paths of the files and directories the stage writes
+        Returns:
+            False if the stage ran before with the same inputs and its
+            outputs are as it left them, True otherwise
+        """
+
+        inputs = {
+            "files": {path: file_fingerprint(path) for path in files},
+            "values": values_fingerprint(values or {}),
+        }
+        self.pending[stage] = (inputs, list(outputs))
+
+        record = self.stages.get(stage)
+        if record is None or record["inputs"] != inputs:
+            return True
+        return any(
+            output_fingerprint(path) != fingerprint
+            for path, fingerprint in record["outputs"].items()
+        ) or set(record["outputs"]) != set(outputs)
+
+    def done(self, stage):
+        """Record that a stage has run, fingerprinting its outputs, and
+        save the manifest"""
+
+        inputs, outputs = self.pending.pop(stage)
+        self.stages[stage] = {
+            "inputs": inputs,
+            "outputs": {path: output_fingerprint(path) for path in outputs},
+        }
+        self.save()
+
+    def save(self):
+        """Write the manifest to the experiment directory"""
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stages, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -27,83 +27,571 @@ Also see the parse_args function below.
 
 import argparse
 import datetime as dt
+import fcntl
+import fnmatch
 import glob
+import hashlib
+import http.client
+import json
 import logging
 import os
+import re
 import shutil
+import sqlite3
 import subprocess
 import sys
 import glob
+import tempfile
+import threading
 from textwrap import dedent
 import time
+import urllib.error
+import urllib.parse
 import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from copy import deepcopy
 
 import yaml
 
 
-def clean_up_output_dir(expected_subdir, local_archive, output_path, source_paths):
-
-    """Remove expected sub-directories and existing_archive files on
-    disk once all files have been extracted and put into the specified
-    output location."""
+# HTTP status codes returned by data stores that are busy, throttling
+# our requests, or temporarily unable to serve a file. Requests that
+# fail with one of these are worth retrying after a pause.
+THROTTLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# wget exit status for a network failure, which includes timeouts
+WGET_NETWORK_FAILURE = 4
+
+# Default number of simultaneous requests made to a single host. Data
+# stores may override this with a "max_connections" entry.
+DEFAULT_MAX_PER_HOST = 4
+
+
+# Size of the blocks streamed to disk by the python transfer backend
+CHUNK_SIZE = 1024 * 1024
+
+# Linux ioctl request to clone a file's extents (a reflink copy)
+FICLONE = 0x40049409
+
+# Bytes per copy_file_range or sendfile call
+KERNEL_COPY_SIZE = 64 * CHUNK_SIZE
+
+# Seconds that a cached HPSS listing of an existing file is trusted
+# before probing again
+HPSS_LISTING_TTL = 3600
+
+
+class ThrottledError(Exception):
+
+    """Raised when a data store throttles or times out a request that
+    should be retried after backing off."""
+
+
+class HostLimiter:
+
+    """Bounds the number of simultaneous requests made to each host,
+    and spaces out requests to a host that has throttled us. The delay
+    for a host doubles each time it throttles a request, and is halved
+    with every successful request after that."""
+
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST, max_delay=60):
+        self.max_per_host = max_per_host
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._delays = {}
+
+    @staticmethod
+    def host(url):
+        """Return the host name for a url, or an empty string for a path
+        on disk."""
+        return urllib.parse.urlparse(url).netloc
+
+    @contextmanager
+    def slot(self, url):
+        """Wait for a free connection slot to the url's host, plus any
+        backoff delay that host has earned, before yielding."""
+        host = self.host(url)
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            slot = self._slots[host]
+        with slot:
+            delay = self._delays.get(host, 0)
+            if delay:
+                time.sleep(delay)
+            yield
+
+    def throttled(self, url):
+        """Record that the url's host throttled a request. Return the
+        new delay for that host in seconds."""
+        host = self.host(url)
+        with self._lock:
+            delay = min(max(2 * self._delays.get(host, 0), 1), self.max_delay)
+            self._delays[host] = delay
+        return delay
+
+    def succeeded(self, url):
+        """Record a successful request to the url's host, relaxing any
+        backoff delay."""
+        host = self.host(url)
+        with self._lock:
+            delay = self._delays.get(host, 0) / 2
+            self._delays[host] = delay if delay >= 0.5 else 0
+
+
+class ConnectionPool:
+
+    """Keeps HTTP(S) connections open per host between requests, so
+    successive transfers from the same data store skip the TCP and TLS
+    handshakes. Each connection is used by one thread at a time."""
+
+    # Errors raised when the server has closed an idle keep-alive
+    # connection that we try to reuse
+    STALE_ERRORS = (
+        http.client.RemoteDisconnected,
+        BrokenPipeError,
+        ConnectionResetError,
+    )
 
-    unavailable = {}
-    expand_source_paths = []
-    logging.debug(f"Cleaning up local paths: {source_paths}")
-    for p in source_paths:
-        expand_source_paths.extend(glob.glob(p.lstrip("/")))
-
-    # Check to make sure the files exist on disk
-    for file_path in expand_source_paths:
-        local_file_path = os.path.join(os.getcwd(), file_path.lstrip("/"))
-        logging.debug(f"Moving {local_file_path} to {output_path}")
-        if not os.path.exists(local_file_path):
-            logging.info(f"File does not exist: {local_file_path}")
-            unavailable["hpss"] = expand_source_paths
+    def __init__(self, timeout=15):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def _connect(self, scheme, netloc):
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key, [])
+            if idle:
+                return idle.pop(), False
+        return self._connect(*key), True
+
+    def _checkin(self, key, conn, response):
+        # Only a connection whose last response was read to the end can
+        # carry another request.
+        if response.isclosed() and not response.will_close:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
         else:
-            file_name = os.path.basename(file_path)
-            expected_output_loc = os.path.join(output_path, file_name)
-            if not local_file_path == expected_output_loc:
-                logging.info(f"Moving {local_file_path} to " f"{expected_output_loc}")
-                shutil.move(local_file_path, expected_output_loc)
-
-    # Clean up directories from inside archive, if they exist
-    if os.path.exists(expected_subdir) and expected_subdir != "./":
-        logging.info(f"Removing {expected_subdir}")
-        os.removedirs(expected_subdir)
-
-    # If an archive exists on disk, remove it
-    if os.path.exists(local_archive):
-        os.remove(local_archive)
-    return unavailable
+            conn.close()
+
+    @contextmanager
+    def request(self, method, url, headers=None, redirects=5):
+        """Issue a request and yield the response, following redirects.
+        The connection goes back to the pool if the response body has
+        been read completely when the context exits."""
+        parts = urllib.parse.urlparse(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        conn, fresh = self._checkout(key)
+        while True:
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                break
+            except self.STALE_ERRORS:
+                conn.close()
+                if fresh:
+                    raise
+                conn, fresh = self._connect(*key), True
+            except:
+                conn.close()
+                raise
+
+        if response.status in (301, 302, 303, 307, 308) and redirects:
+            location = urllib.parse.urljoin(url, response.getheader("Location"))
+            response.read()
+            self._checkin(key, conn, response)
+            with self.request(method, location, headers, redirects - 1) as redirected:
+                yield redirected
+            return
+
+        try:
+            yield response
+        except:
+            conn.close()
+            raise
+        self._checkin(key, conn, response)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle = {}
+
+
+class TransferReport:
+
+    """Timings and sizes of the files retrieved for a cycle, for tuning
+    the priority order of the data stores.
+
+    Each file gets a record of the seconds spent probing for it,
+    transferring it, and moving it into place, along with the bytes
+    transferred, the number of retries, the seconds spent waiting for a
+    connection slot or backing off, and whether the cache served it.
+    Work done once for many files, like an hsi probe or an htar
+    extraction, is kept as an event. Records are added from many
+    threads, and may also be logged one line per file."""
+
+    def __init__(self, log_each=False):
+        self.data_store = None
+        self.log_each = log_each
+        self.files = []
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, source, output, retrieved, **fields):
+        """Add the record of a single file retrieved, or not, from the
+        current data store."""
+        rec = {
+            "data_store": self.data_store,
+            "source": source,
+            "output": output,
+            "retrieved": bool(retrieved),
+            "cache": None,
+            "retries": 0,
+            "wait_s": 0.0,
+            "probe_s": 0.0,
+            "transfer_s": 0.0,
+            "move_s": 0.0,
+            "bytes": 0,
+        }
+        rec.update(fields)
+        with self._lock:
+            self.files.append(rec)
+        if self.log_each:
+            logging.info(f"Transfer record: {json.dumps(rec)}")
+
+    def event(self, kind, target, seconds, **fields):
+        """Add the record of a probe or extraction that served many
+        files from the current data store."""
+        rec = {
+            "data_store": self.data_store,
+            "kind": kind,
+            "target": target,
+            "seconds": seconds,
+        }
+        rec.update(fields)
+        with self._lock:
+            self.events.append(rec)
+        if self.log_each:
+            logging.info(f"Transfer event: {json.dumps(rec)}")
+
+    @staticmethod
+    def summarize(files, events):
+        """Return the totals for each data store of the given file and
+        event records, with the effective transfer rate in MB/s."""
+        stores = {}
+        for rec in files:
+            store = stores.setdefault(rec["data_store"], dict.fromkeys(
+                ("files", "retrieved", "bytes", "retries", "cache_hits",
+                 "cache_misses", "wait_s", "probe_s", "transfer_s", "move_s"),
+                0,
+            ))
+            store["files"] += 1
+            store["retrieved"] += rec["retrieved"]
+            store["cache_hits"] += rec["cache"] == "hit"
+            store["cache_misses"] += rec["cache"] == "miss"
+            for key in ("bytes", "retries", "wait_s", "probe_s", "transfer_s", "move_s"):
+                store[key] += rec[key]
+        for rec in events:
+            if rec["data_store"] in stores:
+                key = "probe_s" if rec["kind"] == "probe" else "transfer_s"
+                stores[rec["data_store"]][key] += rec["seconds"]
+        for store in stores.values():
+            store["MB_per_s"] = (
+                round(store["bytes"] / 1e6 / store["transfer_s"], 3)
+                if store["transfer_s"] else None
+            )
+        return stores
+
+    def write(self, path, cycle_date, output_path=None):
+        """Write the report as JSON. When an output path is given, only
+        the files placed there are included."""
+        with self._lock:
+            files = [
+                rec for rec in self.files
+                if output_path is None or rec["output"] is None
+                or os.path.dirname(rec["output"]) == output_path
+            ]
+            events = list(self.events)
+        report = {
+            "cycle_date": cycle_date.strftime("%Y%m%d%H"),
+            "data_stores": self.summarize(files, events),
+            "files": files,
+            "events": events,
+        }
+        logging.info(f"Writing a transfer report to {path}")
+        with open(path, "w") as fn:
+            json.dump(report, fn, indent=2)
+
+
+def file_size(path):
+
+    """Return the size of the file at path, or 0 if there isn't one."""
 
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
-def copy_file(source, destination, copy_cmd):
 
-    """
-    Copy a file from a source and place it in the destination location.
-    Return a boolean value reflecting the state of the copy.
+def link_file(source, destination):
+
+    """Place source at destination without copying data when the file
+    system allows it: a hard link first, then a clone_file copy, which
+    makes a reflink where it can. Replaces an existing destination."""
+
+    tmp = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp)
+    except OSError:
+        clone_file(source, tmp)
+    os.replace(tmp, destination)
+
+
+def clone_file(source, destination):
+
+    """Copy the contents of source to a new file at destination without
+    passing the data through Python: a reflink where the file system
+    supports it, then copy_file_range, then sendfile, falling back to a
+    plain read and write copy when the kernel refuses, e.g. across file
+    systems. The new file gets the source's permission bits less the
+    umask, like cp."""
+
+    with open(source, "rb", buffering=0) as src:
+        mode = os.fstat(src.fileno()).st_mode & 0o777
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        with open(os.open(destination, flags, mode), "wb", buffering=0) as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+
+            src_fd, dst_fd = src.fileno(), dst.fileno()
+            copies = []
+            if hasattr(os, "copy_file_range"):
+                copies.append(
+                    lambda: os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_SIZE)
+                )
+            if hasattr(os, "sendfile"):
+                copies.append(
+                    lambda: os.sendfile(dst_fd, src_fd, None, KERNEL_COPY_SIZE)
+                )
+            for copy in copies:
+                try:
+                    while copy():
+                        pass
+                    return
+                except OSError:
+                    # Start over with the next way of copying.
+                    src.seek(0)
+                    dst.seek(0)
+                    dst.truncate()
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+class FileCache:
+
+    """A local cache of retrieved files that can be shared by many
+    experiments.
+
+    Each file is stored once under objects/ in the cache directory,
+    named by the sha256 checksum of its contents, and is linked into
+    output paths on a hit. An SQLite index maps each fully-filled source
+    location (a url, or an HPSS archive and member path) to its object,
+    and records the object's size and modification time so that stale
+    objects are detected. When the objects exceed max_bytes, the least
+    recently used are evicted."""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS objects "
+                "(digest TEXT PRIMARY KEY, size INTEGER, mtime REAL, last_used REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(key TEXT PRIMARY KEY, digest TEXT NOT NULL)"
+            )
+
+    def object_path(self, digest):
+        """Return the path in the cache of an object."""
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def _forget(self, digest):
+        self._db.execute("DELETE FROM files WHERE digest = ?", (digest,))
+        self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        if os.path.exists(self.object_path(digest)):
+            os.remove(self.object_path(digest))
+
+    def fetch(self, key, output):
+        """Place the cached file for key at output. Return a boolean
+        reflecting whether the file was in the cache."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT objects.digest, size, mtime FROM files JOIN objects "
+                "ON files.digest = objects.digest WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return False
+            digest, size, mtime = row
+            path = self.object_path(digest)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None or (stat.st_size, stat.st_mtime) != (size, mtime):
+                logging.info(f"Dropping stale cache entry for {key}")
+                self._forget(digest)
+                return False
+            self._db.execute(
+                "UPDATE objects SET last_used = ? WHERE digest = ?",
+                (time.time(), digest),
+            )
+        link_file(path, output)
+        logging.info(f"Found {key} in cache {self.cache_dir}")
+        return True
+
+    def store(self, key, source):
+        """Add the file at source to the cache under key, evicting the
+        least recently used objects if needed."""
+        sha = hashlib.sha256()
+        with open(source, "rb") as src:
+            for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        path = self.object_path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                link_file(source, path)
+            stat = os.stat(path)
+            self._db.execute(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+                (digest, stat.st_size, stat.st_mtime, time.time()),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?)", (key, digest)
+            )
+            self._evict()
+        logging.debug(f"Stored {key} in cache {self.cache_dir}")
+
+    def _evict(self):
+        total = self._db.execute("SELECT TOTAL(size) FROM objects").fetchone()[0]
+        while total > self.max_bytes:
+            digest, size = self._db.execute(
+                "SELECT digest, size FROM objects ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            logging.info(f"Evicting {self.object_path(digest)} from cache")
+            self._forget(digest)
+            total -= size
+
+    def close(self):
+        """Close the index."""
+        self._db.close()
+
+
+class ListingCache:
+
+    """The files that HPSS listings found, kept in an SQLite file so that
+    they can be shared by later cycles, ensemble groups and experiments.
+    Files that were missing are not kept, since an archive that is still
+    being written, or a listing that failed, must not hide a file from
+    later attempts. It is independent of the FileCache of retrieved
+    files."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS found_files "
+                "(path TEXT PRIMARY KEY, checked REAL)"
+            )
+
+    def listing(self, path, ttl=HPSS_LISTING_TTL):
+        """Return whether path was found by an HPSS listing less than
+        ttl seconds ago."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM found_files WHERE path = ? AND checked > ?",
+                (path, time.time() - ttl),
+            ).fetchone()
+        return row is not None
+
+    def record_listing(self, path):
+        """Record that an HPSS listing found path."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO found_files VALUES (?, ?)",
+                (path, time.time()),
+            )
+
+    def close(self):
+        """Close the listing cache."""
+        self._db.close()
+
+
+def stage_file(source, destination, symlink=False):
 
-    Assumes destination exists.
+    """
+    Place a file from disk in the destination location as a symbolic
+    link or a copy, without starting a subprocess. Like ln -sf and cp, a
+    destination directory gets a file named like the source, and an
+    existing file is replaced. Return a boolean value reflecting the
+    state of the copy.
     """
 
     if not os.path.exists(source):
         logging.info(f"File does not exist on disk \n {source} \n try using: --input_file_path <your_path>")
         return False
 
-    # Using subprocess here because system copy is much faster than
-    # python copy options.
-    cmd = f"{copy_cmd} {source} {destination}"
-    logging.info(f"Running command: \n {cmd}")
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+
+    logging.info(f"{'Linking' if symlink else 'Copying'} {source} to {destination}")
+    tmp = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        subprocess.run(
-            cmd,
-            check=True,
-            shell=True,
-        )
-    except subprocess.CalledProcessError as err:
+        if symlink:
+            os.symlink(source, tmp)
+        else:
+            clone_file(source, tmp)
+        os.replace(tmp, destination)
+    except OSError as err:
         logging.info(err)
+        if os.path.lexists(tmp):
+            os.remove(tmp)
         return False
     return True
 
@@ -112,11 +600,23 @@ def check_file(url):
     """
     Check that a file exists at the expected URL. Return boolean value
     based on the response.
+
+    Raises ThrottledError when the server is throttling requests or the
+    request times out.
     """
-    status_code = urllib.request.urlopen(url).getcode()
+    try:
+        status_code = urllib.request.urlopen(url, timeout=15).getcode()
+    except urllib.error.HTTPError as err:
+        if err.code in THROTTLE_STATUS_CODES:
+            raise ThrottledError(f"{url} returned HTTP {err.code}") from err
+        raise
+    except (TimeoutError, urllib.error.URLError) as err:
+        if isinstance(err, TimeoutError) or isinstance(err.reason, TimeoutError):
+            raise ThrottledError(f"{url} timed out") from err
+        raise
     return status_code == 200
 
-def download_file(url):
+def download_file(url, target_path=None):
 
     """
     Download a file from a url source, and place it in a target location
@@ -124,25 +624,40 @@ def download_file(url):
 
     Arguments:
       url          url to file to be downloaded
+      target_path  directory to place the file in. Defaults to the
+                   current working directory.
 
     Return:
       boolean value reflecting state of download.
+
+    Raises ThrottledError when the server is throttling requests or the
+    transfer times out.
     """
 
     # wget flags:
     # -c continue previous attempt
     # -T timeout seconds
     # -t number of tries
-    cmd = f"wget -q -c -T 15 -t 2 {url}"
+    # -P directory prefix
+    # -nv -S only report errors and the server responses
+    prefix = f"-P {target_path} " if target_path else ""
+    cmd = f"wget -nv -S -c -T 15 -t 2 {prefix}{url}"
     logging.debug(f"Running command: \n {cmd}")
     try:
         subprocess.run(
             cmd,
             check=True,
             shell=True,
+            capture_output=True,
+            text=True,
         )
     except subprocess.CalledProcessError as err:
         logging.info(err)
+        statuses = re.findall(r"HTTP/\S+ (\d{3})", err.stderr or "")
+        if statuses and int(statuses[-1]) in THROTTLE_STATUS_CODES:
+            raise ThrottledError(f"{url} returned HTTP {statuses[-1]}") from err
+        if err.returncode == WGET_NETWORK_FAILURE:
+            raise ThrottledError(f"{url} failed with a network error") from err
         return False
     except:
         logging.error("Command failed!")
@@ -151,6 +666,360 @@ def download_file(url):
     return True
 
 
+def http_check_file(url, pool):
+
+    """
+    Check that a file exists at the expected URL with a HEAD request on
+    a pooled connection. Return boolean value based on the response.
+
+    Raises ThrottledError when the server is throttling requests or the
+    request times out.
+    """
+    try:
+        with pool.request("HEAD", url) as response:
+            response.read()
+    except TimeoutError as err:
+        raise ThrottledError(f"{url} timed out") from err
+    if response.status in THROTTLE_STATUS_CODES:
+        raise ThrottledError(f"{url} returned HTTP {response.status}")
+    return response.status == 200
+
+
+def http_download_file(url, target_path, pool):
+
+    """
+    Download a file from a url source on a pooled connection, and place
+    it in the target location on disk.
+
+    Data are streamed into a .part file next to the output file. An
+    existing .part file is resumed with a Range request. The .part file
+    is renamed to the output file only once its size matches the size
+    the server reported, so a file in the output location is always
+    complete. An output file from a previous download is checked with a
+    Range request from its end, and is left in place whatever the
+    response; it is copied to a .part file only if the server has more
+    data to append to it.
+
+    Arguments:
+      url          url to file to be downloaded
+      target_path  directory to place the file in. Defaults to the
+                   current working directory.
+      pool         ConnectionPool to make the request with
+
+    Return:
+      boolean value reflecting state of download.
+
+    Raises ThrottledError when the server is throttling requests or the
+    transfer times out.
+    """
+
+    file_name = os.path.basename(urllib.parse.urlparse(url).path)
+    output = os.path.join(target_path or os.getcwd(), file_name)
+    part = f"{output}.part"
+
+    # Verify or finish a previous download, like wget -c
+    if os.path.exists(part):
+        previous = part
+    elif os.path.exists(output):
+        previous = output
+    else:
+        previous = None
+    offset = os.path.getsize(previous) if previous else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    logging.debug(f"Downloading {url} to {output} from byte {offset}")
+    try:
+        with pool.request("GET", url, headers) as response:
+            if response.status == 416:
+                # The range starts at or past the end of the file. The
+                # .part file is complete if its size matches the total,
+                # or is taken to be when the total isn't reported.
+                response.read()
+                total = response.getheader("Content-Range", "").rpartition("/")[2]
+                expected = int(total) if total.isdigit() else None
+                if previous == output:
+                    if expected not in (None, offset):
+                        logging.info(
+                            f"{output} has {offset} bytes, but {url} has {expected}"
+                        )
+                    return expected in (None, offset)
+            elif response.status in (200, 206):
+                if response.status == 206 and previous == output:
+                    shutil.copyfile(output, part)
+                mode = "ab" if response.status == 206 else "wb"
+                start = offset if response.status == 206 else 0
+                length = response.getheader("Content-Length")
+                expected = start + int(length) if length is not None else None
+                with open(part, mode) as part_file:
+                    shutil.copyfileobj(response, part_file, CHUNK_SIZE)
+            else:
+                response.read()
+                if response.status in THROTTLE_STATUS_CODES:
+                    raise ThrottledError(f"{url} returned HTTP {response.status}")
+                logging.info(f"{url} returned HTTP {response.status}")
+                return False
+    except TimeoutError as err:
+        raise ThrottledError(f"{url} timed out") from err
+    except (OSError, http.client.HTTPException) as err:
+        logging.info(f"Transfer of {url} failed: {err}")
+        return False
+
+    size = os.path.getsize(part) if os.path.exists(part) else 0
+    if expected is not None and size != expected:
+        logging.info(f"Incomplete transfer of {url}: {size} of {expected} bytes")
+        # Keep a short .part file to resume on the next attempt
+        if size > expected:
+            os.remove(part)
+        return False
+
+    os.replace(part, output)
+    return True
+
+
+def grib_index_ranges(index, variables):
+
+    """
+    Given the text of a GRIB2 .idx inventory, return the byte ranges of
+    the records that match any of the variables, with adjacent ranges
+    coalesced.
+
+    Arguments:
+      index      contents of a .idx file, one record per line, like
+                 1:0:d=2023060100:PRMSL:mean sea level:anl:
+      variables  a list of wgrib2-style match strings, i.e. regular
+                 expressions searched for in each inventory line
+
+    Return:
+      a list of (start, end) inclusive byte ranges. An end of None
+      extends to the end of the file.
+    """
+
+    records = []
+    for line in index.splitlines():
+        fields = line.split(":")
+        if len(fields) > 2 and fields[1].isdigit():
+            records.append((int(fields[1]), line))
+
+    # Sub-messages share the offset of their parent message, so each
+    # record ends just before the next larger offset.
+    offsets = sorted({start for start, _ in records})
+    next_offset = dict(zip(offsets, offsets[1:] + [None]))
+
+    patterns = [re.compile(variable) for variable in variables]
+    matched = sorted(
+        (start, next_offset[start] - 1 if next_offset[start] is not None else None)
+        for start, line in records
+        if any(pattern.search(line) for pattern in patterns)
+    )
+
+    ranges = []
+    for start, end in matched:
+        if ranges and (ranges[-1][1] is None or start <= ranges[-1][1] + 1):
+            last_start, last_end = ranges[-1]
+            if last_end is not None:
+                last_end = None if end is None else max(last_end, end)
+            ranges[-1] = (last_start, last_end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def http_download_subset(url, target_path, pool, variables):
+
+    """
+    Download only the GRIB2 records matching variables from a url that
+    has a companion .idx inventory, and place the resulting (smaller,
+    but valid) GRIB2 file in the target location on disk. Falls back to
+    downloading the whole file when there is no inventory.
+
+    Arguments:
+      url          url to the GRIB2 file
+      target_path  directory to place the file in. Defaults to the
+                   current working directory.
+      pool         ConnectionPool to make the requests with
+      variables    a list of wgrib2-style match strings
+
+    Return:
+      boolean value reflecting state of download.
+
+    Raises ThrottledError when the server is throttling requests or the
+    transfer times out.
+    """
+
+    try:
+        with pool.request("GET", f"{url}.idx") as response:
+            index = response.read().decode(errors="replace")
+    except TimeoutError as err:
+        raise ThrottledError(f"{url}.idx timed out") from err
+    if response.status in THROTTLE_STATUS_CODES:
+        raise ThrottledError(f"{url}.idx returned HTTP {response.status}")
+    if response.status != 200:
+        logging.info(f"No inventory for {url}. Downloading the whole file.")
+        return http_download_file(url, target_path, pool)
+
+    ranges = grib_index_ranges(index, variables)
+    if not ranges:
+        logging.warning(f"No records in {url} match {variables}")
+        return False
+
+    file_name = os.path.basename(urllib.parse.urlparse(url).path)
+    output = os.path.join(target_path or os.getcwd(), file_name)
+    part = f"{output}.part"
+    logging.debug(f"Downloading byte ranges {ranges} of {url} to {output}")
+
+    # A subset can't be resumed, so only a complete one is kept.
+    complete = False
+    try:
+        with open(part, "wb") as part_file:
+            for start, end in ranges:
+                byte_range = f"bytes={start}-{'' if end is None else end}"
+                with pool.request("GET", url, {"Range": byte_range}) as response:
+                    if response.status != 206:
+                        response.read()
+                        if response.status in THROTTLE_STATUS_CODES:
+                            raise ThrottledError(
+                                f"{url} returned HTTP {response.status}"
+                            )
+                        logging.info(
+                            f"{url} returned HTTP {response.status} for {byte_range}"
+                        )
+                        return False
+                    length = int(response.getheader("Content-Length", -1))
+                    written = part_file.tell()
+                    shutil.copyfileobj(response, part_file, CHUNK_SIZE)
+                    if length >= 0 and part_file.tell() - written != length:
+                        logging.info(f"Incomplete transfer of {byte_range} of {url}")
+                        return False
+        complete = True
+    except TimeoutError as err:
+        raise ThrottledError(f"{url} timed out") from err
+    except (OSError, http.client.HTTPException) as err:
+        logging.info(f"Transfer of {url} failed: {err}")
+        return False
+    finally:
+        if not complete and os.path.exists(part):
+            os.remove(part)
+
+    os.replace(part, output)
+    return True
+
+
+def retrieve_file(
+    cla,
+    input_loc,
+    target_path,
+    method,
+    limiter,
+    pool=None,
+    variables=None,
+    cache=None,
+    report=None,
+    retries=3,
+):
+
+    """
+    Retrieve a single file from disk or a url into the target path.
+    Requests that are throttled or time out are retried up to retries
+    times, backing off from that host between attempts.
+
+    Urls are fetched with wget, or on a pooled connection with the
+    python transfer backend. When variables are given, only the
+    matching GRIB2 records are downloaded. Downloads are served from,
+    and added to, the cache when one is provided. The work done is
+    added to the report, if provided.
+
+    Return:
+      boolean value reflecting state of retrieval.
+    """
+
+    logging.info(f"Getting file: {input_loc}")
+    logging.debug(f"Target path: {target_path}")
+    if method == "disk":
+        output = os.path.join(target_path, os.path.basename(input_loc))
+        start = time.perf_counter()
+        retrieved = stage_file(input_loc, target_path, cla.symlink)
+        logging.debug(f"Retrieved status: {retrieved}")
+        if report is not None:
+            # A symbolic link moves no data.
+            phase = "move_s" if cla.symlink else "transfer_s"
+            report.record(
+                input_loc,
+                output,
+                retrieved,
+                bytes=0 if cla.symlink or not retrieved else file_size(output),
+                **{phase: time.perf_counter() - start},
+            )
+        return retrieved
+
+    cache_key = f"{input_loc}#{'|'.join(variables)}" if variables else input_loc
+    output = os.path.join(
+        target_path, os.path.basename(urllib.parse.urlparse(input_loc).path)
+    )
+    timings = {"retries": 0, "wait_s": 0.0, "transfer_s": 0.0}
+    if cache is not None and not cla.check_file:
+        start = time.perf_counter()
+        hit = cache.fetch(cache_key, output)
+        timings["cache"] = "hit" if hit else "miss"
+        if hit:
+            if report is not None:
+                report.record(
+                    input_loc, output, True, cache="hit",
+                    move_s=time.perf_counter() - start,
+                )
+            return True
+
+    # Time spent checking a file exists is a probe, not a transfer
+    phase = "probe_s" if cla.check_file else "transfer_s"
+    retrieved = False
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            with limiter.slot(input_loc):
+                timings["wait_s"] += time.perf_counter() - start
+                start = time.perf_counter()
+                python_backend = cla.transfer_backend == "python"
+                if cla.check_file and python_backend:
+                    retrieved = http_check_file(input_loc, pool)
+                elif cla.check_file:
+                    retrieved = check_file(input_loc)
+                elif variables:
+                    retrieved = http_download_subset(
+                        input_loc, target_path, pool, variables
+                    )
+                elif python_backend:
+                    retrieved = http_download_file(input_loc, target_path, pool)
+                else:
+                    retrieved = download_file(input_loc, target_path)
+        except ThrottledError as err:
+            timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+            if attempt == retries:
+                logging.warning(f"{err}. Giving up after {retries} retries.")
+                break
+            timings["retries"] += 1
+            delay = limiter.throttled(input_loc)
+            logging.info(f"{err}. Backing off {delay} s before retrying.")
+            continue
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+        limiter.succeeded(input_loc)
+        logging.debug(f"Retrieved status: {retrieved}")
+        if retrieved and cache is not None and not cla.check_file:
+            cache.store(cache_key, output)
+        break
+
+    if report is not None:
+        if cla.check_file:
+            report.record(input_loc, None, retrieved, **timings)
+        else:
+            report.record(
+                input_loc,
+                output,
+                retrieved,
+                bytes=file_size(output) if retrieved else 0,
+                **timings,
+            )
+    return retrieved
+
+
 def arg_list_to_range(args):
 
     """
@@ -253,34 +1122,42 @@ def create_target_path(target_path):
     return target_path
 
 
-def find_archive_files(paths, file_names, cycle_date, ens_group):
+def find_archive_files(
+    paths, file_names, cycle_date, ens_group, listings=None, ttl=HPSS_LISTING_TTL
+):
 
     """Given an equal-length set of archive paths and archive file
     names, and a cycle date, check HPSS via hsi to make sure at least
     one set exists. Return a dict of the paths of the existing archive, along with
-    the item in set of paths that was found."""
+    the item in set of paths that was found.
 
-    zipped_archive_file_paths = zip(paths, file_names)
+    All of the candidate archives are checked in a single hsi session,
+    and those found are kept in the ListingCache, if provided, for ttl
+    seconds."""
 
-    # Narrow down which HPSS files are available for this date
+    candidates = []
     for list_item, (archive_path, archive_file_names) in enumerate(
-        zipped_archive_file_paths
+        zip(paths, file_names)
     ):
-
-        existing_archives = {}
         if not isinstance(archive_file_names, list):
             archive_file_names = [archive_file_names]
 
         for n_fp, archive_file_name in enumerate(archive_file_names):
-            # Only test the first item in the list, it will tell us if this
-            # set exists at this date.
             file_path = os.path.join(archive_path, archive_file_name)
             file_path = fill_template(file_path, cycle_date, ens_group=ens_group)
-            file_path = hsi_single_file(file_path)
+            candidates.append((list_item, n_fp, file_path))
 
-            if file_path:
-                existing_archives[n_fp] = file_path
+    found = hsi_list_files(
+        [file_path for _, _, file_path in candidates], listings, ttl
+    )
 
+    # Narrow down which HPSS files are available for this date
+    for list_item in range(len(paths)):
+        existing_archives = {
+            n_fp: file_path
+            for item, n_fp, file_path in candidates
+            if item == list_item and file_path in found
+        }
         if existing_archives:
             for existing_archive in existing_archives.values():
                 logging.info(f"Found HPSS file: {existing_archive}")
@@ -333,12 +1210,21 @@ def get_file_templates(cla, known_data_info, data_store, use_cla_tmpl=False):
 
 def get_requested_files(cla, file_templates, input_locs, method="disk", **kwargs):
 
-    # pylint: disable=too-many-locals
+    # pylint: disable=too-many-locals,too-many-statements
 
     """This function copies files from disk locations
     or downloads files from a url, depending on the option specified for
     user.
 
+    Files are retrieved concurrently by up to cla.max_workers threads,
+    fanning out across members and forecast hours. The locations for a
+    single member and forecast hour are tried one after another, and a
+    file that several of them share is retrieved by one of them at a
+    time. The
+    locations tried, and the files reported unavailable, are those of a
+    one-at-a-time pass: once a file has been missing, every later member
+    and forecast hour tries all the locations.
+
     This function expects that the output directory exists and is
     writeable.
 
@@ -355,6 +1241,14 @@ def get_requested_files(cla, file_templates, input_locs, method="disk", **kwargs
     members        a list integers corresponding to the ensemble members
     check_all      boolean flag that indicates all urls should be
                    checked for all files
+    max_per_host   the number of simultaneous requests allowed to a
+                   single host
+    pool           ConnectionPool to reuse for the python transfer
+                   backend
+    variables      a list of wgrib2-style match strings selecting the
+                   GRIB2 records to download
+    cache          FileCache to serve downloads from
+    report         TransferReport to add the work done to
 
     Returns:
     unavailable  a list of locations/files that were unretrievable
@@ -364,6 +1258,7 @@ def get_requested_files(cla, file_templates, input_locs, method="disk", **kwargs
     members = cla.members if isinstance(cla.members, list) else [members]
 
     check_all = kwargs.get("check_all", False)
+    max_per_host = kwargs.get("max_per_host", DEFAULT_MAX_PER_HOST)
 
     logging.info(f"Getting files named like {file_templates}")
 
@@ -375,70 +1270,121 @@ def get_requested_files(cla, file_templates, input_locs, method="disk", **kwargs
 
     input_locs = input_locs if isinstance(input_locs, list) else [input_locs]
 
-    orig_path = os.getcwd()
-    unavailable = []
-
     locs_files = pair_locs_with_files(input_locs, file_templates, check_all)
+
+    # Each unit of work is a single forecast hour for a single member,
+    # in the order they would be visited one at a time.
+    units = []
     for mem in members:
         target_path = fill_template(cla.output_path, cla.cycle_date, mem=mem)
         target_path = create_target_path(target_path)
-
         logging.info(f"Retrieved files will be placed here: \n {target_path}")
-        os.chdir(target_path)
+        units.extend([(mem, fcst_hr, target_path) for fcst_hr in cla.fcst_hrs])
 
-        for fcst_hr in cla.fcst_hrs:
-            logging.debug(f"Looking for fhr = {fcst_hr}")
-            for loc, templates in locs_files:
+    variables = kwargs.get("variables")
 
-                templates = templates if isinstance(templates, list) else [templates]
+    limiter = HostLimiter(max_per_host)
+    pool = None
+    if method == "download" and (cla.transfer_backend == "python" or variables):
+        pool = kwargs.get("pool") or ConnectionPool()
 
-                logging.debug(f"Looking for files like {templates}")
-                logging.debug(f"They should be here: {loc}")
+    # A file template without {fcst_hr} or {mem} fills to the same file
+    # for several units. Those units retrieve it one at a time, and only
+    # until one of them has it.
+    retrieved_files = set()
+    output_locks = {}
+    output_locks_lock = threading.Lock()
 
-                template_loc = loc
-                for tmpl_num, template in enumerate(templates):
-                    if isinstance(loc, list) and len(loc) == len(templates):
-                        template_loc = loc[tmpl_num]
-                    input_loc = os.path.join(template_loc, template)
-                    input_loc = fill_template(
-                        input_loc,
-                        cla.cycle_date,
-                        fcst_hr=fcst_hr,
-                        mem=mem,
-                    )
-                    logging.info(f"Getting file: {input_loc}")
-                    logging.debug(f"Target path: {target_path}")
-                    if method == "disk":
-                        if cla.symlink:
-                            retrieved = copy_file(input_loc, target_path, "ln -sf")
-                        else:
-                            retrieved = copy_file(input_loc, target_path, "cp")
-
-                    elif method == "download":
-
-                        if cla.check_file:
-                            retrieved = check_file(input_loc)
-
-                        else:
-                            retrieved = download_file(input_loc)
-                        # Wait a bit before trying the next download.
-                        # Seems to reduce the occurrence of timeouts
-                        # when downloading from AWS
-                        time.sleep(5)
-
-                    logging.debug(f"Retrieved status: {retrieved}")
-                    if not retrieved:
-                        unavailable.append(input_loc)
-
-                if not unavailable:
-                    # Start on the next fcst hour if all files were
-                    # found from a loc/template combo
-                    break
-                else:
-                    logging.debug(f"Some files were not retrieved: {unavailable}")
-                    logging.debug("Will check other locations for missing files")
+    def retrieve_once(input_loc, target_path):
+        output = os.path.join(
+            target_path, os.path.basename(urllib.parse.urlparse(input_loc).path)
+        )
+        with output_locks_lock:
+            output_lock = output_locks.setdefault(output, threading.Lock())
+        with output_lock:
+            if (input_loc, target_path) in retrieved_files:
+                logging.debug(f"Already retrieved: {input_loc}")
+                return True
+            retrieved = retrieve_file(
+                cla,
+                input_loc,
+                target_path,
+                method,
+                limiter,
+                pool,
+                variables,
+                kwargs.get("cache"),
+                kwargs.get("report"),
+            )
+            if retrieved:
+                retrieved_files.add((input_loc, target_path))
+            return retrieved
+
+    def retrieve_unit(unit_id, first_loc=0, exhaustive=False):
+        """Retrieve the files of one unit, trying one location after
+        another from first_loc on. All the locations of a unit write to
+        the same files, so they are never tried at once. Stop after a
+        location that provided all the files, unless one was missing
+        from an earlier location or exhaustive is set. Return the files
+        that were not retrieved, and the index of the next location."""
+        mem, fcst_hr, target_path = units[unit_id]
+        logging.debug(f"Looking for fhr = {fcst_hr}")
+        unit_unavailable = []
+        for loc_num in range(first_loc, len(locs_files)):
+            loc, templates = locs_files[loc_num]
+            templates = templates if isinstance(templates, list) else [templates]
+
+            logging.debug(f"Looking for files like {templates}")
+            logging.debug(f"They should be here: {loc}")
+
+            template_loc = loc
+            for tmpl_num, template in enumerate(templates):
+                if isinstance(loc, list) and len(loc) == len(templates):
+                    template_loc = loc[tmpl_num]
+                input_loc = os.path.join(template_loc, template)
+                input_loc = fill_template(
+                    input_loc,
+                    cla.cycle_date,
+                    fcst_hr=fcst_hr,
+                    mem=mem,
+                )
+                if not retrieve_once(input_loc, target_path):
+                    unit_unavailable.append(input_loc)
+
+            if not (unit_unavailable or exhaustive):
+                # Start on the next fcst hour if all files were
+                # found from a loc/template combo
+                return unit_unavailable, loc_num + 1
+            logging.debug(f"Some files were not retrieved: {unit_unavailable}")
+            logging.debug("Will check other locations for missing files")
+        return unit_unavailable, len(locs_files)
+
+    # Units are retrieved concurrently, each walking its locations in
+    # order.
+    with ThreadPoolExecutor(max_workers=cla.max_workers) as executor:
+        results = list(executor.map(retrieve_unit, range(len(units))))
+
+        # One at a time, every unit after the first with a missing file
+        # went on to try all the locations, so finish those the units
+        # above stopped short of
+        missing = [unit_id for unit_id, (result, _) in enumerate(results) if result]
+        if missing:
+            rest = [
+                unit_id
+                for unit_id in range(missing[0] + 1, len(units))
+                if results[unit_id][1] < len(locs_files)
+            ]
+            rest_results = executor.map(
+                lambda unit_id: retrieve_unit(unit_id, results[unit_id][1], True),
+                rest,
+            )
+            for unit_id, (result, next_loc) in zip(rest, rest_results):
+                results[unit_id] = (results[unit_id][0] + result, next_loc)
+
+    unavailable = [input_loc for result, _ in results for input_loc in result]
+    if unavailable:
+        logging.debug(f"Some files were not retrieved: {unavailable}")
 
-    os.chdir(orig_path)
     return unavailable
 
 
@@ -469,19 +1415,94 @@ def hsi_single_file(file_path, mode="ls"):
     return file_path
 
 
-def hpss_requested_files(cla, file_names, store_specs, members=-1, ens_group=-1):
+def hsi_list_files(file_paths, listings=None, ttl=HPSS_LISTING_TTL):
+
+    """Check which of the file_paths exist on HPSS with one hsi session
+    that lists all of them from a command file. Paths found in the
+    ListingCache, listings, less than ttl seconds ago are not probed
+    again; missing paths always are.
+
+    Return:
+        the set of file paths that exist
+    """
+
+    found = set()
+    to_probe = []
+    for file_path in dict.fromkeys(file_paths):
+        if listings is not None and listings.listing(file_path, ttl):
+            found.add(file_path)
+        else:
+            to_probe.append(file_path)
+    logging.debug(f"Using cached HPSS listings for {set(file_paths) - set(to_probe)}")
+
+    if not to_probe:
+        return found
+
+    with tempfile.NamedTemporaryFile("w", prefix="hsi_ls.", suffix=".in") as cmd_file:
+        cmd_file.write("".join(f"ls -P {file_path}\n" for file_path in to_probe))
+        cmd_file.flush()
+        cmd = f"hsi -P in {cmd_file.name}"
+        logging.info(f"Running command \n {cmd}\n for paths {to_probe}")
+        result = subprocess.run(
+            cmd,
+            check=False,
+            shell=True,
+            capture_output=True,
+            text=True,
+        )
+
+    # ls -P reports each file on a line like
+    # FILE  /path/to/file  size  size  ...
+    output = result.stdout + result.stderr
+    listed = set()
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) > 1 and fields[0] == "FILE":
+            listed.add(os.path.normpath(fields[1]))
+    probed = {
+        file_path for file_path in to_probe if os.path.normpath(file_path) in listed
+    }
+
+    for file_path in to_probe:
+        if file_path not in probed:
+            logging.warning(f"{file_path} is not available!")
+
+    if listings is not None:
+        for file_path in probed:
+            listings.record_listing(file_path)
+
+    return found | probed
+
+
+def hpss_requested_files(
+    cla, file_names, store_specs, members=-1, ens_group=-1, cache=None, report=None
+):
 
     # pylint: disable=too-many-locals
 
     """This function interacts with the "hpss" protocol in a provided
     data store specs file to download a set of files requested by the
     user. Depending on the type of archive file (zip or tar), it will
-    either pull the entire file and unzip it, or attempt to pull
-    individual files from a tar file.
+    either pull the entire file and extract the requested members, or
+    attempt to pull individual files from a tar file.
+
+    The files for every member and every possible internal directory
+    are planned first, so that each tar archive is extracted with a
+    single htar call, and the extracted files are then fanned out to
+    each member's output path. Members of zip archives are streamed
+    straight to their output paths.
 
     It cleans up local disk after files are deemed available to remove
     any empty subdirectories that may still be present.
 
+    When a FileCache is provided, files already cached from the same
+    archives are linked into place without touching the archives, and
+    newly extracted files are added to the cache. The archives found are
+    kept in the ListingCache at cla.hpss_listing_cache, if one is set.
+
+    When a TransferReport is provided, the archive probe, each
+    extraction, and each file placed are added to it.
+
     This function exepcts that the output directory exists and is
     writable.
     """
@@ -507,12 +1528,34 @@ def hpss_requested_files(cla, file_names, store_specs, members=-1, ens_group=-1)
         f"Will try to look for: " f" {list(zip(archive_paths, archive_file_names))}"
     )
 
-    existing_archives, which_archive = find_archive_files(
-        archive_paths,
-        archive_file_names,
-        cla.cycle_date,
-        ens_group=ens_group,
-    )
+    start = time.perf_counter()
+    listings = None
+    if cla.hpss_listing_cache:
+        try:
+            listings = ListingCache(cla.hpss_listing_cache)
+        except (OSError, sqlite3.Error) as err:
+            logging.warning(
+                f"Not using HPSS listing cache {cla.hpss_listing_cache}: {err}"
+            )
+    try:
+        existing_archives, which_archive = find_archive_files(
+            archive_paths,
+            archive_file_names,
+            cla.cycle_date,
+            ens_group=ens_group,
+            listings=listings,
+            ttl=cla.hpss_listing_ttl,
+        )
+    finally:
+        if listings is not None:
+            listings.close()
+    if report is not None:
+        report.event(
+            "probe",
+            archive_paths,
+            time.perf_counter() - start,
+            found=list(existing_archives.values()) if existing_archives else [],
+        )
 
     logging.debug(f"Found existing archives: {existing_archives}")
 
@@ -532,99 +1575,264 @@ def hpss_requested_files(cla, file_names, store_specs, members=-1, ens_group=-1)
     # archive_internal_dir
     logging.debug(f"Checking archive number {which_archive} in list.")
 
-    for archive_internal_dir_tmpl in archive_internal_dirs:
-        for mem in members:
-            archive_internal_dir = fill_template(
-                archive_internal_dir_tmpl,
-                cla.cycle_date,
-                mem=mem,
-            )
-
-            output_path = fill_template(cla.output_path, cla.cycle_date, mem=mem)
-            logging.info(f"Will place files in {os.path.abspath(output_path)}")
-            logging.debug(f"CWD: {os.getcwd()}")
+    # Plan every file requested for every member before touching the
+    # archives, so that each archive is opened only once. A requested
+    # file may be under any of the internal directories.
+    output_paths = {}
+    requested = {}
+    for mem in members:
+        output_path = fill_template(cla.output_path, cla.cycle_date, mem=mem)
+        if mem != -1:
+            output_path = create_target_path(output_path)
+        logging.info(f"Will place files in {os.path.abspath(output_path)}")
+        output_paths[mem] = output_path
 
-            if mem != -1:
-                archive_internal_dir = fill_template(
-                    archive_internal_dir_tmpl,
-                    cla.cycle_date,
-                    mem=mem,
+        for fcst_hr in cla.fcst_hrs:
+            for file_name in file_names:
+                requested[(mem, fcst_hr, file_name)] = [
+                    fill_template(
+                        os.path.join(archive_internal_dir_tmpl, file_name),
+                        cla.cycle_date,
+                        fcst_hr=fcst_hr,
+                        mem=mem,
+                        ens_group=ens_group,
+                    )
+                    for archive_internal_dir_tmpl in archive_internal_dirs
+                ]
+
+    # Files are cached under the archives they were found in
+    archive_key = ",".join(existing_archives.values())
+    placed = set()
+    if cache is not None:
+        for (mem, fcst_hr, file_name), source_paths in requested.items():
+            for source_path in source_paths:
+                output = os.path.join(
+                    output_paths[mem], os.path.basename(source_path)
                 )
-                output_path = create_target_path(output_path)
-                logging.info(f"Will place files in {os.path.abspath(output_path)}")
-
-            source_paths = []
-            for fcst_hr in cla.fcst_hrs:
-                for file_name in file_names:
-                    source_paths.append(
-                        fill_template(
-                            os.path.join(archive_internal_dir, file_name),
-                            cla.cycle_date,
-                            fcst_hr=fcst_hr,
-                            mem=mem,
-                            ens_group=ens_group,
+                start = time.perf_counter()
+                if cache.fetch(f"{archive_key}:{source_path}", output):
+                    placed.add((mem, fcst_hr, file_name))
+                    if report is not None:
+                        report.record(
+                            source_path, output, True, cache="hit",
+                            move_s=time.perf_counter() - start,
                         )
+                    break
+
+    to_extract = sorted(
+        {
+            source_path
+            for item, source_paths in requested.items()
+            if item not in placed
+            for source_path in source_paths
+        }
+    )
+    if to_extract and store_specs.get("archive_format", "tar") == "zip":
+        remaining = {
+            item: source_paths
+            for item, source_paths in requested.items()
+            if item not in placed
+        }
+        for existing_archive in existing_archives.values():
+            extracted = extract_zip_members(
+                existing_archive,
+                remaining,
+                output_paths,
+                cache=cache,
+                archive_key=archive_key,
+                report=report,
+            )
+            placed |= extracted
+            # Later archives are only searched, and staged, for the
+            # items that are still missing
+            for item in extracted:
+                del remaining[item]
+            if not remaining:
+                break
+
+    elif to_extract:
+        logging.debug(f"CWD: {os.getcwd()}")
+        for existing_archive in existing_archives.values():
+            start = time.perf_counter()
+            extract_from_archive(existing_archive, to_extract)
+            if report is not None:
+                report.event(
+                    "extract", existing_archive, time.perf_counter() - start
+                )
+
+        # Fan the extracted files out to each member's output path,
+        # then remove them and any directories from inside the archive.
+        extracted = set()
+        for source_path in to_extract:
+            extracted.update(glob.glob(source_path.lstrip("/")))
+        for item, source_paths in requested.items():
+            if item in placed:
+                continue
+            mem = item[0]
+            for source_path in source_paths:
+                local_files = glob.glob(source_path.lstrip("/"))
+                for local_file in local_files:
+                    output = os.path.join(
+                        output_paths[mem], os.path.basename(local_file)
                     )
+                    logging.info(f"Moving {os.path.abspath(local_file)} to {output}")
+                    start = time.perf_counter()
+                    if os.path.abspath(local_file) == os.path.abspath(output):
+                        extracted.discard(local_file)
+                    else:
+                        link_file(local_file, output)
+                    if report is not None:
+                        report.record(
+                            source_path,
+                            output,
+                            True,
+                            cache=None if cache is None else "miss",
+                            move_s=time.perf_counter() - start,
+                            bytes=file_size(output),
+                        )
+                    if cache is not None:
+                        cache.store(f"{archive_key}:{source_path}", output)
+                if local_files:
+                    placed.add(item)
+                    break
 
-            expected = set(source_paths)
-            unavailable = {}
-            for existing_archive in existing_archives.values():
-                if store_specs.get("archive_format", "tar") == "zip":
+        for local_file in extracted:
+            os.remove(local_file)
+        for source_path in to_extract:
+            expected_subdir = os.path.dirname(source_path.lstrip("/"))
+            if expected_subdir not in ("", ".") and os.path.isdir(expected_subdir):
+                logging.info(f"Removing {expected_subdir}")
+                try:
+                    os.removedirs(expected_subdir)
+                except OSError as err:
+                    logging.debug(f"Could not remove {expected_subdir}: {err}")
+
+    # Report the first candidate path of each file that wasn't in any of
+    # the archives.
+    unavailable = {
+        source_paths[0]
+        for item, source_paths in requested.items()
+        if item not in placed
+    }
+    for source_path in unavailable:
+        logging.info(f"File does not exist in archives: {source_path}")
+        if report is not None:
+            report.record(source_path, None, False)
+    return unavailable
 
-                    # Get the entire file from HPSS
-                    existing_archive = hsi_single_file(existing_archive, mode="get")
 
-                    # Grab only the necessary files from the archive
-                    cmd = f'unzip -o {os.path.basename(existing_archive)} {" ".join(source_paths)}'
+def extract_from_archive(archive, source_paths):
 
-                else:
-                    cmd = f'htar -xvf {existing_archive} {" ".join(source_paths)}'
+    """Extract all of the source_paths that exist in an HPSS tar archive
+    into the current directory with a single htar call. Paths missing
+    from the archive are expected, since callers ask for every place a
+    file may be."""
 
-                logging.info(f"Running command \n {cmd}")
+    cmd = f'htar -xvf {archive} {" ".join(source_paths)}'
 
-                try:
-                    r = subprocess.run(
-                        cmd,
-                        check=False,
-                        shell=True,
-                    )
-                except:
-                    if r.returncode == 11:
-                        # Continue if files missing from archive; we will check later if this is
-                        # an acceptable condition
-                        logging.warning("One or more files not found in zip archive")
-                        pass
-                    else:
-                        raise Exception("Error running archive extraction command")
-
-                # Check that files exist and Remove any data transfer artifacts.
-                # Returns {'hpss': []}, turn that into a new dict of
-                # sets.
-                unavailable[existing_archive] = set(
-                    clean_up_output_dir(
-                        expected_subdir=archive_internal_dir,
-                        local_archive=os.path.basename(existing_archive),
-                        output_path=output_path,
-                        source_paths=source_paths,
-                    ).get("hpss", [])
-                )
+    logging.info(f"Running command \n {cmd}")
+    result = subprocess.run(
+        cmd,
+        check=False,
+        shell=True,
+    )
+    if result.returncode != 0:
+        # Continue if files are missing from the archive; the caller
+        # checks which files were extracted.
+        logging.warning(
+            f"Extraction from {archive} returned {result.returncode}. "
+            "One or more files were not found in the archive."
+        )
+
+
+def extract_zip_members(
+    archive, requested, output_paths, cache=None, archive_key="", report=None
+):
 
-            # Once we go through all the archives, the union of all
-            # "unavailable" files should equal the "expected" list of
-            # files since clean_up_output_dir only reports on those that
-            # are missing from one of the files attempted. If any
-            # additional files are reported as unavailable, then
-            # something has gone wrong.
-            unavailable = set.union(*unavailable.values())
+    """Extract requested files from a zip archive straight into each
+    member's output path.
 
-    # Break loop if unexpected files were found or if files were found
-    # A successful file found does not equal the expected file list and 
-    # returns an empty set function.
-    if not expected == unavailable:
-        return unavailable - expected
-    
-    # If this loop has completed successfully without returning early, then all files have been found
-    return {}
+    Only the central directory and the requested members are read, and
+    each member is streamed into a .part file next to its output before
+    being renamed into place, so nothing else in the archive is written
+    to disk. An archive on a local file system is read in place. An
+    archive on HPSS can't be read in pieces through hsi, so it is staged
+    with hsi get and removed afterwards.
+
+    Arguments:
+      archive       path to the zip archive, local or on HPSS
+      requested     dict of requested items, keyed by (mem, fcst_hr,
+                    file_name), with a list of the candidate paths
+                    inside the archive for each. Paths may be globs.
+      output_paths  dict of output paths keyed by member
+      cache         FileCache to add extracted files to
+      archive_key   key of the archives in the cache
+      report        TransferReport to add each extracted file to
+
+    Return:
+      the set of requested items that were extracted
+    """
+
+    placed = set()
+    local_archive = archive
+    staged = not os.path.isfile(archive)
+    if staged:
+        start = time.perf_counter()
+        local_archive = os.path.basename(hsi_single_file(archive, mode="get"))
+        if report is not None:
+            report.event("stage", archive, time.perf_counter() - start)
+        if not local_archive:
+            return placed
+
+    try:
+        with zipfile.ZipFile(local_archive) as zip_file:
+            members = {
+                os.path.normpath(info.filename): info
+                for info in zip_file.infolist()
+                if not info.is_dir()
+            }
+            for item, source_paths in requested.items():
+                for source_path in source_paths:
+                    pattern = os.path.normpath(source_path.lstrip("/"))
+                    if pattern in members:
+                        matches = [members[pattern]]
+                    else:
+                        matches = [
+                            info
+                            for name, info in members.items()
+                            if fnmatch.fnmatchcase(name, pattern)
+                        ]
+                    for info in matches:
+                        output = os.path.join(
+                            output_paths[item[0]], os.path.basename(info.filename)
+                        )
+                        logging.info(f"Extracting {info.filename} to {output}")
+                        part = f"{output}.part"
+                        start = time.perf_counter()
+                        with zip_file.open(info) as src, open(part, "wb") as dst:
+                            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                        transferred = time.perf_counter()
+                        os.replace(part, output)
+                        if report is not None:
+                            report.record(
+                                source_path,
+                                output,
+                                True,
+                                cache=None if cache is None else "miss",
+                                transfer_s=transferred - start,
+                                move_s=time.perf_counter() - transferred,
+                                bytes=info.file_size,
+                            )
+                        if cache is not None:
+                            cache.store(f"{archive_key}:{source_path}", output)
+                    if matches:
+                        placed.add(item)
+                        break
+    finally:
+        if staged and os.path.exists(local_archive):
+            os.remove(local_archive)
+
+    return placed
 
 
 def load_str(arg):
@@ -724,11 +1932,14 @@ def setup_logging(debug=False):
         logging.info("Logging level set to DEBUG")
 
 
-def write_summary_file(cla, data_store, file_templates):
+def write_summary_file(cla, data_store, file_templates, cache=None):
 
     """Given the command line arguments and the data store from which
     the data was retrieved, write a bash summary file that is needed by
-    the workflow elements downstream."""
+    the workflow elements downstream. When the files were placed through
+    a cache, the summary also records the cache directory, since the
+    staged files may be links to the cached copies and should not be
+    modified in place."""
 
     members =  cla.members if isinstance(cla.members, list) else [-1]
     for mem in members:
@@ -751,6 +1962,8 @@ def write_summary_file(cla, data_store, file_templates):
             EXTRN_MDL_FHRS=( {' '.join([str(i) for i in cla.fcst_hrs])} )
             """
         )
+        if cache is not None:
+            file_contents += f"EXTRN_MDL_CACHE_DIR={cache.cache_dir}\n"
         logging.info(f"Contents: {file_contents}")
         with open(summary_fp, "w") as summary:
             summary.write(file_contents)
@@ -779,7 +1992,7 @@ def main(argv):
     # pylint: disable=too-many-branches, too-many-statements
     """
     Uses known location information to try the known locations and file
-    paths in priority order.
+    paths in priority order, for one cycle or for each cycle of a batch.
     """
 
     cla = parse_args(argv)
@@ -826,10 +2039,57 @@ def main(argv):
         logging.info(msg)
         logging.info(f"Checking provided disk location {cla.input_file_path}")
 
+    cache = None
+    if cla.cache_dir:
+        cache = FileCache(cla.cache_dir, cla.cache_size_gb * 1024**3)
+    pool = ConnectionPool()
+
+    cycles = cla.cycle_dates or [cla.cycle_date]
+    if cla.prefetch:
+        failed = prefetch_cycles(cla, known_data_info, cycles, cache, pool)
+    else:
+        failed = []
+        for cycle_date in cycles:
+            cycle_cla = cycle_args(cla, cycle_date)
+            if retrieve_cycle(cycle_cla, known_data_info, cache, pool):
+                failed.append(cycle_date)
+
+    pool.close()
+    if cache is not None:
+        cache.close()
+
+    if failed:
+        if cla.cycle_dates:
+            failed_cycles = " ".join(c.strftime("%Y%m%d%H") for c in failed)
+            logging.error(f"Could not find the requested files for cycles: {failed_cycles}")
+        else:
+            logging.error("Could not find any of the requested files.")
+        sys.exit(1)
+
+
+def retrieve_cycle(cla, known_data_info, cache=None, pool=None):
+
+    """Try the requested data stores in priority order for the single
+    cycle given by cla.cycle_date, writing the summary file once all the
+    files are in place, and the transfer report if one was requested.
+    Returns the files that were unavailable from the last data store
+    tried.
+
+    Input:
+
+      cla             Namespace of command line arguments
+      known_data_info dict of data store settings for cla.data_type
+      cache           FileCache of retrieved files, if one is used
+      pool            ConnectionPool shared by all the cycles retrieved
+                      in this process
+    """
+
+    report = TransferReport(log_each=cla.log_transfers)
     unavailable = {}
     for data_store in cla.data_stores:
         logging.info(f"Checking {data_store} for {cla.data_type}")
         store_specs = known_data_info.get(data_store, {})
+        report.data_store = data_store
 
         if data_store == "disk":
             file_templates = get_file_templates(
@@ -846,6 +2106,7 @@ def main(argv):
                 file_templates=file_templates,
                 input_locs=cla.input_file_path,
                 method="disk",
+                report=report,
             )
 
         elif not store_specs:
@@ -868,32 +2129,139 @@ def main(argv):
                     input_locs=store_specs["url"],
                     method="download",
                     members=cla.members,
+                    max_per_host=store_specs.get(
+                        "max_connections", DEFAULT_MAX_PER_HOST
+                    ),
+                    pool=pool,
+                    variables=store_specs.get("variables"),
+                    cache=cache,
+                    report=report,
                 )
 
             if store_specs.get("protocol") == "htar":
                 ens_groups = get_ens_groups(cla.members)
+                unavailable = {}
                 for ens_group, members in ens_groups.items():
-                    unavailable = hpss_requested_files(
+                    missing = hpss_requested_files(
                         cla,
                         file_templates,
                         store_specs,
                         members=members,
                         ens_group=ens_group,
+                        cache=cache,
+                        report=report,
                     )
+                    if missing:
+                        unavailable[ens_group] = missing
 
         if not unavailable:
             # All files are found. Stop looking!
             # Write a variable definitions file for the data, if requested
             if cla.summary_file and not cla.check_file:
-                write_summary_file(cla, data_store, file_templates)
+                write_summary_file(cla, data_store, file_templates, cache)
             break
 
         logging.debug(f"Some unavailable files: {unavailable}")
         logging.warning(f"Requested files are unavailable from {data_store}")
 
-    if unavailable:
-        logging.error("Could not find any of the requested files.")
-        sys.exit(1)
+    if cla.report_file:
+        members = cla.members if isinstance(cla.members, list) else [-1]
+        for mem in members:
+            output_path = fill_template(cla.output_path, cla.cycle_date, mem=mem)
+            os.makedirs(output_path, exist_ok=True)
+            report.write(
+                os.path.join(output_path, cla.report_file),
+                cla.cycle_date,
+                output_path=output_path if len(members) > 1 else None,
+            )
+
+    return unavailable
+
+
+def cycle_args(cla, cycle_date):
+
+    """Return a copy of the command line arguments for retrieving a
+    single cycle of a batch."""
+
+    cycle_cla = argparse.Namespace(**vars(cla))
+    cycle_cla.cycle_date = cycle_date
+    return cycle_cla
+
+
+def cycle_range(date_start, date_end, incr_cycl_freq):
+
+    """Return the list of cycle datetimes from date_start to date_end,
+    inclusive, every incr_cycl_freq hours. This mirrors set_cycle_dates
+    in the workflow, without pulling in its dependencies."""
+
+    if incr_cycl_freq < 1:
+        raise argparse.ArgumentTypeError(f"The cycle frequency must be at " \
+              f"least 1 hour, got {incr_cycl_freq}")
+
+    cycles = []
+    cycle_date = date_start
+    while cycle_date <= date_end:
+        cycles.append(cycle_date)
+        cycle_date += dt.timedelta(hours=incr_cycl_freq)
+    return cycles
+
+
+def summary_files_exist(cla):
+
+    """Return True when the summary files for every requested member of
+    the cycle in cla.cycle_date have already been written."""
+
+    members = cla.members if isinstance(cla.members, list) else [-1]
+    for mem in members:
+        output_path = fill_template(cla.output_path, cla.cycle_date, mem=mem)
+        if not os.path.exists(os.path.join(output_path, cla.summary_file)):
+            return False
+    return True
+
+
+def prefetch_cycles(cla, known_data_info, cycles, cache=None, pool=None):
+
+    """Keep retrieving the cycles in the batch as their data are
+    published, so the files are staged before the workflow asks for
+    them. Cycles with a summary file already in place are skipped, and
+    cycles still in the future are not tried yet. Between passes, sleep
+    for cla.prefetch_interval seconds. A cycle is given up on once it is
+    more than cla.prefetch_max_wait hours old. Returns the list of cycles
+    given up on."""
+
+    pending = sorted(cycles)
+    failed = []
+    max_wait = dt.timedelta(hours=cla.prefetch_max_wait)
+    while pending:
+        now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        for cycle_date in list(pending):
+            if cycle_date > now:
+                # Data for this and later cycles can't exist yet.
+                break
+
+            cycle_cla = cycle_args(cla, cycle_date)
+            if summary_files_exist(cycle_cla):
+                logging.info(f"Cycle {cycle_date:%Y%m%d%H} is already staged")
+                pending.remove(cycle_date)
+                continue
+
+            logging.info(f"Prefetching cycle {cycle_date:%Y%m%d%H}")
+            if not retrieve_cycle(cycle_cla, known_data_info, cache, pool):
+                pending.remove(cycle_date)
+            elif now - cycle_date > max_wait:
+                logging.warning(f"Giving up on cycle {cycle_date:%Y%m%d%H}")
+                pending.remove(cycle_date)
+                failed.append(cycle_date)
+
+        if pending:
+            logging.info(
+                f"Waiting {cla.prefetch_interval} s for {len(pending)} "
+                f"more cycles, next is {pending[0]:%Y%m%d%H}"
+            )
+            time.sleep(cla.prefetch_interval)
+
+    return failed
+
 
 
 def get_ens_groups(members):
@@ -1045,6 +2413,20 @@ def parse_args(argv):
         help="Name of the summary file to be written to the output \
         directory",
     )
+    parser.add_argument(
+        "--report_file",
+        help="Name of a JSON report of the time spent probing for, \
+        transferring, and moving each file, its size, retries, and \
+        cache use, with the totals and MB/s for each data store. It is \
+        written to the output directory, like the summary file, whether \
+        or not all the files were found.",
+    )
+    parser.add_argument(
+        "--log_transfers",
+        action="store_true",
+        help="Log the record of each file in the transfer report as one \
+        line of JSON",
+    )
     parser.add_argument(
         "--check_file",
         action="store_true",
@@ -1052,6 +2434,95 @@ def parse_args(argv):
          but don't try to download them. Works with download protocol \
          only",
     )
+    parser.add_argument(
+        "--max_workers",
+        help="The maximum number of files to retrieve at the same time. \
+        The number of simultaneous requests to a single host is further \
+        limited by the data store's max_connections setting. Files \
+        staged from disk are copied this many at a time. default=1",
+        required=False,
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--transfer_backend",
+        choices=("wget", "python"),
+        help="How to transfer files from the download protocol. wget \
+        runs one wget process per file. python reuses keep-alive \
+        connections to each host, resumes partial .part files, and checks \
+        the size of each file before moving it into place. default=wget",
+        required=False,
+        default="wget",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        help="Path to a local cache of retrieved files that may be \
+        shared by many experiments. Files found in the cache are linked \
+        into the output path instead of being retrieved again.",
+        required=False,
+    )
+    parser.add_argument(
+        "--hpss_listing_cache",
+        help="Path to an SQLite file that keeps the HPSS archives found \
+        by listings, so that later runs don't probe them again, whether \
+        or not --cache_dir is used. Archives that were missing are always \
+        probed again. By default, listings are not kept.",
+        required=False,
+    )
+    parser.add_argument(
+        "--hpss_listing_ttl",
+        help="Seconds that HPSS archives kept in the listing cache are \
+        trusted before they are probed again. default=3600",
+        required=False,
+        default=HPSS_LISTING_TTL,
+        type=int,
+    )
+    parser.add_argument(
+        "--cache_size_gb",
+        help="Size limit of the cache in GB. The least recently used \
+        files are evicted to stay under it. default=100",
+        required=False,
+        default=100,
+        type=float,
+    )
+    parser.add_argument(
+        "--cycle_dates",
+        help="Retrieve a batch of cycles in one process, sharing \
+        connections and caches between them. Takes the first and last \
+        cycle dates in YYYYMMDDHH format and the number of hours \
+        between cycles, like the workflow's DATE_FIRST_CYCL, \
+        DATE_LAST_CYCL, and INCR_CYCL_FREQ. The output path may use \
+        cycle templates so that each cycle gets its own directory. \
+        Overrides --cycle_date.",
+        metavar=("START", "STOP", "INCR"),
+        nargs=3,
+        required=False,
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Keep running, and retrieve each cycle given by \
+        --cycle_dates as soon as its data are published. Cycles that \
+        already have a summary file are skipped. Used with --cache_dir, \
+        the workflow's retrieval tasks then link the files from the \
+        cache.",
+    )
+    parser.add_argument(
+        "--prefetch_interval",
+        help="Seconds to wait between passes over the cycles that have \
+        not been retrieved in prefetch mode. default=300",
+        required=False,
+        default=300,
+        type=int,
+    )
+    parser.add_argument(
+        "--prefetch_max_wait",
+        help="Hours after a cycle's date that prefetch mode keeps \
+        trying to retrieve it. default=24",
+        required=False,
+        default=24,
+        type=float,
+    )
 
     # Make modifications/checks for given values
 
@@ -1061,6 +2532,13 @@ def parse_args(argv):
     args.fcst_hrs = arg_list_to_range(args.fcst_hrs)
     if args.members:
         args.members = arg_list_to_range(args.members)
+    if args.cycle_dates:
+        start, stop, incr = args.cycle_dates
+        args.cycle_dates = cycle_range(to_datetime(start), to_datetime(stop), int(incr))
+        if not args.cycle_dates:
+            raise argparse.ArgumentTypeError(f"--cycle_dates {start} is " \
+                  f"after {stop}")
+        args.cycle_date = args.cycle_dates[0]
 
     # Check required arguments for various conditions
     if not args.ics_or_lbcs and args.file_set in ["anl", "fcst"]:
@@ -1068,6 +2546,14 @@ def parse_args(argv):
               f"argument when --file_set = {args.file_set}")
 
     # Check valid arguments for various conditions
+    if args.max_workers < 1:
+        raise argparse.ArgumentTypeError(f"--max_workers must be at least 1, " \
+              f"got {args.max_workers}")
+
+    if args.prefetch and not (args.cycle_dates and args.summary_file):
+        raise argparse.ArgumentTypeError("--prefetch requires --cycle_dates " \
+              "and --summary_file")
+
     valid_data_stores = ["hpss", "nomads", "aws", "disk", "remote"]
     for store in args.data_stores:
         if store not in valid_data_stores:
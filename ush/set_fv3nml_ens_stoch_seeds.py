@@ -21,44 +21,23 @@ from python_utils import (
 )
 
 
-def set_fv3nml_ens_stoch_seeds(cdate, expt_config):
+def ens_stoch_seeds_settings(cdate, expt_config):
     """
-    This function, for an ensemble-enabled experiment
-    (i.e. for an experiment for which the workflow configuration variable
-    DO_ENSEMBLE has been set to "TRUE"), creates new namelist files with
-    unique stochastic "seed" parameters, using a base namelist file in the
-    ${EXPTDIR} directory as a template. These new namelist files are stored
-    within each member directory housed within each cycle directory. Files
-    of any two ensemble members differ only in their stochastic "seed"
-    parameter values.  These namelist files are generated when this file is
-    called as part of the TN_RUN_FCST task.
+    Return the namelist settings of the stochastic "seed" parameters
+    for a cycle and the ensemble member given by the ENSMEM_INDX
+    environment variable.
 
     Args:
         cdate        the cycle
         expt_config  the in-memory dict representing the experiment configuration
     Returns:
-        None
+        Dictionary of namelist settings, by namelist group
     """
 
-    print_input_args(locals())
-
-    fv3_nml_fn = expt_config["workflow"]["FV3_NML_FN"]
-    verbose = expt_config["workflow"]["VERBOSE"]
-
     # set variables important to this function from the experiment definition
     import_vars(dictionary=expt_config["global"])
     # pylint: disable=undefined-variable
 
-    #
-    # -----------------------------------------------------------------------
-    #
-    # For a given cycle and member, generate a namelist file with unique
-    # seed values.
-    #
-    # -----------------------------------------------------------------------
-    #
-    fv3_nml_ensmem_fp = f"{os.getcwd()}{os.sep}{fv3_nml_fn}"
-
     ensmem_num = int(os.environ["ENSMEM_INDX"])
 
     cdate_i = int(cdate.strftime("%Y%m%d%H"))
@@ -95,6 +74,45 @@ def set_fv3nml_ens_stoch_seeds(cdate, expt_config):
 
         settings["nam_sfcperts"] = {"iseed_lndp": [iseed_lsm_spp]}
 
+    return settings
+
+
+def set_fv3nml_ens_stoch_seeds(cdate, expt_config):
+    """
+    This function, for an ensemble-enabled experiment
+    (i.e. for an experiment for which the workflow configuration variable
+    DO_ENSEMBLE has been set to "TRUE"), creates new namelist files with
+    unique stochastic "seed" parameters, using a base namelist file in the
+    ${EXPTDIR} directory as a template. These new namelist files are stored
+    within each member directory housed within each cycle directory. Files
+    of any two ensemble members differ only in their stochastic "seed"
+    parameter values.  These namelist files are generated when this file is
+    called as part of the TN_RUN_FCST task.
+
+    Args:
+        cdate        the cycle
+        expt_config  the in-memory dict representing the experiment configuration
+    Returns:
+        None
+    """
+
+    print_input_args(locals())
+
+    fv3_nml_fn = expt_config["workflow"]["FV3_NML_FN"]
+    verbose = expt_config["workflow"]["VERBOSE"]
+
+    #
+    # -----------------------------------------------------------------------
+    #
+    # For a given cycle and member, generate a namelist file with unique
+    # seed values.
+    #
+    # -----------------------------------------------------------------------
+    #
+    fv3_nml_ensmem_fp = f"{os.getcwd()}{os.sep}{fv3_nml_fn}"
+
+    settings = ens_stoch_seeds_settings(cdate, expt_config)
+
     print_info_msg(
         dedent(
             f"""
@@ -142,5 +160,7 @@ def parse_args(argv):
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    cfg = load_yaml_config(args.path_to_defns)
+    cfg = load_yaml_config(
+        args.path_to_defns, keys=["workflow", "global"], snapshot=True
+    )
     set_fv3nml_ens_stoch_seeds(args.cdate, cfg)
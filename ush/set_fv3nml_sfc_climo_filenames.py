@@ -19,6 +19,7 @@ from python_utils import (
     import_vars,
     load_yaml_config,
     print_info_msg,
+    profile_phase,
 )
 
 VERBOSE = os.environ.get("VERBOSE", "true")
@@ -36,6 +37,7 @@ NEEDED_VARS = [
 
 # pylint: disable=undefined-variable
 
+@profile_phase("set_fv3nml_sfc_climo_filenames")
 def set_fv3nml_sfc_climo_filenames(config, debug=False):
     """
     This function sets the values of the variables in
@@ -127,6 +129,8 @@ def parse_args(argv):
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    cfg = load_yaml_config(args.path_to_defns)
+    cfg = load_yaml_config(
+        args.path_to_defns, keys=["user", "workflow", "global"], snapshot=True
+    )
     cfg = flatten_dict(cfg)
     set_fv3nml_sfc_climo_filenames(cfg, args.debug)
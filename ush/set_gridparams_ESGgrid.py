@@ -9,9 +9,11 @@ from python_utils import (
     print_input_args,
     load_config_file,
     flatten_dict,
+    profile_phase,
 )
 
 
+@profile_phase("set_gridparams_ESGgrid")
 def set_gridparams_ESGgrid(
     lon_ctr, lat_ctr, nx, ny, halo_width, delx, dely, pazi, constants
 ):
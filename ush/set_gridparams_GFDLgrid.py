@@ -10,6 +10,7 @@ from python_utils import (
     print_err_msg_exit,
     load_config_file,
     flatten_dict,
+    profile_phase,
 )
 
 
@@ -27,6 +28,7 @@ def prime_factors(n):
     return factors
 
 
+@profile_phase("set_gridparams_GFDLgrid")
 def set_gridparams_GFDLgrid(
     lon_of_t6_ctr,
     lat_of_t6_ctr,
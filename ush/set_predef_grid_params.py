@@ -4,23 +4,28 @@ import os
 from textwrap import dedent
 
 from python_utils import (
-    load_config_file,
     flatten_dict,
+    profile_phase,
+    GeneratorContext,
 )
 
 
-def set_predef_grid_params(USHdir, grid_name, quilting):
+@profile_phase("set_predef_grid_params")
+def set_predef_grid_params(USHdir, grid_name, quilting, context=None):
     """Sets grid parameters for the specified predefined grid
 
     Args:
         USHdir:      path to the SRW ush directory
         grid_name    str specifying the predefined grid name.
         quilting:    bool whether quilting should be used for output
+        context:     GeneratorContext predef_grid_params.yaml is loaded
+                     through, reused if it was loaded already
     Returns:
         Dictionary of grid parameters
     """
 
-    params_dict = load_config_file(os.path.join(USHdir, "predef_grid_params.yaml"))
+    context = context or GeneratorContext()
+    params_dict = context.load_config(os.path.join(USHdir, "predef_grid_params.yaml"))
     try:
         params_dict = params_dict[grid_name]
     except KeyError:
@@ -19,12 +19,15 @@ from python_utils import (
     mkdir_vrfy,
     rm_vrfy,
     check_var_valid_value,
+    load_valid_param_vals,
+    check_valid_param_vals,
     lowercase,
     uppercase,
     list_to_str,
     check_for_preexist_dir_file,
     flatten_dict,
-    check_structure_dict,
+    merge_dicts,
+    profile_phase,
     update_dict,
     import_vars,
     get_env_var,
@@ -35,8 +38,9 @@ from python_utils import (
     get_ini_value,
     str_to_list,
     extend_yaml,
+    write_config_snapshots,
     has_tag_with_value,
-    load_xml_file,
+    GeneratorContext,
 )
 
 from set_cycle_dates import set_cycle_dates
@@ -45,7 +49,28 @@ from set_gridparams_ESGgrid import set_gridparams_ESGgrid
 from set_gridparams_GFDLgrid import set_gridparams_GFDLgrid
 from link_fix import link_fix
 
-def load_config_for_setup(ushdir, default_config, user_config):
+
+def fill_templates(cfg):
+    """Fill the Jinja2 templates in cfg in place with extend_yaml. Any
+    templates that refer to each other in a cycle are logged, and left
+    unfilled, rather than raising an error.
+
+    Returns:
+        A dict of the values that still hold templates, keyed by their
+        dotted path in cfg
+    """
+    cycles = []
+    unfilled = extend_yaml(cfg, cycles)
+    if cycles:
+        logging.warning(
+            "The following templates refer to each other in a cycle and "
+            "can't be filled:\n" + "\n".join(f"  {cycle}" for cycle in cycles)
+        )
+    return unfilled
+
+
+@profile_phase("load_config_for_setup")
+def load_config_for_setup(ushdir, default_config, user_config, context=None):
     """Load in the default, machine, and user configuration files into
     Python dictionaries. Return the combined experiment dictionary.
 
@@ -53,14 +78,20 @@ def load_config_for_setup(ushdir, default_config, user_config):
       ushdir             (str): Path to the ush directory for SRW
       default_config     (str): Path to the default config YAML
       user_config        (str): Path to the user-provided config YAML
+      context (GeneratorContext): Context the default, machine, fixed
+                                  files and workflow configs are loaded
+                                  through, reused if they were loaded
+                                  already
 
     Returns:
       Python dict of configuration settings from YAML files.
     """
 
+    context = context or GeneratorContext()
+
     # Load the default config.
     logging.debug(f"Loading config defaults file {default_config}")
-    cfg_d = load_config_file(default_config)
+    cfg_d = context.load_config(default_config)
     logging.debug(f"Read in the following values from config defaults file:\n")
     logging.debug(cfg_d)
 
@@ -87,24 +118,6 @@ def load_config_for_setup(ushdir, default_config, user_config):
         )
         raise Exception(errmsg)
 
-    # Make sure the keys in user config match those in the default
-    # config.
-    invalid = check_structure_dict(cfg_u, cfg_d)
-
-    # Task and metatask entries can be added arbitrarily under the
-    # rocoto section. Remove those from invalid if they exist
-    for key in invalid.copy().keys():
-        if key.split("_", maxsplit=1)[0] in ["task", "metatask"]:
-            invalid.pop(key)
-            logging.info(f"Found and allowing key {key}")
-
-    if invalid:
-        errmsg = f"Invalid key(s) specified in {user_config}:\n"
-        for entry in invalid:
-            errmsg = errmsg + f"{entry} = {invalid[entry]}\n"
-        errmsg = errmsg + f"\nCheck {default_config} for allowed user-specified variables\n"
-        raise Exception(errmsg)
-
     # Mandatory variables *must* be set in the user's config; the default value is invalid
     mandatory = ["user.MACHINE"]
     for val in mandatory:
@@ -132,24 +145,24 @@ def load_config_for_setup(ushdir, default_config, user_config):
             )
         )
     logging.debug(f"Loading machine defaults file {machine_file}")
-    machine_cfg = load_config_file(machine_file)
+    machine_cfg = context.load_config(machine_file)
 
     # Load the fixed files configuration
-    cfg_f = load_config_file(
+    cfg_f = context.load_config(
         os.path.join(ushdir, os.pardir, "parm", "fixed_files_mapping.yaml")
     )
 
     # Load the constants file
-    cfg_c = load_config_file(os.path.join(ushdir, "constants.yaml"))
+    cfg_c = context.load_config(os.path.join(ushdir, "constants.yaml"))
 
 
     # Load the rocoto workflow default file
-    cfg_wflow = load_config_file(os.path.join(ushdir, os.pardir, "parm",
+    cfg_wflow = context.load_config(os.path.join(ushdir, os.pardir, "parm",
         "wflow", "default_workflow.yaml"))
 
     # Takes care of removing any potential "null" entries, i.e.,
     # unsetting a default value from an anchored default_task
-    update_dict(cfg_wflow, cfg_wflow)
+    merge_dicts(cfg_wflow, [])
 
 
     # Take any user-specified taskgroups entry here.
@@ -159,12 +172,13 @@ def load_config_for_setup(ushdir, default_config, user_config):
 
     # Extend yaml here on just the rocoto section to include the
     # appropriate groups of tasks
-    extend_yaml(cfg_wflow)
+    with context.activate():
+        fill_templates(cfg_wflow)
 
 
     # Put the entries expanded under taskgroups in tasks
     rocoto_tasks = cfg_wflow["rocoto"]["tasks"]
-    cfg_wflow["rocoto"]["tasks"] = yaml.load(rocoto_tasks.pop("taskgroups"),Loader=yaml.SafeLoader)
+    cfg_wflow["rocoto"]["tasks"] = context.load_yaml_str(rocoto_tasks.pop("taskgroups"))
 
     # Update wflow config from user one more time to make sure any of
     # the "null" settings are removed, i.e., tasks turned off.
@@ -191,29 +205,44 @@ def load_config_for_setup(ushdir, default_config, user_config):
     add_jobname(cfg_wflow["rocoto"]["tasks"])
 
     # Update default config with the constants, the machine config, and
-    # then the user_config
-    # Recall: update_dict updates the second dictionary with the first,
-    # and so, we update the default config settings in place with all
-    # the others.
-
-    # Constants
-    update_dict(cfg_c, cfg_d)
-
-    # Default workflow settings
-    update_dict(cfg_wflow, cfg_d)
-
-    # Machine settings
-    update_dict(machine_cfg, cfg_d)
+    # then the user_config, in a single pass that also removes any "null"
+    # stranglers. Later layers take precedence over earlier ones, so the
+    # user settings take precedence over all others. The default config
+    # settings are updated in place.
+    #
+    # The same pass makes sure the keys in the user config match those in
+    # the default config.
+    provenance = {}
+    with profile_phase("merge config layers"):
+        invalid = merge_dicts(
+            cfg_d,
+            [
+                ("constants", cfg_c),
+                ("workflow", cfg_wflow),
+                ("machine", machine_cfg),
+                ("fixed_files", cfg_f),
+                ("user", cfg_u),
+            ],
+            provenance=provenance,
+            validate=["user"],
+        )
 
-    # Fixed files
-    update_dict(cfg_f, cfg_d)
+    # Task and metatask entries can be added arbitrarily under the
+    # rocoto section. Remove those from invalid if they exist
+    for key in invalid.copy().keys():
+        if key.split("_", maxsplit=1)[0] in ["task", "metatask"]:
+            invalid.pop(key)
+            logging.info(f"Found and allowing key {key}")
 
-    # User settings (take precedence over all others)
-    update_dict(cfg_u, cfg_d)
+    if invalid:
+        errmsg = f"Invalid key(s) specified in {user_config}:\n"
+        for entry in invalid:
+            errmsg = errmsg + f"{entry} = {invalid[entry]}\n"
+        errmsg = errmsg + f"\nCheck {default_config} for allowed user-specified variables\n"
+        raise Exception(errmsg)
 
-    # Update the cfg_d against itself now, to remove any "null"
-    # stranglers.
-    update_dict(cfg_d, cfg_d)
+    logging.debug("Configuration layer that set each value:\n")
+    logging.debug(provenance)
 
     # Set "Home" directory, the top-level ufs-srweather-app directory
     homedir = os.path.abspath(os.path.dirname(__file__) + os.sep + os.pardir)
@@ -229,7 +258,7 @@ def load_config_for_setup(ushdir, default_config, user_config):
         pass
     cfg_d["workflow"]["EXPT_BASEDIR"] = os.path.abspath(expt_basedir)
 
-    extend_yaml(cfg_d)
+    fill_templates(cfg_d)
 
     # Do any conversions of data types
     for sect, settings in cfg_d.items():
@@ -341,7 +370,9 @@ def set_srw_paths(ushdir, expt_config):
     )
 
 
-def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
+@profile_phase("setup")
+def setup(USHdir, user_config_fn="config.yaml", debug: bool = False,
+          incremental: bool = False, context=None, expt_config=None):
     """Function that validates user-provided configuration, and derives
     a secondary set of parameters needed to configure a Rocoto-based SRW
     workflow. The derived parameters use a set of required user-defined
@@ -357,12 +388,22 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
                              this script is located
       user_config_fn  (str): The name of a user-provided config YAML
       debug          (bool): Enable extra output for debugging
+      incremental    (bool): Keep an existing experiment directory in
+                             place, ignoring PREEXISTING_DIR_METHOD, so
+                             that its contents can be reused
+      context (GeneratorContext): Context the shared config files are
+                                  loaded through, reused if they were
+                                  loaded already
+      expt_config    (dict): The config already loaded from the config
+                             files, with the SRW paths set, to use
+                             instead of loading them again
 
     Returns:
       None
     """
 
     logger = logging.getLogger(__name__)
+    context = context or GeneratorContext()
 
     # print message
     log_info(
@@ -374,12 +415,14 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
 
     # Create a dictionary of config options from defaults, machine, and
     # user config files.
-    default_config_fp = os.path.join(USHdir, "config_defaults.yaml")
-    user_config_fp = os.path.join(USHdir, user_config_fn)
-    expt_config = load_config_for_setup(USHdir, default_config_fp, user_config_fp)
+    if expt_config is None:
+        default_config_fp = os.path.join(USHdir, "config_defaults.yaml")
+        user_config_fp = os.path.join(USHdir, user_config_fn)
+        expt_config = load_config_for_setup(USHdir, default_config_fp, user_config_fp,
+                                            context)
 
-    # Set up some paths relative to the SRW clone
-    expt_config["user"].update(set_srw_paths(USHdir, expt_config))
+        # Set up some paths relative to the SRW clone
+        expt_config["user"].update(set_srw_paths(USHdir, expt_config))
 
     #
     # -----------------------------------------------------------------------
@@ -432,10 +475,17 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
     exptdir = workflow_config.get("EXPTDIR")
 
     # Update some paths that include EXPTDIR and EXPT_BASEDIR
-    extend_yaml(expt_config)
+    fill_templates(expt_config)
     preexisting_dir_method = workflow_config.get("PREEXISTING_DIR_METHOD", "")
     try:
-        check_for_preexist_dir_file(exptdir, preexisting_dir_method)
+        if incremental and os.path.isdir(exptdir):
+            log_info(
+                f"""
+                Regenerating the experiment in the existing EXPTDIR:
+                  EXPTDIR = '{exptdir}'"""
+            )
+        else:
+            check_for_preexist_dir_file(exptdir, preexisting_dir_method)
     except ValueError:
         logger.exception(
             f"""
@@ -715,6 +765,7 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
             USHdir,
             workflow_config["PREDEF_GRID_NAME"],
             fcst_config["QUILTING"],
+            context,
         )
 
         # Users like to change these variables, so don't overwrite them
@@ -1245,7 +1296,7 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
 
     # Get list of all valid top-level tasks and metatasks pertaining to ensemble
     # verification.
-    ens_vx_task_defns = load_config_file(
+    ens_vx_task_defns = context.load_config(
       os.path.join(USHdir, os.pardir, "parm", "wflow", "verify_ens.yaml"))
     ens_vx_valid_tasks = [task for task in ens_vx_task_defns]
 
@@ -1432,7 +1483,7 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
     # -----------------------------------------------------------------------
     #
 
-    ccpp_suite_xml = load_xml_file(workflow_config["CCPP_PHYS_SUITE_IN_CCPP_FP"])
+    ccpp_suite_xml = context.load_xml(workflow_config["CCPP_PHYS_SUITE_IN_CCPP_FP"])
 
     # Need to track if we are using RUC LSM for the make_ics step
     workflow_config["SDF_USES_RUC_LSM"] = has_tag_with_value(ccpp_suite_xml, "scheme", "lsm_ruc")
@@ -1472,11 +1523,21 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
     # -----------------------------------------------------------------------
     #
 
-    extend_yaml(expt_config)
+    unfilled = fill_templates(expt_config)
     for sect, sect_keys in expt_config.items():
         for k, v in sect_keys.items():
             expt_config[sect][k] = str_to_list(v)
-    extend_yaml(expt_config)
+    # The rocoto section's templates are filled later, for each task, so
+    # they aren't expected to be filled here.
+    unfilled = {
+        key: val for key, val in unfilled.items() if not key.startswith("rocoto.")
+    }
+    if unfilled:
+        log_info(
+            "The following templates could not be filled and are left as-is:\n"
+            + "\n".join(f"  {key}: {val}" for key, val in unfilled.items()),
+            dedent_=False,
+        )
 
     # print content of var_defns if DEBUG=True
     all_lines = cfg_to_yaml_str(expt_config)
@@ -1497,17 +1558,22 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
     clean_rocoto_dict(expt_config["rocoto"]["tasks"])
 
     rocoto_yaml_fp = workflow_config["ROCOTO_YAML_FP"]
-    with open(rocoto_yaml_fp, 'w') as f:
+    with profile_phase("write rocoto yaml"), open(rocoto_yaml_fp, 'w') as f:
         yaml.Dumper.ignore_aliases = lambda *args : True
         yaml.dump(expt_config.get("rocoto"), f, sort_keys=False)
 
-    var_defns_cfg = get_yaml_config(config=expt_config)
-    del var_defns_cfg["rocoto"]
+    with profile_phase("write var_defns"):
+        var_defns_cfg = get_yaml_config(config=expt_config)
+        del var_defns_cfg["rocoto"]
 
-    # Fixup a couple of data types:
-    for dates in ("DATE_FIRST_CYCL", "DATE_LAST_CYCL"):
-        var_defns_cfg["workflow"][dates] = date_to_str(var_defns_cfg["workflow"][dates])
-    var_defns_cfg.dump(global_var_defns_fp)
+        # Fixup a couple of data types:
+        for dates in ("DATE_FIRST_CYCL", "DATE_LAST_CYCL"):
+            var_defns_cfg["workflow"][dates] = date_to_str(var_defns_cfg["workflow"][dates])
+        var_defns_cfg.dump(global_var_defns_fp)
+
+        # Save a snapshot and per-section shell fragments of the variable
+        # definitions, so that tasks don't need to parse the whole YAML file
+        write_config_snapshots(global_var_defns_fp)
 
 
     #
@@ -1518,31 +1584,13 @@ def setup(USHdir, user_config_fn="config.yaml", debug: bool = False):
     # -----------------------------------------------------------------------
     #
 
-    # loop through the flattened expt_config and check validity of params
-    cfg_v = load_config_file(os.path.join(USHdir, "valid_param_vals.yaml"))
-    for k, v in flatten_dict(expt_config).items():
-        if v is None or v == "":
-            continue
-        vkey = "valid_vals_" + k
-        if (vkey in cfg_v):
-            if (type(v) == list):
-                if not(all(ele in cfg_v[vkey] for ele in v)):
-                    raise Exception(
-                        dedent(f"""
-                        The variable
-                            {k} = {v}
-                        in the user's configuration has at least one invalid value.  Possible values are:
-                            {k} = {cfg_v[vkey]}"""
-                    ))
-            else:
-                if not (v in cfg_v[vkey]):
-                    raise Exception(
-                        dedent(f"""
-                        The variable
-                            {k} = {v}
-                        in the user's configuration does not have a valid value.  Possible values are:
-                            {k} = {cfg_v[vkey]}"""
-                    ))
+    # Check all the params with valid values listed in valid_param_vals.yaml,
+    # and report every invalid one at once
+    with profile_phase("check valid param values"):
+        valid_vals = load_valid_param_vals(os.path.join(USHdir, "valid_param_vals.yaml"))
+        errors = check_valid_param_vals(flatten_dict(expt_config), valid_vals)
+    if errors:
+        raise Exception("\n".join(errors))
 
     return expt_config
 
@@ -19,31 +19,30 @@ from python_utils import (
 
 VERBOSE = os.environ.get("VERBOSE", "true")
 
-def update_input_nml(namelist, restart, aqm_na_13km):
-    """Update the FV3 input.nml file in the specified run directory
+def input_nml_settings(restart, aqm_na_13km):
+    """Return the namelist settings to update for a restart run and for
+    the AQM_NA_13km domain
 
     Args:
-        namelist:    path to the namelist
         restart:     should forecast start from restart?
         aqm_na_13km: should the 13km AQM config be used?
 
     Returns:
-        Boolean
+        Dictionary of namelist settings, by namelist group
     """
 
-    print_input_args(locals())
     settings = {}
 
     # For restart run
     if restart:
-        settings["fv_core_nml"] = {
+        settings.setdefault("fv_core_nml", {}).update({
             "external_ic": False,
             "make_nh": False,
             "mountain": True,
             "na_init": 0,
             "nggps_ic": False,
             "warm_start": True,
-        }
+        })
 
         settings["gfs_physics_nml"] = {
             "nstf_name": [2, 0, 0, 0, 0],
@@ -51,10 +50,27 @@ def update_input_nml(namelist, restart, aqm_na_13km):
 
     # For AQM_NA_13km domain for air quality modeling
     if aqm_na_13km:
-        settings["fv_core_nml"] = {
+        settings.setdefault("fv_core_nml", {}).update({
             "k_split": 1,
             "n_split": 8,
-        }
+        })
+
+    return settings
+
+def update_input_nml(namelist, restart, aqm_na_13km):
+    """Update the FV3 input.nml file in the specified run directory
+
+    Args:
+        namelist:    path to the namelist
+        restart:     should forecast start from restart?
+        aqm_na_13km: should the 13km AQM config be used?
+
+    Returns:
+        Boolean
+    """
+
+    print_input_args(locals())
+    settings = input_nml_settings(restart, aqm_na_13km)
 
 
     print_info_msg(